@@ -0,0 +1,275 @@
+from __future__ import annotations
+import hashlib
+import json
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.LocalDatabase.database import LocalDatabase
+from app.Mailer.outbound_queue import sort_key
+from app.Mailer.sender import EMAIL
+
+"""
+durable outbox on top of the local sqlite database , survives crashes and lets
+several worker processes drain the same queue without sending twice
+"""
+
+
+@dataclass
+class OutboxItem:
+    outbox_id: int
+    email: EMAIL
+    attempts: int = 0
+
+
+def dedupe_key(email: EMAIL) -> str:
+    # email_id when the caller set one , else a digest of what the mail is , so
+    # re-enqueuing the same campaign after a crash never queues it twice
+    if email.email_id:
+        return str(email.email_id)
+    content = json.dumps(
+        [email.to, email.cc, email.bcc, email.subject, email.body, email.attachments],
+        default=str,
+    )
+    return "auto:" + hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class Outbox:
+    def __init__(
+        self,
+        database: Optional[LocalDatabase] = None,
+        visibility_timeout: float = 300.0,
+        batch_size: int = 500,
+        enable_loggin: bool = True,
+    ) -> None:
+        self.database = database or LocalDatabase(enable_loggin=enable_loggin)
+        # a claimed row nobody acked within this many seconds is handed out again
+        self.visibility_timeout = visibility_timeout
+        # rows written per transaction when enqueuing
+        self.batch_size = batch_size
+        self.logger = logging.getLogger(__name__)
+        if not enable_loggin:
+            self.logger.setLevel(logging.CRITICAL + 1)
+
+    def init_outbox(self) -> None:
+        with self.database.get_conn() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    dedupe_key TEXT UNIQUE,
+                    recipient TEXT,
+                    payload TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 2,
+                    available_at REAL NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    claim_token TEXT,
+                    claimed_until REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error_message TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at REAL
+                );
+
+                CREATE INDEX IF NOT EXISTS idx_outbox_ready
+                    ON outbox (status, priority, available_at);
+            """)
+        self.logger.info("outbox table ready\n")
+
+    # ============================================================================
+    # WRITE SIDE
+    # ============================================================================
+    def _row(self, email: EMAIL) -> tuple:
+        rank, due = sort_key(email)
+        recipient = email.to if isinstance(email.to, str) else json.dumps(email.to)
+        return (
+            dedupe_key(email),
+            recipient,
+            json.dumps(email.to_dict(), default=str),
+            rank,
+            due or time.time(),
+            time.time(),
+        )
+
+    def enqueue(self, emails: Iterable[EMAIL]) -> int:
+        """
+        persist the emails in batched transactions , an email_id that is already
+        in the outbox is skipped so re-running a campaign after a crash is safe
+        """
+        inserted = 0
+        batch: List[tuple] = []
+        for email in emails:
+            batch.append(self._row(email))
+            if len(batch) >= self.batch_size:
+                inserted += self._write_batch(batch)
+                batch = []
+        if batch:
+            inserted += self._write_batch(batch)
+        self.logger.info(f"{inserted} email(s) added to the outbox\n")
+        return inserted
+
+    def _write_batch(self, batch: List[tuple]) -> int:
+        try:
+            with self.database.get_conn() as conn:
+                before = conn.total_changes
+                conn.executemany(
+                    """
+                    INSERT OR IGNORE INTO outbox
+                        (dedupe_key, recipient, payload, priority, available_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    batch,
+                )
+                return conn.total_changes - before
+        except Exception as e:
+            self.logger.error(f"could not write a batch to the outbox : {e}\n")
+            raise
+
+    # ============================================================================
+    # CLAIM / ACK / NACK
+    # ============================================================================
+    def claim(self, limit: int = 50, worker_id: Optional[str] = None) -> List[OutboxItem]:
+        """
+        atomically lease up to 'limit' ready rows , expired leases of crashed
+        workers are picked up again , the single UPDATE runs under sqlite's
+        write lock so two processes can never lease the same row
+        """
+        token = f"{worker_id or 'worker'}:{uuid.uuid4().hex}"
+        now = time.time()
+        with self.database.get_conn() as conn:
+            conn.execute(
+                """
+                UPDATE outbox
+                SET status = 'claimed',
+                    claim_token = ?,
+                    claimed_until = ?,
+                    attempts = attempts + 1,
+                    updated_at = ?
+                WHERE id IN (
+                    SELECT id FROM outbox
+                    WHERE (status = 'pending' AND available_at <= ?)
+                       OR (status = 'claimed' AND claimed_until <= ?)
+                    ORDER BY priority, available_at, id
+                    LIMIT ?
+                )
+                """,
+                (token, now + self.visibility_timeout, now, now, now, limit),
+            )
+            rows = conn.execute(
+                """
+                SELECT id, payload, attempts FROM outbox
+                WHERE claim_token = ?
+                ORDER BY priority, available_at, id
+                """,
+                (token,),
+            ).fetchall()
+        items = [
+            OutboxItem(row["id"], EMAIL.from_dict(json.loads(row["payload"])), row["attempts"])
+            for row in rows
+        ]
+        if items:
+            self.logger.info(f"claimed {len(items)} email(s) from the outbox\n")
+        return items
+
+    def ack(
+        self, outbox_ids: Iterable[int], emails: Optional[Dict[int, EMAIL]] = None
+    ) -> int:
+        # delivered : keep the row for the audit trail but never hand it out again
+        return self._finish(outbox_ids, "sent", emails)
+
+    def fail(
+        self, outbox_ids: Iterable[int], emails: Optional[Dict[int, EMAIL]] = None
+    ) -> int:
+        # permanent failure , same as ack but flagged for review
+        return self._finish(outbox_ids, "failed", emails)
+
+    def _finish(
+        self,
+        outbox_ids: Iterable[int],
+        status: str,
+        emails: Optional[Dict[int, EMAIL]] = None,
+    ) -> int:
+        ids = list(outbox_ids)
+        if not ids:
+            return 0
+        now = time.time()
+        rows = []
+        for outbox_id in ids:
+            email = (emails or {}).get(outbox_id)
+            payload = json.dumps(email.to_dict(), default=str) if email else None
+            error = email.error_message if email else None
+            rows.append((status, now, payload, error, outbox_id))
+        with self.database.get_conn() as conn:
+            conn.executemany(
+                """
+                UPDATE outbox
+                SET status = ?, claim_token = NULL, claimed_until = NULL,
+                    updated_at = ?,
+                    payload = COALESCE(?, payload),
+                    error_message = ?
+                WHERE id = ?
+                """,
+                rows,
+            )
+        return len(ids)
+
+    def nack(
+        self,
+        outbox_ids: Iterable[int],
+        delay: float = 0.0,
+        error_message: Optional[str] = None,
+        emails: Optional[Dict[int, EMAIL]] = None,
+    ) -> int:
+        """
+        give the rows back to the queue , visible again after 'delay' seconds ,
+        the payload of a row found in 'emails' is rewritten so its retry_count
+        survives the next claim (and max_retries is eventually reached)
+        """
+        ids = list(outbox_ids)
+        if not ids:
+            return 0
+        now = time.time()
+        rows = []
+        for outbox_id in ids:
+            email = (emails or {}).get(outbox_id)
+            payload = json.dumps(email.to_dict(), default=str) if email else None
+            error = email.error_message if email and error_message is None else error_message
+            rows.append((now + delay, now, payload, error, outbox_id))
+        with self.database.get_conn() as conn:
+            conn.executemany(
+                """
+                UPDATE outbox
+                SET status = 'pending', claim_token = NULL, claimed_until = NULL,
+                    available_at = ?, updated_at = ?,
+                    payload = COALESCE(?, payload),
+                    error_message = ?
+                WHERE id = ?
+                """,
+                rows,
+            )
+        return len(ids)
+
+    def extend_lease(self, outbox_ids: Iterable[int]) -> None:
+        # heartbeat for long running sends so the lease does not expire mid flight
+        until = time.time() + self.visibility_timeout
+        with self.database.get_conn() as conn:
+            conn.executemany(
+                "UPDATE outbox SET claimed_until = ? WHERE id = ? AND status = 'claimed'",
+                [(until, outbox_id) for outbox_id in outbox_ids],
+            )
+
+    def counts(self) -> Dict[str, int]:
+        with self.database.get_conn() as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) AS total FROM outbox GROUP BY status"
+            ).fetchall()
+        return {row["status"]: row["total"] for row in rows}
+
+    def purge_sent(self, older_than: float = 7 * 24 * 3600) -> int:
+        cutoff = time.time() - older_than
+        with self.database.get_conn() as conn:
+            cursor = conn.execute(
+                "DELETE FROM outbox WHERE status = 'sent' AND updated_at < ?", (cutoff,)
+            )
+            return cursor.rowcount
@@ -0,0 +1,454 @@
+from __future__ import annotations
+import heapq
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from app.LocalDatabase.database import LocalDatabase
+from app.Mailer.sender import EMAIL, EmailStatus
+from utils.metrics import REGISTRY
+
+if TYPE_CHECKING:
+    from app.scheduler.scheduler import EmailScheduler
+
+"""
+daemon that sends the rows of scheduled_emails when their send_at comes : the
+earliest pending rows are loaded through the (status , send_at) index into an
+in memory min heap , the thread sleeps on an event until the head is due and
+new rows are picked up by id , so thousands of future dated emails cost one
+wake up each and no polling
+"""
+
+# send_at is stored as local "YYYY-MM-DD HH:MM:SS[.ffffff]" text , it sorts like the time
+SendAt = Union[datetime, str, float]
+
+LATENESS = REGISTRY.histogram(
+    "scheduled_email_lateness_seconds",
+    "seconds between send_at and the moment the scheduled email was handed to the sender",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0, 60.0, 300.0, 3600.0),
+)
+SCHEDULED = REGISTRY.counter(
+    "scheduled_emails_total", "scheduled emails handled by the daemon by outcome", ("result",)
+)
+
+
+def format_send_at(when: SendAt) -> str:
+    if isinstance(when, (int, float)):
+        when = datetime.fromtimestamp(when)
+    elif isinstance(when, str):
+        when = datetime.fromisoformat(when)
+    # one text format everywhere , a mixed "T" / " " column would not sort
+    return when.isoformat(sep=" ")
+
+
+def _epoch(send_at: str) -> float:
+    return datetime.fromisoformat(send_at).timestamp()
+
+
+@dataclass
+class ScheduledEmail:
+    scheduled_id: int
+    recipient: str
+    subject: Optional[str]
+    body: Optional[str]
+    send_at: str
+    # attempts already made , saved on the row so a restart keeps the budget
+    retry_count: int = 0
+
+    def to_email(self) -> EMAIL:
+        return EMAIL(
+            to=self.recipient,
+            subject=self.subject or "",
+            body=self.body or "",
+            scheduled_for=self.send_at,
+            retry_count=self.retry_count,
+            email_id=f"scheduled-{self.scheduled_id}",
+        )
+
+
+class ScheduledEmailDaemon:
+    def __init__(
+        self,
+        send: Optional[Callable[[EMAIL], bool]] = None,
+        database: Optional[LocalDatabase] = None,
+        scheduler: Optional[EmailScheduler] = None,
+        capacity: int = 1000,
+        rescan_interval: Optional[float] = 60.0,
+        clock: Callable[[], float] = time.time,
+        enable_loggin: bool = True,
+    ) -> None:
+        if capacity < 1:
+            raise ValueError(f"capacity must be at least 1 got {capacity}\n")
+        # EmailSender.send_single_email or anything EMAIL -> bool , None when the
+        # instance only writes rows (schedule / cancel) for a daemon elsewhere
+        self.send = send
+        self.database = database or LocalDatabase(enable_loggin=enable_loggin)
+        # when given , a row due while the quota is spent waits for the next permit
+        self.scheduler = scheduler
+        # at most this many rows held in memory , the rest stays in sqlite
+        self.capacity = capacity
+        # longest sleep , rows inserted by another process show up after at most
+        # this long (None : only schedule() in this process wakes the daemon)
+        self.rescan_interval = rescan_interval
+        self.clock = clock
+        self.logger = logging.getLogger(__name__)
+        if not enable_loggin:
+            self.logger.setLevel(logging.CRITICAL + 1)
+
+        # (due , id) , due is send_at or a later retry time
+        self._heap: List[Tuple[float, int]] = []
+        self._rows: Dict[int, ScheduledEmail] = {}
+        # highest id read so far , anything above it is new
+        self._max_id = 0
+        # True : every pending row is in the heap , False : rows after
+        # self._frontier are still only in sqlite
+        self._complete = True
+        self._frontier: Optional[str] = None
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.sent = 0
+        self.failed = 0
+
+    def init_table(self) -> None:
+        # same schema as LocalDatabase.init_db , plus the index the daemon reads
+        # through and the retry_count column it keeps the attempts in
+        with self.database.get_conn() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS scheduled_emails (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    recipient TEXT NOT NULL,
+                    subject TEXT,
+                    body TEXT,
+                    send_at TIMESTAMP,
+                    status TEXT DEFAULT 'pending',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+
+                CREATE TABLE IF NOT EXISTS sent_logs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    recipient TEXT NOT NULL ,
+                    subject TEXT ,
+                    sent_at TIMESTAMP ,
+                    status TEXT ,
+                    error_message TEXT
+                );
+
+                CREATE INDEX IF NOT EXISTS idx_scheduled_emails_due
+                    ON scheduled_emails (status, send_at);
+            """)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(scheduled_emails)")}
+            if "retry_count" not in columns:
+                conn.execute("ALTER TABLE scheduled_emails ADD COLUMN retry_count INTEGER DEFAULT 0")
+        self.logger.info("scheduled_emails table ready\n")
+
+    # ============================================================================
+    # WRITE SIDE
+    # ============================================================================
+    def schedule(self, recipient: str, subject: str, body: str, send_at: SendAt) -> int:
+        with self.database.get_conn() as conn:
+            cursor = conn.execute(
+                "INSERT INTO scheduled_emails (recipient, subject, body, send_at) VALUES (?, ?, ?, ?)",
+                (recipient, subject, body, format_send_at(send_at)),
+            )
+            scheduled_id = cursor.lastrowid
+        # the daemon may be asleep until a later row
+        self._wakeup.set()
+        return scheduled_id
+
+    def schedule_many(self, rows: Iterable[Tuple[str, str, str, SendAt]]) -> int:
+        """(recipient , subject , body , send_at) rows in one transaction"""
+        batch = [
+            (recipient, subject, body, format_send_at(send_at))
+            for recipient, subject, body, send_at in rows
+        ]
+        if not batch:
+            return 0
+        with self.database.get_conn() as conn:
+            conn.executemany(
+                "INSERT INTO scheduled_emails (recipient, subject, body, send_at) VALUES (?, ?, ?, ?)",
+                batch,
+            )
+        self._wakeup.set()
+        self.logger.info(f"{len(batch)} email(s) scheduled\n")
+        return len(batch)
+
+    def cancel(self, scheduled_id: int) -> bool:
+        with self.database.get_conn() as conn:
+            cursor = conn.execute(
+                "UPDATE scheduled_emails SET status = 'cancelled' WHERE id = ? AND status = 'pending'",
+                (scheduled_id,),
+            )
+        # a cancelled row still in the heap is skipped when its claim fails
+        return cursor.rowcount == 1
+
+    def recover(self) -> int:
+        # rows a crashed daemon left in 'sending' , sent again (at least once)
+        with self.database.get_conn() as conn:
+            cursor = conn.execute(
+                "UPDATE scheduled_emails SET status = 'pending' WHERE status = 'sending'"
+            )
+        if cursor.rowcount:
+            self.logger.warning(f"{cursor.rowcount} interrupted scheduled email(s) put back to pending\n")
+        return cursor.rowcount
+
+    # ============================================================================
+    # HEAP
+    # ============================================================================
+    def _push(self, row) -> bool:
+        scheduled_id = row["id"]
+        if scheduled_id in self._rows:
+            return False
+        send_at = format_send_at(row["send_at"])
+        self._rows[scheduled_id] = ScheduledEmail(
+            scheduled_id, row["recipient"], row["subject"], row["body"], send_at, row["retry_count"] or 0
+        )
+        heapq.heappush(self._heap, (_epoch(send_at), scheduled_id))
+        return True
+
+    def _refill(self) -> None:
+        """
+        earliest pending rows from the frontier on , through the index , until
+        the heap is full again
+        """
+        room = self.capacity - len(self._heap)
+        if room <= 0:
+            return
+        query = (
+            "SELECT id, recipient, subject, body, send_at, retry_count FROM scheduled_emails"
+            " WHERE status = 'pending'"
+        )
+        params: list = []
+        if self._frontier is not None and not self._complete:
+            # rows equal to the frontier may already be held , _push skips them
+            query += " AND send_at >= ?"
+            params.append(self._frontier)
+        # held rows can come back , ask for enough to still fill the room
+        limit = room + len(self._rows)
+        query += " ORDER BY send_at, id LIMIT ?"
+        params.append(limit)
+        with self.database.get_conn() as conn:
+            rows = conn.execute(query, params).fetchall()
+        for row in rows:
+            self._max_id = max(self._max_id, row["id"])
+            if len(self._heap) >= self.capacity:
+                break
+            if self._push(row):
+                self._frontier = format_send_at(row["send_at"])
+        self._complete = len(rows) < limit
+        if self._complete:
+            self._frontier = None
+
+    def _pickup_new(self) -> int:
+        # rows inserted since the last read , the primary key makes this a range scan
+        with self.database.get_conn() as conn:
+            rows = conn.execute(
+                """
+                SELECT id, recipient, subject, body, send_at, retry_count FROM scheduled_emails
+                WHERE id > ? AND status = 'pending' ORDER BY id
+                """,
+                (self._max_id,),
+            ).fetchall()
+        added = 0
+        for row in rows:
+            self._max_id = max(self._max_id, row["id"])
+            send_at = format_send_at(row["send_at"])
+            if not self._complete and send_at > self._frontier:
+                # later than what is held , the range refill will reach it
+                continue
+            if len(self._heap) >= self.capacity:
+                # full : an earlier row takes the place of the latest held one ,
+                # anything else waits in sqlite for the frontier refill
+                if self._complete:
+                    self._complete = False
+                    self._frontier = max(item.send_at for item in self._rows.values())
+                latest = max(self._rows.values(), key=lambda item: (item.send_at, item.scheduled_id))
+                if send_at >= latest.send_at:
+                    # the refill reads from the frontier on , it must not be past this row
+                    self._frontier = min(self._frontier, send_at)
+                    continue
+                self._evict(latest)
+            added += self._push(row)
+        return added
+
+    def _evict(self, item: ScheduledEmail) -> None:
+        # the row stays pending in sqlite , moving the frontier back to it lets
+        # the refill read it again
+        del self._rows[item.scheduled_id]
+        self._heap = [entry for entry in self._heap if entry[1] != item.scheduled_id]
+        heapq.heapify(self._heap)
+        self._frontier = min(self._frontier, item.send_at)
+
+    def next_due_in(self) -> Optional[float]:
+        # seconds until the head of the heap is due , None when nothing is held
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - self.clock())
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    # ============================================================================
+    # DISPATCH
+    # ============================================================================
+    def _claim(self, scheduled_id: int) -> bool:
+        # another daemon or a cancel() may have taken the row since it was loaded
+        with self.database.get_conn() as conn:
+            cursor = conn.execute(
+                "UPDATE scheduled_emails SET status = 'sending' WHERE id = ? AND status = 'pending'",
+                (scheduled_id,),
+            )
+        return cursor.rowcount == 1
+
+    def _log(self, conn, item: ScheduledEmail, status: str, error: Optional[str]) -> None:
+        conn.execute(
+            """
+            INSERT INTO sent_logs (recipient, subject, sent_at, status, error_message)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (
+                item.recipient,
+                item.subject,
+                datetime.fromtimestamp(self.clock()).strftime("%Y-%m-%d %H:%M:%S"),
+                status,
+                error,
+            ),
+        )
+
+    def _finish(self, item: ScheduledEmail, success: bool, error: Optional[str]) -> None:
+        status = "sent" if success else "failed"
+        with self.database.get_conn() as conn:
+            conn.execute("UPDATE scheduled_emails SET status = ? WHERE id = ?", (status, item.scheduled_id))
+            self._log(conn, item, "success" if success else "failed", error)
+
+    def _retry(self, item: ScheduledEmail, email: EMAIL) -> None:
+        # transient failure : the row goes back to pending at the retry time the
+        # sender picked and stays in the heap , it is not counted as failed
+        retry_at = _epoch(format_send_at(email.scheduled_for)) if email.scheduled_for else 0.0
+        if retry_at <= self.clock():
+            # no later time given , never retry inside the same run_pending()
+            retry_at = self.clock() + (self.rescan_interval or 60.0)
+        item.send_at = format_send_at(retry_at)
+        item.retry_count = email.retry_count
+        with self.database.get_conn() as conn:
+            conn.execute(
+                "UPDATE scheduled_emails SET status = 'pending', send_at = ?, retry_count = ? WHERE id = ?",
+                (item.send_at, item.retry_count, item.scheduled_id),
+            )
+            self._log(conn, item, "retrying", email.error_message)
+        self._rows[item.scheduled_id] = item
+        heapq.heappush(self._heap, (_epoch(item.send_at), item.scheduled_id))
+        self.logger.warning(
+            f"scheduled email {item.scheduled_id} to {item.recipient} retried at {item.send_at} : "
+            f"{email.error_message}\n"
+        )
+
+    def _quota_wait(self) -> float:
+        if self.scheduler is None:
+            return 0.0
+        return self.scheduler.time_until_next_permit()
+
+    def run_pending(self) -> int:
+        """send every held row that is due now , returns how many were handed out"""
+        dispatched = 0
+        while self._heap and self._heap[0][0] <= self.clock():
+            wait = self._quota_wait()
+            if wait > 0:
+                # every due row waits for the next permit , not only the head
+                if math.isinf(wait):
+                    wait = self.rescan_interval or 3600.0
+                now = self.clock()
+                deferred = []
+                while self._heap and self._heap[0][0] <= now:
+                    deferred.append(heapq.heappop(self._heap)[1])
+                for scheduled_id in deferred:
+                    heapq.heappush(self._heap, (now + wait, scheduled_id))
+                self.logger.warning(
+                    f"rate limit reached , {len(deferred)} scheduled email(s) wait {wait:.0f}s\n"
+                )
+                break
+            _, scheduled_id = heapq.heappop(self._heap)
+            item = self._rows.pop(scheduled_id)
+            if not self._claim(scheduled_id):
+                continue
+            LATENESS.observe(max(0.0, self.clock() - _epoch(item.send_at)))
+            email = item.to_email()
+            error = None
+            try:
+                success = bool(self.send(email))
+            except Exception as e:
+                self.logger.error(f"scheduled email {item.scheduled_id} to {item.recipient} crashed : {e}\n")
+                success, error = False, str(e)
+            if not success and error is None and email.status is EmailStatus.RETRYING:
+                SCHEDULED.labels("retrying").inc()
+                self._retry(item, email)
+                dispatched += 1
+                continue
+            if not success and error is None:
+                error = email.error_message
+            if success:
+                self.sent += 1
+                if self.scheduler is not None:
+                    self.scheduler.increment_counters()
+            else:
+                self.failed += 1
+            SCHEDULED.labels("sent" if success else "failed").inc()
+            self._finish(item, success, error)
+            dispatched += 1
+        if len(self._heap) <= self.capacity // 2 and not self._complete:
+            self._refill()
+        return dispatched
+
+    # ============================================================================
+    # DAEMON
+    # ============================================================================
+    def run_forever(self) -> None:
+        if self.send is None:
+            raise ValueError("the daemon needs a send callable to run\n")
+        self.recover()
+        # read before the refill : a row inserted in between has a higher id and
+        # is picked up , every older pending row is held or behind the frontier
+        self._max_id = self._current_max_id()
+        self._refill()
+        self.logger.info(f"scheduled email daemon started with {len(self._heap)} row(s) held\n")
+        while not self._stop.is_set():
+            self._wakeup.clear()
+            self._pickup_new()
+            self.run_pending()
+            wait = self.next_due_in()
+            if self.rescan_interval is not None:
+                wait = self.rescan_interval if wait is None else min(wait, self.rescan_interval)
+            # one sleep until the head is due , schedule() / stop() cut it short
+            self._wakeup.wait(wait)
+        self.logger.info(f"scheduled email daemon stopped - sent : {self.sent} | failed : {self.failed}\n")
+
+    def _current_max_id(self) -> int:
+        with self.database.get_conn() as conn:
+            row = conn.execute("SELECT MAX(id) AS max_id FROM scheduled_emails").fetchone()
+        return row["max_id"] or 0
+
+    def start(self) -> "ScheduledEmailDaemon":
+        if self._thread is not None:
+            return self
+        self.init_table()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run_forever, name="scheduled-emails", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def __enter__(self) -> "ScheduledEmailDaemon":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -0,0 +1,164 @@
+from __future__ import annotations
+import atexit
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Deque, List, Optional
+
+from app.LocalDatabase.database import LocalDatabase
+
+"""
+rate limiter state that survives a restart : the send times of the last 24h are
+checkpointed to the local sqlite database in batches and handed back to the
+scheduler on startup , a crash loop can no longer reset the daily gmail count
+"""
+
+DAY = 24 * 3600.0
+
+
+class SchedulerStateStore:
+    def __init__(
+        self,
+        database: Optional[LocalDatabase] = None,
+        account: str = "default",
+        flush_every: int = 10,
+        flush_interval: float = 30.0,
+        window: float = DAY,
+        clock: Callable[[], float] = time.time,
+        enable_loggin: bool = True,
+    ) -> None:
+        self.database = database or LocalDatabase(enable_loggin=enable_loggin)
+        # one row per sending account
+        self.account = account
+        # checkpoint after this many sends ... or once this many seconds passed
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        # sends older than the widest limiter window are dropped from the state
+        self.window = window
+        self.clock = clock
+        self.logger = logging.getLogger(__name__)
+        if not enable_loggin:
+            self.logger.setLevel(logging.CRITICAL + 1)
+
+        # wall clock send times inside the window , oldest first
+        self._events: Deque[float] = deque()
+        self._dirty = 0
+        self._last_flush = clock()
+        self._lock = threading.Lock()
+        self.checkpoints = 0
+        self.init_table()
+        atexit.register(self.flush)
+
+    def init_table(self) -> None:
+        with self.database.get_conn() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS scheduler_state (
+                    account TEXT PRIMARY KEY,
+                    sent_times TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+            """)
+
+    # ============================================================================
+    # LOAD
+    # ============================================================================
+    def _sent_logs_since(self, since: float) -> List[float]:
+        # sent_logs.sent_at is a local "YYYY-MM-DD HH:MM:SS" string
+        cutoff = datetime.fromtimestamp(since).strftime("%Y-%m-%d %H:%M:%S")
+        try:
+            with self.database.get_conn() as conn:
+                rows = conn.execute(
+                    """
+                    SELECT sent_at FROM sent_logs
+                    WHERE sent_at > ? AND (status IS NULL OR status IN ('sent', 'success'))
+                    """,
+                    (cutoff,),
+                ).fetchall()
+        except sqlite3.OperationalError as e:
+            self.logger.warning(f"no sent_logs to rebuild the limiter state from : {e}\n")
+            return []
+        times = []
+        for row in rows:
+            try:
+                times.append(datetime.fromisoformat(str(row["sent_at"])).timestamp())
+            except ValueError:
+                self.logger.warning(f"skipping unreadable sent_logs timestamp {row['sent_at']!r}\n")
+        return times
+
+    def load(self) -> List[float]:
+        """
+        ages in seconds (0 = just now) of the sends inside the window : the last
+        checkpoint plus whatever sent_logs recorded after it , or only sent_logs
+        when there is no checkpoint yet
+        """
+        now = self.clock()
+        with self.database.get_conn() as conn:
+            row = conn.execute(
+                "SELECT sent_times, updated_at FROM scheduler_state WHERE account = ?",
+                (self.account,),
+            ).fetchone()
+        if row is not None:
+            events = json.loads(row["sent_times"])
+            since = row["updated_at"]
+        else:
+            self.logger.warning(
+                f"no limiter checkpoint for {self.account} , rebuilding it from sent_logs\n"
+            )
+            events, since = [], now - self.window
+        events.extend(self._sent_logs_since(since))
+        events = sorted(event for event in events if now - self.window < event <= now)
+        with self._lock:
+            self._events = deque(events)
+        self.logger.info(f"limiter state restored : {len(events)} send(s) in the last window\n")
+        return [now - event for event in events]
+
+    # ============================================================================
+    # CHECKPOINT
+    # ============================================================================
+    def record(self, when: Optional[float] = None) -> None:
+        with self._lock:
+            self._events.append(self.clock() if when is None else when)
+            self._dirty += 1
+            due = (
+                self._dirty >= self.flush_every
+                or self.clock() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            now = self.clock()
+            horizon = now - self.window
+            while self._events and self._events[0] <= horizon:
+                self._events.popleft()
+            payload = json.dumps(list(self._events))
+            dirty, self._dirty = self._dirty, 0
+            self._last_flush = now
+        try:
+            with self.database.get_conn() as conn:
+                conn.execute(
+                    """
+                    INSERT INTO scheduler_state (account, sent_times, updated_at)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(account) DO UPDATE
+                    SET sent_times = excluded.sent_times, updated_at = excluded.updated_at
+                    """,
+                    (self.account, payload, now),
+                )
+            self.checkpoints += 1
+        except Exception as e:
+            # keep the sends dirty , the next record() tries again
+            with self._lock:
+                self._dirty += dirty
+            self.logger.error(f"could not checkpoint the limiter state : {e}\n")
+
+    def close(self) -> None:
+        self.flush()
+        atexit.unregister(self.flush)
@@ -0,0 +1,181 @@
+import time
+import pytest
+from unittest.mock import patch
+
+import app.LocalDatabase.database as db_module
+from app.LocalDatabase.database import LocalDatabase
+from app.LocalDatabase.outbox import Outbox
+from app.Mailer.sender import EMAIL, EmailPriority, EmailStatus
+
+
+@pytest.fixture(autouse=True)
+def fresh_db_path(tmp_path, monkeypatch):
+    test_db = str(tmp_path / "test.db")
+    monkeypatch.setattr(db_module, "DATABASE_PATH", test_db)
+    yield test_db
+
+
+@pytest.fixture
+def outbox() -> Outbox:
+    box = Outbox(
+        LocalDatabase(enable_loggin=False),
+        visibility_timeout=60,
+        batch_size=3,
+        enable_loggin=False,
+    )
+    box.init_outbox()
+    return box
+
+
+def make_emails(count, priority=EmailPriority.NORMAL, prefix="e"):
+    return [
+        EMAIL(
+            to=f"{prefix}{i}@gmail.com",
+            subject="s",
+            body="b",
+            email_id=f"{prefix}{i}",
+            priority=priority,
+        )
+        for i in range(count)
+    ]
+
+
+class TestEnqueue:
+    def test_batched_insert(self, outbox):
+        assert outbox.enqueue(make_emails(7)) == 7
+        assert outbox.counts() == {"pending": 7}
+
+    def test_duplicate_email_id_is_skipped(self, outbox):
+        outbox.enqueue(make_emails(3))
+        assert outbox.enqueue(make_emails(4)) == 1
+        assert outbox.counts() == {"pending": 4}
+
+    def test_emails_without_id_are_deduplicated(self, outbox):
+        emails = [EMAIL(to=f"n{i}@gmail.com", subject="s", body="b") for i in range(3)]
+        assert outbox.enqueue(emails) == 3
+        assert outbox.enqueue(emails) == 0
+        assert outbox.counts() == {"pending": 3}
+
+
+class TestClaim:
+    def test_claim_round_trips_the_email(self, outbox):
+        outbox.enqueue(make_emails(1))
+        [item] = outbox.claim(limit=5)
+        assert item.email.to == "e0@gmail.com"
+        assert item.email.priority == EmailPriority.NORMAL
+        assert item.attempts == 1
+
+    def test_priority_is_served_first(self, outbox):
+        outbox.enqueue(make_emails(3))
+        outbox.enqueue(make_emails(1, EmailPriority.URGENT, prefix="u"))
+        first = outbox.claim(limit=1)
+        assert first[0].email.email_id == "u0"
+
+    def test_two_workers_never_share_rows(self, outbox):
+        outbox.enqueue(make_emails(10))
+        a = outbox.claim(limit=6, worker_id="a")
+        b = outbox.claim(limit=6, worker_id="b")
+        ids_a = {item.outbox_id for item in a}
+        ids_b = {item.outbox_id for item in b}
+        assert len(ids_a) == 6 and len(ids_b) == 4
+        assert not ids_a & ids_b
+
+    def test_expired_lease_is_reclaimed(self, outbox):
+        outbox.visibility_timeout = 0
+        outbox.enqueue(make_emails(1))
+        first = outbox.claim()
+        time.sleep(0.01)
+        second = outbox.claim()
+        assert first[0].outbox_id == second[0].outbox_id
+        assert second[0].attempts == 2
+
+
+class TestAckNack:
+    def test_ack_removes_from_queue(self, outbox):
+        outbox.enqueue(make_emails(2))
+        items = outbox.claim()
+        outbox.ack([items[0].outbox_id])
+        outbox.fail([items[1].outbox_id])
+        assert outbox.counts() == {"sent": 1, "failed": 1}
+        assert outbox.claim() == []
+
+    def test_nack_with_delay(self, outbox):
+        outbox.enqueue(make_emails(1))
+        [item] = outbox.claim()
+        outbox.nack([item.outbox_id], delay=60, error_message="421")
+        assert outbox.claim() == []
+        outbox.nack([item.outbox_id], delay=0)
+        assert len(outbox.claim()) == 1
+
+    def test_nack_keeps_the_retry_count(self, outbox):
+        outbox.enqueue(make_emails(1))
+        [item] = outbox.claim()
+        item.email.retry_count = 2
+        item.email.error_message = "421"
+        outbox.nack([item.outbox_id], emails={item.outbox_id: item.email})
+        [again] = outbox.claim()
+        assert again.email.retry_count == 2
+        assert again.email.error_message == "421"
+
+
+@pytest.fixture
+def sender():
+    with patch("app.Mailer.transport.yagmail.SMTP"):
+        from app.Mailer.sender import EmailSender
+
+        yield EmailSender(enable_loggin=False)
+
+
+class TestSendFromOutbox:
+    def test_sender_drains_and_acks(self, outbox, sender):
+        outbox.enqueue(make_emails(5))
+
+        def fake_batch(emails, **kwargs):
+            for email in emails:
+                if email.email_id == "e3":
+                    email.status = EmailStatus.FAILED
+                    yield email, False
+                else:
+                    email.status = EmailStatus.SUCCESS
+                    yield email, True
+
+        with patch.object(sender, "send_batch", side_effect=fake_batch):
+            sent, failed = sender.send_from_outbox(outbox, claim_size=2)
+        assert (sent, failed) == (4, 1)
+        assert outbox.counts() == {"sent": 4, "failed": 1}
+
+    def test_transient_failure_goes_back_to_outbox(self, outbox, sender):
+        outbox.enqueue(make_emails(1))
+
+        def fake_batch(emails, **kwargs):
+            for email in emails:
+                email.status = EmailStatus.RETRYING
+                email.scheduled_for = "2999-01-01T00:00:00"
+                yield email, False
+
+        with patch.object(sender, "send_batch", side_effect=fake_batch):
+            sender.send_from_outbox(outbox)
+        assert outbox.counts() == {"pending": 1}
+        assert outbox.claim() == []
+
+    def test_retries_accumulate_across_claims(self, outbox, sender):
+        outbox.enqueue(make_emails(1))
+        seen = []
+
+        def fake_batch(emails, **kwargs):
+            # a 421 every time , given up once max_retries is reached
+            for email in emails:
+                seen.append(email.retry_count)
+                email.retry_count += 1
+                if email.retry_count >= email.max_retries:
+                    email.status = EmailStatus.FAILED
+                else:
+                    email.status = EmailStatus.RETRYING
+                    email.scheduled_for = "2000-01-01T00:00:00"
+                yield email, False
+
+        with patch.object(sender, "send_batch", side_effect=fake_batch):
+            sent, failed = sender.send_from_outbox(outbox)
+        assert seen == list(range(seen[-1] + 1))
+        assert (sent, failed) == (0, 1)
+        assert outbox.counts() == {"failed": 1}
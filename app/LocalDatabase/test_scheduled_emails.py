@@ -0,0 +1,276 @@
+import threading
+import time
+
+import pytest
+
+import app.LocalDatabase.database as db_module
+from app.LocalDatabase.database import LocalDatabase
+from app.LocalDatabase.scheduled_emails import ScheduledEmailDaemon, format_send_at
+from app.Mailer.sender import EmailStatus
+
+
+class FakeClock:
+    def __init__(self, now=1_800_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def fresh_db_path(tmp_path, monkeypatch):
+    test_db = str(tmp_path / "test.db")
+    monkeypatch.setattr(db_module, "DATABASE_PATH", test_db)
+    yield test_db
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def sent():
+    return []
+
+
+@pytest.fixture
+def make_daemon(clock, sent):
+    def factory(**kwargs):
+        kwargs.setdefault("clock", clock)
+        daemon = ScheduledEmailDaemon(
+            lambda email: sent.append(email.to) or True,
+            LocalDatabase(enable_loggin=False),
+            enable_loggin=False,
+            **kwargs,
+        )
+        daemon.init_table()
+        return daemon
+
+    return factory
+
+
+def sent_logs(daemon):
+    with daemon.database.get_conn() as conn:
+        rows = conn.execute("SELECT status, error_message FROM sent_logs ORDER BY id").fetchall()
+    return [tuple(row) for row in rows]
+
+
+def statuses(daemon):
+    with daemon.database.get_conn() as conn:
+        rows = conn.execute("SELECT recipient, status FROM scheduled_emails ORDER BY id").fetchall()
+    return {row["recipient"]: row["status"] for row in rows}
+
+
+class TestScheduledEmailDaemon:
+    def test_sends_in_send_at_order_when_due(self, make_daemon, clock, sent):
+        daemon = make_daemon()
+        daemon.schedule("late@x.com", "s", "b", clock.now + 20)
+        daemon.schedule("early@x.com", "s", "b", clock.now + 10)
+        daemon._refill()
+
+        assert daemon.run_pending() == 0
+        assert daemon.next_due_in() == pytest.approx(10)
+        clock.now += 25
+        assert daemon.run_pending() == 2
+        assert sent == ["early@x.com", "late@x.com"]
+        assert statuses(daemon) == {"late@x.com": "sent", "early@x.com": "sent"}
+
+    def test_dispatch_is_logged_in_sent_logs(self, make_daemon, clock):
+        daemon = make_daemon()
+        daemon.schedule("a@x.com", "hello", "b", clock.now)
+        daemon._refill()
+        daemon.run_pending()
+        with daemon.database.get_conn() as conn:
+            row = conn.execute("SELECT recipient, subject, status FROM sent_logs").fetchone()
+        assert tuple(row) == ("a@x.com", "hello", "success")
+
+    def test_heap_holds_at_most_capacity_rows(self, make_daemon, clock, sent):
+        daemon = make_daemon(capacity=4)
+        daemon.schedule_many(
+            (f"user{i}@x.com", "s", "b", clock.now + i) for i in range(10)
+        )
+        daemon._refill()
+        assert len(daemon) == 4
+        clock.now += 100
+        # the range refill follows the frontier until the table is drained
+        while daemon.run_pending():
+            pass
+        assert sent == [f"user{i}@x.com" for i in range(10)]
+
+    def test_new_rows_are_picked_up_by_id(self, make_daemon, clock, sent):
+        daemon = make_daemon(capacity=2)
+        daemon.schedule_many((f"later{i}@x.com", "s", "b", clock.now + 100 + i) for i in range(3))
+        daemon._refill()
+        daemon.schedule("urgent@x.com", "s", "b", clock.now + 1)
+        daemon.schedule("far@x.com", "s", "b", clock.now + 1000)
+        assert daemon._pickup_new() == 1
+        clock.now += 1
+        daemon.run_pending()
+        assert sent == ["urgent@x.com"]
+
+    def test_pickup_never_overfills_the_heap(self, make_daemon, clock, sent):
+        daemon = make_daemon(capacity=2)
+        daemon.schedule_many((f"later{i}@x.com", "s", "b", clock.now + 100 + i) for i in range(2))
+        daemon._refill()
+        daemon.schedule_many((f"early{i}@x.com", "s", "b", clock.now + 1 + i) for i in range(3))
+        assert daemon._pickup_new() == 2
+        assert len(daemon) == 2
+        clock.now += 200
+        # the rows left out come back through the frontier refill
+        while daemon.run_pending():
+            pass
+        assert sent == ["early0@x.com", "early1@x.com", "early2@x.com", "later0@x.com", "later1@x.com"]
+
+    def test_cancelled_rows_are_skipped(self, make_daemon, clock, sent):
+        daemon = make_daemon()
+        scheduled_id = daemon.schedule("a@x.com", "s", "b", clock.now)
+        daemon._refill()
+        assert daemon.cancel(scheduled_id)
+        daemon.run_pending()
+        assert sent == []
+        assert statuses(daemon) == {"a@x.com": "cancelled"}
+
+    def test_send_failure_is_recorded(self, clock):
+        def send(email):
+            raise RuntimeError("smtp down")
+
+        daemon = ScheduledEmailDaemon(send, LocalDatabase(enable_loggin=False), clock=clock, enable_loggin=False)
+        daemon.init_table()
+        daemon.schedule("a@x.com", "s", "b", clock.now)
+        daemon._refill()
+        daemon.run_pending()
+        assert daemon.failed == 1
+        assert statuses(daemon) == {"a@x.com": "failed"}
+
+    def test_refused_email_error_is_logged(self, clock):
+        def send(email):
+            email.status = EmailStatus.FAILED
+            email.error_message = "550 no such user"
+            return False
+
+        daemon = ScheduledEmailDaemon(send, LocalDatabase(enable_loggin=False), clock=clock, enable_loggin=False)
+        daemon.init_table()
+        daemon.schedule("a@x.com", "s", "b", clock.now)
+        daemon._refill()
+        daemon.run_pending()
+        assert sent_logs(daemon) == [("failed", "550 no such user")]
+
+    def test_transient_failure_is_rescheduled(self, clock):
+        attempts = []
+
+        def send(email):
+            attempts.append(email.retry_count)
+            if len(attempts) > 1:
+                return True
+            email.retry_count += 1
+            email.status = EmailStatus.RETRYING
+            email.error_message = "421 try later"
+            email.scheduled_for = format_send_at(clock.now + 60)
+            return False
+
+        daemon = ScheduledEmailDaemon(send, LocalDatabase(enable_loggin=False), clock=clock, enable_loggin=False)
+        daemon.init_table()
+        daemon.schedule("a@x.com", "s", "b", clock.now)
+        daemon._refill()
+
+        assert daemon.run_pending() == 1
+        assert daemon.failed == 0
+        assert statuses(daemon) == {"a@x.com": "pending"}
+        assert daemon.next_due_in() == pytest.approx(60)
+        clock.now += 60
+        assert daemon.run_pending() == 1
+        assert attempts == [0, 1]
+        assert statuses(daemon) == {"a@x.com": "sent"}
+        assert sent_logs(daemon) == [("retrying", "421 try later"), ("success", None)]
+
+    def test_retry_count_survives_a_restart(self, clock):
+        attempts = []
+
+        def send(email):
+            attempts.append(email.retry_count)
+            email.retry_count += 1
+            email.status = EmailStatus.RETRYING
+            email.error_message = "421 try later"
+            email.scheduled_for = format_send_at(clock.now + 60)
+            return False
+
+        daemon = ScheduledEmailDaemon(send, LocalDatabase(enable_loggin=False), clock=clock, enable_loggin=False)
+        daemon.init_table()
+        daemon.schedule("a@x.com", "s", "b", clock.now)
+        daemon._refill()
+        daemon.run_pending()
+
+        # a fresh daemon on the same database goes on from the saved count
+        restarted = ScheduledEmailDaemon(send, LocalDatabase(enable_loggin=False), clock=clock, enable_loggin=False)
+        restarted.init_table()
+        restarted._refill()
+        clock.now += 60
+        restarted.run_pending()
+        assert attempts == [0, 1]
+
+    def test_rate_limit_defers_every_due_row(self, make_daemon, clock, sent):
+        class Scheduler:
+            def time_until_next_permit(self):
+                return 30.0
+
+        daemon = make_daemon(scheduler=Scheduler())
+        daemon.schedule_many((f"user{i}@x.com", "s", "b", clock.now - i) for i in range(3))
+        daemon.schedule("later@x.com", "s", "b", clock.now + 100)
+        daemon._refill()
+        assert daemon.run_pending() == 0
+        assert sorted(due - clock.now for due, _ in daemon._heap) == [30, 30, 30, 100]
+
+    def test_rate_limit_pushes_the_head_back(self, make_daemon, clock, sent):
+        class Scheduler:
+            wait = 30.0
+
+            def time_until_next_permit(self):
+                return self.wait
+
+            def increment_counters(self):
+                pass
+
+        scheduler = Scheduler()
+        daemon = make_daemon(scheduler=scheduler)
+        daemon.schedule("a@x.com", "s", "b", clock.now)
+        daemon._refill()
+        assert daemon.run_pending() == 0
+        assert daemon.next_due_in() == pytest.approx(30)
+        scheduler.wait = 0.0
+        clock.now += 30
+        assert daemon.run_pending() == 1
+
+    def test_recover_requeues_interrupted_rows(self, make_daemon, clock):
+        daemon = make_daemon()
+        scheduled_id = daemon.schedule("a@x.com", "s", "b", clock.now)
+        daemon._claim(scheduled_id)
+        assert daemon.recover() == 1
+        assert statuses(daemon) == {"a@x.com": "pending"}
+
+    def test_write_only_instance_cannot_run(self):
+        daemon = ScheduledEmailDaemon(database=LocalDatabase(enable_loggin=False), enable_loggin=False)
+        with pytest.raises(ValueError):
+            daemon.run_forever()
+
+    def test_format_send_at_normalises_iso_text(self):
+        assert format_send_at("2026-01-01T10:00:00") == "2026-01-01 10:00:00"
+
+
+class TestDaemonThread:
+    def test_schedule_wakes_the_sleeping_daemon(self, make_daemon, sent):
+        done = threading.Event()
+        daemon = ScheduledEmailDaemon(
+            lambda email: done.set() or True,
+            LocalDatabase(enable_loggin=False),
+            rescan_interval=None,
+            enable_loggin=False,
+        )
+        with daemon:
+            daemon.schedule("far@x.com", "s", "b", time.time() + 3600)
+            started = time.monotonic()
+            daemon.schedule("soon@x.com", "s", "b", time.time() + 0.2)
+            assert done.wait(5)
+            # fired on the send_at of the row , not on a polling tick
+            assert 0.1 <= time.monotonic() - started < 2
+        assert daemon.sent == 1
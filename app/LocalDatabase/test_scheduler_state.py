@@ -0,0 +1,151 @@
+import json
+from datetime import datetime
+
+import pytest
+
+import app.LocalDatabase.database as db_module
+from app.LocalDatabase.database import LocalDatabase
+from app.LocalDatabase.scheduler_state import SchedulerStateStore
+from app.scheduler.scheduler import EmailScheduler
+
+
+class FakeClock:
+    def __init__(self, now=1_800_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def fresh_db_path(tmp_path, monkeypatch):
+    test_db = str(tmp_path / "test.db")
+    monkeypatch.setattr(db_module, "DATABASE_PATH", test_db)
+    yield test_db
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def make_store(clock):
+    stores = []
+
+    def factory(**kwargs):
+        kwargs.setdefault("flush_every", 3)
+        kwargs.setdefault("flush_interval", 60)
+        store = SchedulerStateStore(clock=clock, enable_loggin=False, **kwargs)
+        stores.append(store)
+        return store
+
+    yield factory
+    for store in stores:
+        store.close()
+
+
+def saved_times(database):
+    with database.get_conn() as conn:
+        row = conn.execute("SELECT sent_times FROM scheduler_state").fetchone()
+    return None if row is None else json.loads(row["sent_times"])
+
+
+def add_sent_log(database, sent_at, status="success"):
+    with database.get_conn() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sent_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                recipient TEXT NOT NULL ,
+                subject TEXT ,
+                sent_at TIMESTAMP ,
+                status TEXT ,
+                error_message TEXT
+            )
+        """)
+        conn.execute(
+            "INSERT INTO sent_logs (recipient, sent_at, status) VALUES (?, ?, ?)",
+            ("a@x.com", datetime.fromtimestamp(sent_at).strftime("%Y-%m-%d %H:%M:%S"), status),
+        )
+
+
+class TestCheckpoint:
+    def test_records_are_batched(self, make_store):
+        store = make_store()
+        store.record()
+        store.record()
+        assert saved_times(store.database) is None
+        store.record()
+        assert len(saved_times(store.database)) == 3
+        assert store.checkpoints == 1
+
+    def test_interval_forces_a_checkpoint(self, make_store, clock):
+        store = make_store(flush_every=100, flush_interval=10)
+        store.record()
+        clock.now += 10
+        store.record()
+        assert len(saved_times(store.database)) == 2
+
+    def test_flush_without_new_sends_does_not_write(self, make_store):
+        store = make_store()
+        store.flush()
+        assert store.checkpoints == 0
+
+    def test_round_trip(self, make_store, clock):
+        store = make_store()
+        store.record(clock.now - 7200)
+        store.record(clock.now - 60)
+        store.close()
+
+        ages = make_store().load()
+        assert ages == [7200, 60]
+
+    def test_sends_outside_the_window_are_dropped(self, make_store, clock):
+        store = make_store()
+        store.record(clock.now - 90_000)
+        store.record(clock.now - 10)
+        store.close()
+        assert saved_times(store.database) == [clock.now - 10]
+
+
+class TestRebuild:
+    def test_rebuilds_from_sent_logs_without_checkpoint(self, make_store, clock):
+        database = LocalDatabase(enable_loggin=False)
+        add_sent_log(database, clock.now - 600)
+        add_sent_log(database, clock.now - 300, status="failed")
+        add_sent_log(database, clock.now - 100_000)
+
+        assert make_store(database=database).load() == [600]
+
+    def test_sent_logs_after_the_checkpoint_are_added(self, make_store, clock):
+        store = make_store()
+        store.record(clock.now - 120)
+        store.close()
+        clock.now += 60
+        add_sent_log(store.database, clock.now - 30)
+
+        assert make_store().load() == [180, 30]
+
+    def test_no_history_at_all(self, make_store):
+        assert make_store().load() == []
+
+
+class TestSchedulerRestart:
+    def test_counts_survive_a_restart(self, make_store):
+        scheduler = EmailScheduler(enable_loggin=False, state_store=make_store())
+        for _ in range(4):
+            scheduler.increment_counters()
+        scheduler.checkpoint()
+
+        restarted = EmailScheduler(enable_loggin=False, state_store=make_store())
+        assert restarted.email_sent_during_an_hour == 4
+        assert restarted.email_sent_during_a_day == 4
+
+    def test_old_sends_only_count_for_the_day(self, make_store, clock):
+        store = make_store()
+        store.record(clock.now - 2 * 3600)
+        store.close()
+
+        scheduler = EmailScheduler(enable_loggin=False, state_store=make_store())
+        assert scheduler.email_sent_during_an_hour == 0
+        assert scheduler.email_sent_during_a_day == 1
@@ -0,0 +1,426 @@
+from __future__ import annotations
+import asyncio
+import base64
+import logging
+import random
+import ssl
+from datetime import datetime
+from smtplib import SMTPRecipientsRefused, SMTPResponseException, SMTPServerDisconnected
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+
+from app.Mailer.sender import (
+    EMAIL,
+    EmailPriority,
+    EmailStatus,
+    app_password,
+    email as default_email,
+)
+from app.Mailer.attachment_cache import AttachmentCache
+from app.Mailer.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.Mailer.message_builder import MessageBuilder
+from app.Mailer.retry import ErrorKind, classify_smtp_error, compute_backoff
+from app.scheduler.scheduler import EmailScheduler
+from utils.normalize_recipients import normalize_recipients
+from utils.valid_email_check import EmailManager
+
+"""
+asyncio smtp engine , one event loop drives many deliveries and pacing timers
+"""
+
+
+class AsyncSMTPConnection:
+    """minimal smtp client speaking the protocol over asyncio streams"""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        use_tls: bool = True,
+        starttls: bool = False,
+        timeout: float = 30.0,
+        local_hostname: str = "localhost",
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.starttls = starttls
+        self.timeout = timeout
+        self.local_hostname = local_hostname
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.esmtp_features: Dict[str, str] = {}
+
+    @property
+    def is_connected(self) -> bool:
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def _read_reply(self) -> Tuple[int, str]:
+        if self.reader is None:
+            raise SMTPServerDisconnected("not connected")
+        lines: List[str] = []
+        while True:
+            raw = await asyncio.wait_for(self.reader.readline(), self.timeout)
+            if not raw:
+                raise SMTPServerDisconnected("connection closed by the server")
+            line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+            lines.append(line[4:])
+            # "250-" continues a multi line reply , "250 " ends it
+            if len(line) < 4 or line[3] != "-":
+                return int(line[:3]), "\n".join(lines)
+
+    async def command(self, line: str, expected: Tuple[int, ...] = (250,)) -> Tuple[int, str]:
+        if self.writer is None:
+            raise SMTPServerDisconnected("not connected")
+        self.writer.write(line.encode("utf-8") + b"\r\n")
+        await self.writer.drain()
+        code, message = await self._read_reply()
+        if code not in expected:
+            raise SMTPResponseException(code, message)
+        return code, message
+
+    async def _ehlo(self) -> None:
+        _, message = await self.command(f"EHLO {self.local_hostname}")
+        self.esmtp_features = {}
+        for feature in message.split("\n")[1:]:
+            name, _, params = feature.partition(" ")
+            self.esmtp_features[name.upper()] = params
+
+    async def connect(self, user: Optional[str] = None, password: Optional[str] = None) -> None:
+        context = ssl.create_default_context() if (self.use_tls or self.starttls) else None
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                self.host, self.port, ssl=context if self.use_tls else None
+            ),
+            self.timeout,
+        )
+        try:
+            code, message = await self._read_reply()
+            if code != 220:
+                raise SMTPResponseException(code, message)
+            await self._ehlo()
+            if self.starttls and not self.use_tls:
+                await self.command("STARTTLS", expected=(220,))
+                await self.writer.start_tls(context)
+                await self._ehlo()
+            if user and password:
+                token = base64.b64encode(f"\0{user}\0{password}".encode("utf-8")).decode()
+                await self.command(f"AUTH PLAIN {token}", expected=(235,))
+        except BaseException:
+            # greeting , tls or auth failed : do not leave the socket half open
+            await self.quit()
+            raise
+
+    async def sendmail(
+        self, from_addr: str, recipients: List[str], message: bytes
+    ) -> Dict[str, Tuple[int, str]]:
+        await self.command(f"MAIL FROM:<{from_addr}>")
+        refused: Dict[str, Tuple[int, str]] = {}
+        for recipient in recipients:
+            try:
+                await self.command(f"RCPT TO:<{recipient}>", expected=(250, 251))
+            except SMTPResponseException as e:
+                refused[recipient] = (e.smtp_code, str(e.smtp_error))
+        if len(refused) == len(recipients):
+            await self.command("RSET")
+            first = next(iter(refused.values()))
+            raise SMTPResponseException(first[0], first[1])
+        await self.command("DATA", expected=(354,))
+        # dot stuffing : a line starting with "." gets an extra one
+        lines = message.replace(b"\r\n", b"\n").split(b"\n")
+        payload = b"\r\n".join(b"." + l if l.startswith(b".") else l for l in lines)
+        if self.writer is None:
+            raise SMTPServerDisconnected("not connected")
+        terminator = b".\r\n" if payload.endswith(b"\r\n") else b"\r\n.\r\n"
+        self.writer.write(payload + terminator)
+        await self.writer.drain()
+        code, reply = await self._read_reply()
+        if code != 250:
+            raise SMTPResponseException(code, reply)
+        return refused
+
+    async def noop(self) -> bool:
+        try:
+            await self.command("NOOP")
+            return True
+        except Exception:
+            return False
+
+    async def quit(self) -> None:
+        if self.writer is None:
+            return
+        try:
+            await self.command("QUIT", expected=(221,))
+        except Exception:
+            pass
+        finally:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except Exception:
+                pass
+            self.reader = self.writer = None
+
+
+class AsyncEmailSender:
+    """
+    asyncio counterpart of EmailSender , keeps a small pool of smtp connections
+    and awaits pacing delays instead of blocking the process
+    """
+
+    def __init__(
+        self,
+        email_user: Union[str, None] = default_email,
+        email_app_password: Union[str, None] = app_password,
+        host: str = "smtp.gmail.com",
+        port: int = 465,
+        use_tls: bool = True,
+        starttls: bool = False,
+        max_connections: int = 4,
+        retry_base_delay: float = 30.0,
+        retry_max_delay: float = 3600.0,
+        enable_loggin: bool = True,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        self.email_user = email_user
+        self.email_app_password = email_app_password
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.starttls = starttls
+        self.max_connections = max_connections
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.breaker = breaker or CircuitBreaker(enable_loggin=enable_loggin)
+        self.message_builder = MessageBuilder(
+            AttachmentCache(enable_loggin=enable_loggin)
+        )
+        self.logger = logging.getLogger(__name__)
+        if enable_loggin:
+            logging.basicConfig(
+                level=logging.INFO,
+                format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+            )
+        else:
+            self.logger.setLevel(logging.CRITICAL + 1)
+
+        # idle connections , created lazily up to max_connections
+        self._idle: List[AsyncSMTPConnection] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    # ============================================================================
+    # CONNECTIONS
+    # ============================================================================
+    async def _acquire(self) -> AsyncSMTPConnection:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_connections)
+        await self._slots.acquire()
+        try:
+            while self._idle:
+                connection = self._idle.pop()
+                if connection.is_connected and await connection.noop():
+                    return connection
+                await connection.quit()
+            connection = AsyncSMTPConnection(
+                self.host, self.port, use_tls=self.use_tls, starttls=self.starttls
+            )
+            await connection.connect(self.email_user, self.email_app_password)
+            return connection
+        except Exception:
+            self._slots.release()
+            raise
+
+    async def _release(self, connection: AsyncSMTPConnection, broken: bool = False) -> None:
+        if broken or not connection.is_connected:
+            await connection.quit()
+        else:
+            self._idle.append(connection)
+        if self._slots is not None:
+            self._slots.release()
+
+    async def close(self) -> None:
+        while self._idle:
+            await self._idle.pop().quit()
+        self.logger.info("async sender closed\n")
+
+    # ============================================================================
+    # MESSAGE BUILDING
+    # ============================================================================
+    async def build_message(self, email: EMAIL) -> bytes:
+        if email.attachments:
+            # a cache miss reads the file , keep that off the event loop
+            message = await asyncio.to_thread(
+                self.message_builder.build_string, self.email_user or "", email
+            )
+        else:
+            message = self.message_builder.build_string(self.email_user or "", email)
+        return message.encode("utf-8")
+
+    # ============================================================================
+    # SENDING
+    # ============================================================================
+    async def send_single_email(self, email: EMAIL) -> bool:
+        recipient_list = normalize_recipients(email.to)
+        if not recipient_list:
+            self.logger.error("no recipient provided\n")
+            email.status = EmailStatus.FAILED
+            email.error_message = "no recipient"
+            return False
+        for r in recipient_list:
+            if not EmailManager.valid_email_pattern(r):
+                self.logger.error(f"invalid email : {r}\n")
+                email.status = EmailStatus.FAILED
+                email.error_message = f"invalid address: {r}"
+                return False
+
+        envelope = self.message_builder.envelope_recipients(email)
+        message = await self.build_message(email)
+
+        while email.retry_count < email.max_retries:
+            if not self.breaker.allow_request():
+                error = CircuitOpenError(
+                    f"smtp circuit open , next probe in {self.breaker.retry_after():.0f}s"
+                )
+                if not await self._handle_failure(
+                    email, error, min_delay=self.breaker.retry_after(), count_attempt=False
+                ):
+                    return False
+                continue
+            try:
+                connection = await self._acquire()
+            except Exception as e:
+                self.breaker.record(e)
+                if not await self._handle_failure(email, e):
+                    return False
+                continue
+            broken = False
+            try:
+                refused = await connection.sendmail(self.email_user or "", envelope, message)
+                self.breaker.record(None)
+                if refused:
+                    # partial RCPT refusal : the accepted addresses have the mail ,
+                    # a retry only goes to the refused ones , the session goes
+                    # back to the pool before the backoff is awaited
+                    envelope = [address for address in envelope if address in refused]
+                    await self._release(connection)
+                    connection = None
+                    if not await self._handle_failure(email, SMTPRecipientsRefused(refused)):
+                        return False
+                    continue
+                email.status = EmailStatus.SUCCESS
+                email.priority = EmailPriority.NORMAL
+                email.sent_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                email.error_message = None
+                self.logger.info(f"email sent successfully to {email.to}\n")
+                return True
+            except Exception as e:
+                self.breaker.record(e)
+                broken = not isinstance(e, SMTPResponseException)
+                await self._release(connection, broken=broken)
+                connection = None
+                if not await self._handle_failure(email, e):
+                    return False
+            finally:
+                if connection is not None:
+                    await self._release(connection, broken=broken)
+
+        email.status = EmailStatus.FAILED
+        self.logger.error(f"all {email.max_retries} attempts exhausted for {email.to}\n")
+        return False
+
+    async def _handle_failure(
+        self,
+        email: EMAIL,
+        error: Exception,
+        min_delay: float = 0.0,
+        count_attempt: bool = True,
+    ) -> bool:
+        # returns True when the send should be attempted again , an open circuit
+        # (count_attempt=False) only waits , the server was never reached
+        if count_attempt:
+            email.retry_count += 1
+        email.error_message = str(error)
+        kind = classify_smtp_error(error)
+        if kind is ErrorKind.PERMANENT or email.retry_count >= email.max_retries:
+            email.status = EmailStatus.FAILED
+            self.logger.error(
+                f"giving up on {email.to} after {email.retry_count} attempt(s) ({kind.value}) : {error}\n"
+            )
+            return False
+        delay = max(
+            min_delay,
+            compute_backoff(
+                email.retry_count, base=self.retry_base_delay, cap=self.retry_max_delay
+            ),
+        )
+        email.status = EmailStatus.RETRYING
+        self.logger.warning(
+            f"attempt {email.retry_count}/{email.max_retries} failed for {email.to} "
+            f"retrying in {delay:.0f}s : {error}\n"
+        )
+        # awaiting only parks this delivery , the loop keeps serving the others
+        await asyncio.sleep(delay)
+        return True
+
+    async def send_batch(
+        self,
+        emails: Iterable[EMAIL],
+        concurrency: int = 100,
+        scheduler: Optional[EmailScheduler] = None,
+        pacing: Optional[Tuple[int, int]] = None,
+    ) -> AsyncIterator[Tuple[EMAIL, bool]]:
+        """
+        drive up to 'concurrency' deliveries on the loop and yield results as
+        they complete , a fixed set of workers pulls from the iterable so memory
+        stays flat whatever the campaign size , pacing is (min_seconds , max_seconds)
+        """
+        if concurrency < 1:
+            raise ValueError(f"concurrency must be at least 1 got {concurrency}\n")
+        pending = iter(emails)
+        # bounded : a slow consumer parks the workers instead of piling up results
+        results: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+        done = object()
+        in_flight = 0
+
+        async def worker() -> None:
+            nonlocal in_flight
+            try:
+                while True:
+                    # sends still in flight hold a reservation on the quota
+                    if scheduler is not None and scheduler.remaining_quota() <= in_flight:
+                        self.logger.warning("rate limit reached - worker stopping\n")
+                        return
+                    email = next(pending, None)
+                    if email is None:
+                        return
+                    in_flight += 1
+                    try:
+                        success = await self.send_single_email(email)
+                    finally:
+                        in_flight -= 1
+                    if success and scheduler is not None:
+                        scheduler.increment_counters()
+                    await results.put((email, success))
+                    if pacing is not None:
+                        min_seconds, max_seconds = pacing
+                        if scheduler is not None:
+                            await scheduler.async_random_email_interval_between_delivery(
+                                max_seconds=max_seconds, min_seconds=min_seconds
+                            )
+                        else:
+                            await asyncio.sleep(random.randint(min_seconds, max_seconds))
+            finally:
+                await results.put(done)
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        finished = 0
+        try:
+            while finished < len(workers):
+                item = await results.get()
+                if item is done:
+                    finished += 1
+                    continue
+                yield item
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
@@ -0,0 +1,129 @@
+from __future__ import annotations
+import base64
+import logging
+import mimetypes
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from email.mime.base import MIMEBase
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+"""
+encode once attachment cache , a campaign attachment is read and base64 encoded
+a single time and the ready MIME part is shared by every message of the run
+"""
+
+# (absolute path , mtime in ns , size in bytes)
+CacheKey = Tuple[str, int, int]
+
+
+class AttachmentCache:
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        mmap_threshold: int = 1024 * 1024,
+        enable_loggin: bool = True,
+    ) -> None:
+        # budget for the encoded parts kept in memory
+        self.max_bytes = max_bytes
+        # files bigger than this are memory mapped instead of read in one go
+        self.mmap_threshold = mmap_threshold
+        self.logger = logging.getLogger(__name__)
+        if not enable_loggin:
+            self.logger.setLevel(logging.CRITICAL + 1)
+
+        self._entries: "OrderedDict[CacheKey, Tuple[MIMEBase, int]]" = OrderedDict()
+        # latest key per path , so a modified file drops its stale version
+        self._latest: Dict[str, CacheKey] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(path: str) -> CacheKey:
+        absolute = os.path.abspath(path)
+        stat = os.stat(absolute)
+        return absolute, stat.st_mtime_ns, stat.st_size
+
+    def _read_encoded(self, path: str, size: int) -> bytes:
+        with open(path, "rb") as handle:
+            if size >= self.mmap_threshold:
+                # the kernel pages the file in , no full python copy of the raw bytes
+                with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return base64.encodebytes(mapped)
+            return base64.encodebytes(handle.read())
+
+    def _build_part(self, key: CacheKey) -> MIMEBase:
+        path, _, size = key
+        mime, _ = mimetypes.guess_type(path)
+        maintype, subtype = (mime or "application/octet-stream").split("/", 1)
+        part = MIMEBase(maintype, subtype, name=Path(path).name)
+        part.set_payload(self._read_encoded(path, size).decode("ascii"))
+        part["Content-Transfer-Encoding"] = "base64"
+        part.add_header("Content-Disposition", "attachment", filename=Path(path).name)
+        return part
+
+    def get_part(self, path: str) -> MIMEBase:
+        """
+        the encoded MIME part for 'path' , parts are never mutated after being
+        built so the same instance is safely attached to many messages
+        """
+        key = self.make_key(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # file io happens outside of the lock
+        try:
+            part = self._build_part(key)
+        except Exception as e:
+            self.logger.error(f"could not encode the attachment {path} : {e}\n")
+            raise
+        cost = len(part.get_payload())
+
+        with self._lock:
+            stale = self._latest.get(key[0])
+            if stale is not None and stale != key:
+                self._evict(stale)
+            if cost > self.max_bytes:
+                self.logger.warning(
+                    f"attachment {path} is larger than the cache budget , not cached\n"
+                )
+                return part
+            if key not in self._entries:
+                self._entries[key] = (part, cost)
+                self._latest[key[0]] = key
+                self._size += cost
+            while self._size > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._evict(oldest)
+            self.logger.info(f"attachment cached {key[0]} ({cost} encoded bytes)\n")
+            return part
+
+    def _evict(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._size -= entry[1]
+        if self._latest.get(key[0]) == key:
+            del self._latest[key[0]]
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._latest.clear()
+            self._size = 0
@@ -0,0 +1,261 @@
+from __future__ import annotations
+import argparse
+from contextlib import nullcontext
+import gc
+import json
+import statistics
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.Mailer.sender import EMAIL, EmailSender
+from app.Mailer.smtp_sink import SMTPSink
+from app.Mailer.transport import NULL, SINK
+
+"""
+offline throughput benchmark , drives EmailSender against the local smtp sink
+
+    PYTHONPATH=. python -m app.Mailer.benchmark --messages 1000 10000 100000
+    PYTHONPATH=. python -m app.Mailer.benchmark --objects 100000
+    PYTHONPATH=. python -m app.Mailer.benchmark --transport null
+
+the sink runs in the same process and shares the GIL with the sender , use
+--latency to get closer to a real network round trip , --transport null drops
+the wire entirely and measures everything else (mime build , queues , workers)
+"""
+
+BENCH_SENDER = "bench@example.com"
+
+
+@dataclass
+class BenchmarkResult:
+    messages: int
+    concurrency: int
+    sent: int
+    failed: int
+    elapsed: float
+    p50_ms: float
+    p99_ms: float
+    peak_memory_mb: Optional[float]
+
+    @property
+    def per_second(self) -> float:
+        return self.sent / self.elapsed if self.elapsed else 0.0
+
+    def row(self) -> str:
+        memory = f"{self.peak_memory_mb:10.1f}" if self.peak_memory_mb is not None else f"{'-':>10}"
+        return (
+            f"{self.messages:>9} {self.concurrency:>5} {self.sent:>9} {self.failed:>7} "
+            f"{self.elapsed:9.2f} {self.per_second:10.1f} {self.p50_ms:8.2f} "
+            f"{self.p99_ms:8.2f} {memory}"
+        )
+
+
+HEADER = (
+    f"{'messages':>9} {'conc':>5} {'sent':>9} {'failed':>7} {'seconds':>9} "
+    f"{'msgs/sec':>10} {'p50 ms':>8} {'p99 ms':>8} {'peak MB':>10}"
+)
+
+
+def percentile(samples: Sequence[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def generate_emails(count: int, body_size: int = 2048) -> Iterator[EMAIL]:
+    # generator , so 100k messages are never all alive at once
+    body = ("lorem ipsum dolor sit amet " * (body_size // 27 + 1))[:body_size]
+    for index in range(count):
+        yield EMAIL(
+            to=f"recipient{index}@example.com",
+            subject="benchmark campaign",
+            body=body,
+            email_id=f"bench-{index}",
+            max_retries=1,
+        )
+
+
+def make_sender(sink: Optional[SMTPSink], concurrency: int) -> EmailSender:
+    # no sink : null transport , messages are built then dropped
+    if sink is None:
+        return EmailSender(
+            email_user=BENCH_SENDER,
+            email_app_password="bench",
+            enable_loggin=False,
+            transport=NULL,
+        )
+    return EmailSender(
+        email_user=BENCH_SENDER,
+        email_app_password="bench",
+        enable_loggin=False,
+        min_sessions=1,
+        max_sessions=concurrency,
+        smtp_options={
+            "host": sink.host,
+            "port": sink.port,
+            "smtp_ssl": False,
+            "smtp_starttls": False,
+        },
+    )
+
+
+def _drive(sender: EmailSender, messages: int, concurrency: int, body_size: int) -> Tuple[int, int]:
+    sent = failed = 0
+    # drain_retries=False : a 4xx is counted as a failure instead of waiting
+    # out the backoff , the benchmark measures the send path only
+    for _, success in sender.send_batch(
+        generate_emails(messages, body_size), concurrency=concurrency, drain_retries=False
+    ):
+        if success:
+            sent += 1
+        else:
+            failed += 1
+    return sent, failed
+
+
+def measure_peak_memory(
+    sink: Optional[SMTPSink], messages: int, concurrency: int = 4, body_size: int = 2048
+) -> float:
+    # separate pass , tracemalloc slows every allocation (sink thread included)
+    # by several times and would skew the throughput numbers
+    sender = make_sender(sink, concurrency)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        _drive(sender, messages, concurrency, body_size)
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    finally:
+        tracemalloc.stop()
+        sender.close()
+
+
+def run_benchmark(
+    sink: Optional[SMTPSink],
+    messages: int,
+    concurrency: int = 4,
+    body_size: int = 2048,
+    trace_memory: bool = True,
+) -> BenchmarkResult:
+    sender = make_sender(sink, concurrency)
+    latencies: List[float] = []
+    send_single_email = sender.send_single_email
+
+    def timed_send(email: EMAIL, defer_retry: bool = True) -> bool:
+        started = time.perf_counter()
+        try:
+            return send_single_email(email, defer_retry)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    sender.send_single_email = timed_send
+
+    gc.collect()
+    started = time.perf_counter()
+    try:
+        sent, failed = _drive(sender, messages, concurrency, body_size)
+        elapsed = time.perf_counter() - started
+    finally:
+        sender.close()
+
+    peak = measure_peak_memory(sink, messages, concurrency, body_size) if trace_memory else None
+    return BenchmarkResult(
+        messages=messages,
+        concurrency=concurrency,
+        sent=sent,
+        failed=failed,
+        elapsed=elapsed,
+        p50_ms=statistics.median(latencies) * 1000 if latencies else 0.0,
+        p99_ms=percentile(latencies, 99) * 1000,
+        peak_memory_mb=peak,
+    )
+
+
+def benchmark_email_objects(count: int = 100000, body_size: int = 2048) -> Dict[str, float]:
+    """
+    per object memory of a campaign held in memory and to_dict / from_dict
+    throughput , no smtp involved
+    """
+    # json rows like the outbox stores them , every row decodes to its own strings
+    rows = [json.dumps(email.to_dict()) for email in generate_emails(count, body_size)]
+
+    gc.collect()
+    started = time.perf_counter()
+    emails = [EMAIL.from_dict(json.loads(row)) for row in rows]
+    from_dict_elapsed = time.perf_counter() - started
+    del emails
+
+    gc.collect()
+    tracemalloc.start()
+    emails = [EMAIL.from_dict(json.loads(row)) for row in rows]
+    per_object = tracemalloc.get_traced_memory()[0] / count
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for email in emails:
+        email.to_dict()
+    to_dict_elapsed = time.perf_counter() - started
+    return {
+        "objects": count,
+        "bytes_per_object": per_object,
+        "from_dict_per_second": count / from_dict_elapsed,
+        "to_dict_per_second": count / to_dict_elapsed,
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> List[BenchmarkResult]:
+    parser = argparse.ArgumentParser(description="EmailSender throughput against the local smtp sink")
+    parser.add_argument("--messages", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--body-size", type=int, default=2048)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per smtp reply")
+    parser.add_argument("--data-latency", type=float, default=0.0, help="extra seconds after DATA")
+    parser.add_argument("--transient-rate", type=float, default=0.0)
+    parser.add_argument("--permanent-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--transport", choices=(SINK, NULL), default=SINK)
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced memory pass")
+    parser.add_argument(
+        "--objects", type=int, default=0, help="only measure EMAIL memory / serialization for N objects"
+    )
+    args = parser.parse_args(argv)
+
+    if args.objects:
+        report = benchmark_email_objects(args.objects, args.body_size)
+        for name, value in report.items():
+            print(f"{name:>22} : {value:,.1f}")
+        return []
+
+    results = []
+    server = (
+        SMTPSink(
+            latency=args.latency,
+            data_latency=args.data_latency,
+            transient_rate=args.transient_rate,
+            permanent_rate=args.permanent_rate,
+            seed=args.seed,
+            enable_loggin=False,
+        )
+        if args.transport == SINK
+        else nullcontext()
+    )
+    with server as sink:
+        print(HEADER)
+        for count in args.messages:
+            result = run_benchmark(
+                sink,
+                count,
+                concurrency=args.concurrency,
+                body_size=args.body_size,
+                trace_memory=not args.no_memory,
+            )
+            results.append(result)
+            print(result.row(), flush=True)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+from __future__ import annotations
+import logging
+import smtplib
+import socket
+import threading
+import time
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional
+
+from app.Mailer.retry import TRANSIENT_SMTP_CODES
+
+"""
+circuit breaker around the smtp transport : after a run of transport failures
+(auth lockout , 421 throttling , dropped connections) sends are deferred instead
+of hammering the server , a single probe decides when to resume
+"""
+
+
+class CircuitState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(ConnectionError):
+    # raised in place of a send while the circuit is open , classified transient
+    pass
+
+
+def is_transport_failure(error: BaseException) -> bool:
+    """
+    failures that say something about the server or the account , not about
+    one recipient : a 550 "no such user" must never trip the breaker
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code in TRANSIENT_SMTP_CODES or error.smtp_code in (530, 534, 535)
+    return isinstance(
+        error,
+        (
+            smtplib.SMTPServerDisconnected,
+            smtplib.SMTPConnectError,
+            ConnectionError,
+            TimeoutError,
+            socket.timeout,
+        ),
+    )
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 60.0,
+        max_reset_timeout: float = 900.0,
+        clock: Callable[[], float] = time.monotonic,
+        enable_loggin: bool = True,
+    ) -> None:
+        if failure_threshold < 1:
+            raise ValueError(f"failure_threshold must be at least 1 got {failure_threshold}\n")
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        # every failed probe doubles the open period up to this cap
+        self.max_reset_timeout = max_reset_timeout
+        self.clock = clock
+        self.logger = logging.getLogger(__name__)
+        if not enable_loggin:
+            self.logger.setLevel(logging.CRITICAL + 1)
+
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._open_for = reset_timeout
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.trips = 0
+        self.last_error: Optional[str] = None
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        # snapshots of transitions made under the lock , handed to the
+        # listeners once it is released so they may call back into the breaker
+        self._pending: List[Dict[str, Any]] = []
+
+    # ============================================================================
+    # STATE
+    # ============================================================================
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            return self._state
+
+    def retry_after(self) -> float:
+        # seconds until the next probe is allowed , 0 when sends may go out
+        with self._lock:
+            if self._state is not CircuitState.OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self._open_for - self.clock())
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return self._snapshot()
+
+    def _snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self._state.value,
+            "consecutive_failures": self._failures,
+            "trips": self.trips,
+            "open_for": self._open_for,
+            "last_error": self.last_error,
+        }
+
+    def add_listener(self, callback: Callable[[Dict[str, Any]], None]) -> None:
+        # called with a snapshot on every state change (gui , metrics ...)
+        self._listeners.append(callback)
+
+    def _transition(self, state: CircuitState) -> None:
+        # caller holds the lock
+        if state is self._state:
+            return
+        self.logger.warning(f"smtp circuit {self._state.value} -> {state.value}\n")
+        self._state = state
+        self._pending.append(self._snapshot())
+
+    def _notify(self) -> None:
+        # caller must NOT hold the lock
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for snapshot in pending:
+            for callback in self._listeners:
+                try:
+                    callback(snapshot)
+                except Exception as e:
+                    self.logger.error(f"circuit breaker listener crashed : {e}\n")
+
+    # ============================================================================
+    # GATE
+    # ============================================================================
+    def allow_request(self) -> bool:
+        try:
+            return self._allow_request()
+        finally:
+            self._notify()
+
+    def _allow_request(self) -> bool:
+        with self._lock:
+            if self._state is CircuitState.CLOSED:
+                return True
+            if self._state is CircuitState.OPEN:
+                if self.clock() - self._opened_at < self._open_for:
+                    return False
+                self._transition(CircuitState.HALF_OPEN)
+            # half open : exactly one probe at a time
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            self._open_for = self.reset_timeout
+            self._transition(CircuitState.CLOSED)
+        self._notify()
+
+    def release(self) -> None:
+        # the let through attempt ended without reaching the server (the
+        # message could not be built , a bug ...) : free the probe slot , no verdict
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self.last_error = str(error) if error is not None else None
+            if self._state is CircuitState.HALF_OPEN:
+                # the probe failed , stay away longer this time
+                self._probe_in_flight = False
+                self._open_for = min(self.max_reset_timeout, self._open_for * 2)
+                self._open()
+            else:
+                self._failures += 1
+                if self._state is CircuitState.CLOSED and self._failures >= self.failure_threshold:
+                    self._open()
+        self._notify()
+
+    def _open(self) -> None:
+        self._opened_at = self.clock()
+        self.trips += 1
+        self._transition(CircuitState.OPEN)
+        self.logger.error(
+            f"smtp transport looks down ({self.last_error}) , deferring sends for {self._open_for:.0f}s\n"
+        )
+
+    def record(self, error: Optional[BaseException]) -> None:
+        # outcome of an attempt that allow_request() let through : only a server
+        # answer closes the circuit , anything else just frees the probe
+        if error is not None and is_transport_failure(error):
+            self.record_failure(error)
+        elif error is None or isinstance(
+            error, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)
+        ):
+            self.record_success()
+        else:
+            self.release()
@@ -0,0 +1,228 @@
+from __future__ import annotations
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Iterator, Optional, Tuple
+
+"""
+pool of warm authenticated smtp sessions shared by the sender
+"""
+
+
+class PoolExhaustedError(RuntimeError):
+    pass
+
+
+class SMTPConnectionPool:
+    """
+    Keeps between min_sessions and max_sessions logged-in yagmail sessions.
+    Idle sessions are probed with NOOP before being handed out and are
+    transparently reconnected when the server dropped them.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Any],
+        min_sessions: int = 1,
+        max_sessions: int = 4,
+        idle_timeout: float = 300.0,
+        probe_after: float = 5.0,
+        acquire_timeout: Optional[float] = 60.0,
+        enable_loggin: bool = True,
+    ) -> None:
+        if min_sessions < 0 or max_sessions < 1 or min_sessions > max_sessions:
+            raise ValueError(
+                f"invalid pool size min={min_sessions} max={max_sessions}\n"
+            )
+        self.factory = factory
+        self.min_sessions = min_sessions
+        self.max_sessions = max_sessions
+        # a session idle for longer than this is closed instead of reused
+        self.idle_timeout = idle_timeout
+        # a session idle for longer than this gets a NOOP before being reused
+        self.probe_after = probe_after
+        self.acquire_timeout = acquire_timeout
+
+        self.logger = logging.getLogger(__name__)
+        if not enable_loggin:
+            self.logger.setLevel(logging.CRITICAL + 1)
+
+        # (session , last time it was released)
+        self._idle: Deque[Tuple[Any, float]] = deque()
+        self._total = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+        # the first session is kept around for callers that still need a single handle
+        self.primary: Optional[Any] = None
+        for _ in range(self.min_sessions):
+            session = self._open_session()
+            if self.primary is None:
+                self.primary = session
+            self._idle.append((session, time.monotonic()))
+            self._total += 1
+        self.logger.info(f"smtp pool ready with {self._total} warm session(s)\n")
+
+    # ============================================================================
+    # SESSION LIFECYCLE
+    # ============================================================================
+    def _open_session(self) -> Any:
+        try:
+            session = self.factory()
+            # yagmail only connects lazily, force the TLS + AUTH handshake now
+            if getattr(session, "smtp", None) is None and hasattr(session, "login"):
+                session.login()
+            return session
+        except Exception as e:
+            self.logger.error(f"could not open a new smtp session : {e}\n")
+            raise
+
+    def _close_session(self, session: Any) -> None:
+        try:
+            session.close()
+        except Exception as e:
+            self.logger.warning(f"error while closing an smtp session : {e}\n")
+
+    def is_alive(self, session: Any) -> bool:
+        connection = getattr(session, "smtp", None)
+        if connection is None:
+            return False
+        try:
+            code, _ = connection.noop()
+            return code == 250
+        except Exception as e:
+            self.logger.info(f"smtp session failed the NOOP probe : {e}\n")
+            return False
+
+    def _reconnect(self, session: Any) -> Any:
+        self.logger.info("reconnecting a dropped smtp session\n")
+        # login() opens a new connection , drop the stale socket first so it
+        # is not leaked (no QUIT , the server is most likely gone already)
+        stale = getattr(session, "smtp", None)
+        if stale is not None:
+            try:
+                stale.close()
+            except Exception:
+                pass
+        try:
+            session.login()
+            return session
+        except Exception as e:
+            self.logger.warning(f"in place reconnect failed opening a fresh one : {e}\n")
+            self._close_session(session)
+            return self._open_session()
+
+    # ============================================================================
+    # BORROW / RETURN
+    # ============================================================================
+    def acquire(self, timeout: Optional[float] = None) -> Any:
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("the smtp pool has been closed\n")
+                if self._idle:
+                    session, released_at = self._idle.pop()
+                    break
+                if self._total < self.max_sessions:
+                    # reserve the slot before leaving the lock to connect
+                    self._total += 1
+                    session, released_at = None, 0.0
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise PoolExhaustedError(
+                        f"no smtp session available after {timeout}s\n"
+                    )
+                self._condition.wait(remaining)
+
+        # network work happens outside of the lock
+        try:
+            if session is None:
+                return self._open_session()
+            idle_for = time.monotonic() - released_at
+            if idle_for > self.idle_timeout:
+                self._close_session(session)
+                return self._open_session()
+            if idle_for > self.probe_after and not self.is_alive(session):
+                return self._reconnect(session)
+            return session
+        except Exception:
+            with self._condition:
+                self._total -= 1
+                self._condition.notify()
+            raise
+
+    def release(self, session: Any, broken: bool = False) -> None:
+        with self._condition:
+            if self._closed or broken:
+                self._total -= 1
+                self._condition.notify()
+                discard = True
+            else:
+                self._idle.append((session, time.monotonic()))
+                self._condition.notify()
+                discard = False
+        if discard:
+            self._close_session(session)
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator[Any]:
+        session = self.acquire(timeout)
+        broken = False
+        try:
+            yield session
+        except Exception:
+            # the session state is unknown after a failed transaction
+            broken = not self.is_alive(session)
+            raise
+        finally:
+            self.release(session, broken=broken)
+
+    # ============================================================================
+    # MAINTENANCE
+    # ============================================================================
+    def prune_idle(self) -> int:
+        now = time.monotonic()
+        expired = []
+        with self._condition:
+            keep: Deque[Tuple[Any, float]] = deque()
+            for session, released_at in self._idle:
+                # never shrink below the warm minimum
+                if (
+                    now - released_at > self.idle_timeout
+                    and self._total - len(expired) > self.min_sessions
+                ):
+                    expired.append(session)
+                else:
+                    keep.append((session, released_at))
+            self._idle = keep
+            self._total -= len(expired)
+        for session in expired:
+            self._close_session(session)
+        if expired:
+            self.logger.info(f"closed {len(expired)} idle smtp session(s)\n")
+        return len(expired)
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "total": self._total,
+                "idle": len(self._idle),
+                "in_use": self._total - len(self._idle),
+                "max": self.max_sessions,
+            }
+
+    def close(self) -> None:
+        with self._condition:
+            self._closed = True
+            sessions = [session for session, _ in self._idle]
+            self._idle.clear()
+            self._total -= len(sessions)
+            self._condition.notify_all()
+        for session in sessions:
+            self._close_session(session)
+        self.logger.info("smtp pool closed\n")
@@ -0,0 +1,188 @@
+from __future__ import annotations
+import threading
+import uuid
+from collections import OrderedDict
+from email.header import Header
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formatdate, make_msgid
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from app.Mailer.attachment_cache import AttachmentCache
+from utils.normalize_recipients import normalize_recipients
+
+if TYPE_CHECKING:
+    from app.Mailer.sender import EMAIL
+
+"""
+MIME assembly for outgoing emails , same layout yagmail produces
+(mixed -> alternative(plain , html) + attachments) , the skeleton of a campaign
+is serialized once and only the per recipient headers are written per message
+"""
+
+UNDISCLOSED_RECIPIENTS = "undisclosed-recipients:;"
+
+
+def msgid_domain(sender_address: str) -> str:
+    # make_msgid() without a domain does a getfqdn() dns lookup on every call
+    _, _, domain = (sender_address or "").rpartition("@")
+    return domain.strip("> ") or "localhost"
+
+
+def header_line(name: str, value: str) -> str:
+    # a raw new line would end the header and let the value inject its own
+    # (a "Bcc:" hidden in a subject ...) , refuse it instead of writing it out
+    if "\r" in value or "\n" in value:
+        raise ValueError(f"new line in the {name} header : {value!r}")
+    # folded at 78 columns , a long To list or encoded subject would otherwise
+    # run past the 998 characters a line may hold (rfc 5322)
+    charset = "us-ascii" if value.isascii() else "utf-8"
+    folded = Header(value, charset, header_name=name).encode(maxlinelen=78)
+    if charset == "us-ascii" and any(len(line) > 998 for line in folded.split("\n")):
+        # one word too long to fold on white space , encoded words can be split
+        folded = Header(value, "utf-8", header_name=name).encode(maxlinelen=78)
+    return f"{name}: {folded}"
+
+
+def body_to_html(body: str) -> str:
+    # yagmail turns new lines into <br> and wraps the text in a div
+    return f"<div>{body.replace(chr(10), '<br>')}</div>"
+
+
+class MessageBuilder:
+    def __init__(
+        self,
+        attachment_cache: Optional[AttachmentCache] = None,
+        encoding: str = "utf-8",
+        max_templates: int = 32,
+    ) -> None:
+        # an empty cache has len() 0 , so test against None explicitly
+        self.attachment_cache = (
+            attachment_cache if attachment_cache is not None else AttachmentCache()
+        )
+        self.encoding = encoding
+        self.max_templates = max_templates
+        self._templates: "OrderedDict[tuple, CampaignTemplate]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def envelope_recipients(self, email: EMAIL) -> List[str]:
+        # bcc only lives in the envelope , never in the headers
+        return (
+            normalize_recipients(email.to)
+            + normalize_recipients(email.cc)
+            + normalize_recipients(email.bcc)
+        )
+
+    def _alternative(self, body: str) -> MIMEMultipart:
+        alternative = MIMEMultipart("alternative")
+        alternative.attach(MIMEText(body, "plain", _charset=self.encoding))
+        alternative.attach(MIMEText(body_to_html(body), "html", _charset=self.encoding))
+        return alternative
+
+    def build(self, sender_address: str, email: EMAIL) -> MIMEMultipart:
+        message = MIMEMultipart()
+        message["Date"] = formatdate(localtime=True)
+        message["Subject"] = email.subject
+        message["From"] = sender_address
+        message["To"] = ", ".join(normalize_recipients(email.to))
+        if email.cc:
+            message["Cc"] = ", ".join(normalize_recipients(email.cc))
+        message["Message-ID"] = make_msgid(domain=msgid_domain(sender_address))
+        message.attach(self._alternative(email.body))
+        for path in normalize_recipients(email.attachments):
+            message.attach(self.attachment_cache.get_part(path))
+        return message
+
+    def template_for(self, sender_address: str, email: EMAIL) -> CampaignTemplate:
+        """
+        the serialized skeleton shared by every message with the same sender ,
+        cc and attachment files (a modified file changes its key) , a personalised
+        subject or body is patched in by render() and does not get its own entry
+        """
+        key = (
+            sender_address,
+            tuple(normalize_recipients(email.cc)),
+            tuple(
+                self.attachment_cache.make_key(path)
+                for path in normalize_recipients(email.attachments)
+            ),
+        )
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self._templates.move_to_end(key)
+                return template
+        template = CampaignTemplate(self, sender_address, email)
+        with self._lock:
+            self._templates[key] = template
+            while len(self._templates) > self.max_templates:
+                self._templates.popitem(last=False)
+        return template
+
+    def build_string(self, sender_address: str, email: EMAIL) -> str:
+        return self.template_for(sender_address, email).render(email)
+
+    def build_group_string(self, sender_address: str, email: EMAIL) -> str:
+        # one payload for a whole group of recipients , they are only in the
+        # envelope so the visible To is the rfc 5322 empty group
+        return self.template_for(sender_address, email).render(
+            email, to_header=UNDISCLOSED_RECIPIENTS
+        )
+
+
+class CampaignTemplate:
+    """
+    MIME skeleton serialized once per campaign , render() only writes the
+    per recipient headers (To , Date , Message-ID) in front of the cached
+    parts , a different body or subject is patched in without touching the
+    already encoded attachments
+    """
+
+    def __init__(self, builder: MessageBuilder, sender_address: str, prototype: EMAIL) -> None:
+        self.builder = builder
+        self.sender_address = sender_address
+        self.subject = prototype.subject
+        self.body = prototype.body
+        self.domain = msgid_domain(sender_address)
+        self.boundary = f"==============={uuid.uuid4().hex}=="
+
+        static = [
+            f'Content-Type: multipart/mixed; boundary="{self.boundary}"',
+            "MIME-Version: 1.0",
+            header_line("From", sender_address),
+        ]
+        if prototype.cc:
+            static.append(header_line("Cc", ", ".join(normalize_recipients(prototype.cc))))
+        self._static_headers = "\n".join(static)
+        self._subject_line = header_line("Subject", prototype.subject)
+        self._body_block = self._body_part(prototype.body)
+        self._tail = "".join(
+            f"\n--{self.boundary}\n{builder.attachment_cache.get_part(path).as_string()}"
+            for path in normalize_recipients(prototype.attachments)
+        ) + f"\n--{self.boundary}--\n"
+
+    def _body_part(self, body: str) -> str:
+        return f"--{self.boundary}\n{self.builder._alternative(body).as_string()}"
+
+    def render(
+        self,
+        email: EMAIL,
+        extra_headers: Optional[Dict[str, str]] = None,
+        to_header: Optional[str] = None,
+    ) -> str:
+        subject_line = (
+            self._subject_line
+            if email.subject == self.subject
+            else header_line("Subject", email.subject)
+        )
+        body_block = self._body_block if email.body == self.body else self._body_part(email.body)
+        lines = [
+            self._static_headers,
+            subject_line,
+            header_line("To", to_header or ", ".join(normalize_recipients(email.to))),
+            f"Date: {formatdate(localtime=True)}",
+            f"Message-ID: {make_msgid(domain=self.domain)}",
+        ]
+        for name, value in (extra_headers or {}).items():
+            lines.append(header_line(name, value))
+        return "\n".join(lines) + "\n\n" + body_block + self._tail
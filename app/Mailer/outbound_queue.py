@@ -0,0 +1,128 @@
+from __future__ import annotations
+import heapq
+import itertools
+from datetime import datetime
+from queue import Queue
+from typing import Any, Iterable, List, Optional, Tuple
+
+"""
+heap backed outbound queue ordered by priority then due time
+"""
+
+# lower rank is served first
+PRIORITY_RANK = {
+    "urgent": 0,
+    "high": 1,
+    "normal": 2,
+    "low": 3,
+}
+
+
+def _due_timestamp(scheduled_for: Any) -> float:
+    if scheduled_for is None:
+        return 0.0
+    if isinstance(scheduled_for, datetime):
+        return scheduled_for.timestamp()
+    try:
+        return datetime.fromisoformat(str(scheduled_for)).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def sort_key(item: Any) -> Tuple[int, float]:
+    # anything that is not an EMAIL is treated as normal priority , due now
+    priority = getattr(item, "priority", None)
+    rank = PRIORITY_RANK.get(getattr(priority, "value", priority), PRIORITY_RANK["normal"])
+    return rank, _due_timestamp(getattr(item, "scheduled_for", None))
+
+
+class OutboundQueue(Queue):
+    """
+    drop in replacement for queue.Queue , get() hands out the most urgent email
+    first and , within a priority , the one that is due the earliest
+    """
+
+    def _init(self, maxsize: int) -> None:
+        # one min heap of (due , sequence , item) per priority level , the
+        # sequence keeps FIFO order between equal due times and stops the heap
+        # from ever comparing two emails
+        self._lanes: List[List[Tuple[float, int, Any]]] = [
+            [] for _ in range(len(PRIORITY_RANK))
+        ]
+        self._sequence = itertools.count()
+        self._size = 0
+
+    def _qsize(self) -> int:
+        return self._size
+
+    def _put(self, item: Any) -> None:
+        rank, due = sort_key(item)
+        heapq.heappush(self._lanes[rank], (due, next(self._sequence), item))
+        self._size += 1
+
+    def _get(self) -> Any:
+        for lane in self._lanes:
+            if lane:
+                self._size -= 1
+                return heapq.heappop(lane)[2]
+        raise IndexError("get from an empty outbound queue")
+
+    @property
+    def queue(self) -> List[Any]:
+        # snapshot in service order , same shape as Queue.queue for callers
+        with self.mutex:
+            return [entry[2] for lane in self._lanes for entry in sorted(lane)]
+
+    def put_many(self, items: Iterable[Any]) -> int:
+        # group per lane and heapify once instead of n pushes
+        grouped: List[List[Tuple[float, int, Any]]] = [[] for _ in self._lanes]
+        for item in items:
+            rank, due = sort_key(item)
+            grouped[rank].append((due, next(self._sequence), item))
+        count = sum(len(group) for group in grouped)
+        if count == 0:
+            return 0
+        with self.not_full:
+            if self.maxsize > 0 and self._size + count > self.maxsize:
+                raise ValueError(
+                    f"bulk enqueue of {count} would exceed maxsize {self.maxsize}\n"
+                )
+            for lane, group in zip(self._lanes, grouped):
+                if group:
+                    lane.extend(group)
+                    heapq.heapify(lane)
+            self._size += count
+            self.unfinished_tasks += count
+            self.not_empty.notify_all()
+        return count
+
+    def peek(self) -> Optional[Any]:
+        with self.mutex:
+            for lane in self._lanes:
+                if lane:
+                    return lane[0][2]
+            return None
+
+    def _due_lane(self, now: Optional[datetime]) -> Optional[List[Tuple[float, int, Any]]]:
+        # only the head of each priority lane is looked at , no scan
+        now_ts = (now or datetime.now()).timestamp()
+        for lane in self._lanes:
+            if lane and lane[0][0] <= now_ts:
+                return lane
+        return None
+
+    def peek_next_due(self, now: Optional[datetime] = None) -> Optional[Any]:
+        with self.mutex:
+            lane = self._due_lane(now)
+            return lane[0][2] if lane else None
+
+    def get_next_due(self, now: Optional[datetime] = None) -> Optional[Any]:
+        # pop the most urgent email that is due , future ones stay in place
+        with self.mutex:
+            lane = self._due_lane(now)
+            if lane is None:
+                return None
+            item = heapq.heappop(lane)[2]
+            self._size -= 1
+            self.not_full.notify()
+            return item
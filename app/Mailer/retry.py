@@ -0,0 +1,106 @@
+from __future__ import annotations
+import heapq
+import itertools
+import random
+import smtplib
+import socket
+import threading
+import time
+from enum import Enum
+from typing import Any, List, Optional, Tuple
+
+"""
+retry policy for smtp deliveries : error classification , backoff and the delayed queue
+"""
+
+# 4xx replies that mean "try again later"
+TRANSIENT_SMTP_CODES = {421, 450, 451, 452, 454}
+
+
+class ErrorKind(Enum):
+    TRANSIENT = "transient"
+    PERMANENT = "permanent"
+
+
+def _kind_from_code(code: int) -> ErrorKind:
+    if code in TRANSIENT_SMTP_CODES or 400 <= code < 500:
+        return ErrorKind.TRANSIENT
+    return ErrorKind.PERMANENT
+
+
+def classify_smtp_error(error: BaseException) -> ErrorKind:
+    # every recipient refused : transient if at least one of them can be retried
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        if any(_kind_from_code(code) is ErrorKind.TRANSIENT for code in codes):
+            return ErrorKind.TRANSIENT
+        return ErrorKind.PERMANENT
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return ErrorKind.PERMANENT
+    if isinstance(error, smtplib.SMTPResponseException):
+        return _kind_from_code(error.smtp_code)
+    # dropped connections and network hiccups
+    if isinstance(
+        error,
+        (
+            smtplib.SMTPServerDisconnected,
+            smtplib.SMTPConnectError,
+            ConnectionError,
+            TimeoutError,
+            socket.timeout,
+        ),
+    ):
+        return ErrorKind.TRANSIENT
+    # anything else is a bug or bad input , retrying will not help
+    return ErrorKind.PERMANENT
+
+
+def compute_backoff(
+    attempt: int,
+    base: float = 30.0,
+    cap: float = 3600.0,
+    rng: Optional[random.Random] = None,
+) -> float:
+    """
+    exponential backoff with equal jitter : half of the window is fixed so
+    retries never bunch up at zero , the other half is random
+    """
+    rng = rng or random
+    window = min(cap, base * (2 ** max(0, attempt - 1)))
+    return window / 2 + rng.uniform(0, window / 2)
+
+
+class RetryQueue:
+    """thread safe min heap of (due time , item) for deferred retries"""
+
+    def __init__(self) -> None:
+        self._heap: List[Tuple[float, int, Any]] = []
+        # tie breaker so items themselves are never compared
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def push(self, item: Any, delay: float) -> float:
+        due = time.monotonic() + max(0.0, delay)
+        with self._lock:
+            heapq.heappush(self._heap, (due, next(self._counter), item))
+        return due
+
+    def pop_due(self, limit: Optional[int] = None) -> List[Any]:
+        now = time.monotonic()
+        due_items: List[Any] = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                if limit is not None and len(due_items) >= limit:
+                    break
+                due_items.append(heapq.heappop(self._heap)[2])
+        return due_items
+
+    def next_due_in(self) -> Optional[float]:
+        with self._lock:
+            if not self._heap:
+                return None
+            return max(0.0, self._heap[0][0] - time.monotonic())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._heap)
@@ -2,17 +2,33 @@ from __future__ import annotations
 import datetime
 from datetime import datetime
 import logging
+import smtplib
+import sys
+import time
 from pathlib import Path
 from re import sub
-from configuration.config import loading_env_variables
-import yagmail
-from typing import Any, Dict, Never, Optional, List, Union
+from configuration.config import loading_env_variables, loading_optional_env_variable
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, Never, Optional, List, Tuple, Union
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from enum import Enum
-from dataclasses import asdict, dataclass
+from itertools import chain
+from dataclasses import dataclass
 from app.supabase.supabaseClient import DatabaseOperation
 from queue import Queue
 from utils.valid_email_check import EmailManager
 from utils.normalize_recipients import normalize_recipients
+from app.Mailer.attachment_cache import AttachmentCache
+from app.Mailer.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.Mailer.message_builder import MessageBuilder
+from app.Mailer.outbound_queue import OutboundQueue
+from app.Mailer.retry import ErrorKind, RetryQueue, classify_smtp_error, compute_backoff
+from app.Mailer.transport import SMTP, Transport, create_transport
+from app.scheduler.domain_throttle import DomainDispatcher, DomainThrottle, domains_of
+from app.scheduler.scheduler import EmailScheduler
+from utils.metrics import REGISTRY
+
+if TYPE_CHECKING:
+    from app.LocalDatabase.outbox import Outbox
 
 """
 yagmail logic handler
@@ -25,6 +41,16 @@ app_password = loading_env_variables("GMAIL_APP_PASSWORD")
 # TODO : ADD STRING PATH FOR THE RESUME TO BE SENT
 attachement = "../assets/global english.pdf"
 
+# rate(mailer_emails_total{result="sent"}[1m]) is the sends/sec of the run
+EMAILS = REGISTRY.counter(
+    "mailer_emails_total", "emails handled by the sender by outcome", ("result",)
+)
+TRANSPORT_SECONDS = REGISTRY.histogram(
+    "mailer_transport_seconds",
+    "time to hand one transaction to the transport (smtp round trips included)",
+    ("transport",),
+)
+
 
 class EmailStatus(Enum):
     PENDING = "pending"
@@ -42,7 +68,38 @@ class EmailPriority(Enum):
     URGENT = "urgent"
 
 
-@dataclass
+# attribute order used by to_dict / from_dict , same as the dataclass fields
+EMAIL_FIELDS = (
+    "to",
+    "subject",
+    "body",
+    "cc",
+    "bcc",
+    "priority",
+    "status",
+    "created_at",
+    "scheduled_for",
+    "sent_at",
+    "retry_count",
+    "max_retries",
+    "error_message",
+    "email_id",
+    "attachments",
+)
+
+
+def _shared(value: Any) -> Any:
+    # campaign messages repeat the same subject / attachment paths , interning
+    # makes every deserialized copy point at a single string , only for short
+    # fields : bodies are often personalised and would just fill the intern table
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, list):
+        return [sys.intern(item) if isinstance(item, str) else item for item in value]
+    return value
+
+
+@dataclass(slots=True)
 class EMAIL:
     """EMAIL STRUCTURE"""
 
@@ -63,19 +120,47 @@ class EMAIL:
     attachments: Optional[str] = None
 
     def to_dict(self) -> Dict:
-        # convert for dict for json serialization
-        data = asdict(self)
-        # dict indexing
-        data["priority"] = self.priority.value
-        # dict indexing
-        data["status"] = self.status.value
-        return data
+        # flat dict for json serialization , no deep copy : list values are the
+        # email's own objects so do not mutate them through the dict
+        return {
+            "to": self.to,
+            "subject": self.subject,
+            "body": self.body,
+            "cc": self.cc,
+            "bcc": self.bcc,
+            # enum values are module level constants , nothing to copy
+            "priority": self.priority.value,
+            "status": self.status.value,
+            "created_at": self.created_at,
+            "scheduled_for": self.scheduled_for,
+            "sent_at": self.sent_at,
+            "retry_count": self.retry_count,
+            "max_retries": self.max_retries,
+            "error_message": self.error_message,
+            "email_id": self.email_id,
+            "attachments": self.attachments,
+        }
 
     @classmethod
     def from_dict(cls, data: Dict) -> EMAIL:
-        data["priority"] = EmailPriority(data["priority"])
-        data["status"] = EmailStatus(data["status"])
-        return cls(**data)
+        # the input dict is left untouched , enum members or values are both accepted
+        return cls(
+            to=data["to"],
+            subject=_shared(data["subject"]),
+            body=data["body"],
+            cc=data.get("cc"),
+            bcc=data.get("bcc"),
+            priority=EmailPriority(data.get("priority", EmailPriority.NORMAL)),
+            status=EmailStatus(data.get("status", EmailStatus.PENDING)),
+            created_at=data.get("created_at"),
+            scheduled_for=data.get("scheduled_for"),
+            sent_at=data.get("sent_at"),
+            retry_count=data.get("retry_count", 0),
+            max_retries=data.get("max_retries", 4),
+            error_message=data.get("error_message"),
+            email_id=data.get("email_id"),
+            attachments=_shared(data.get("attachments")),
+        )
 
 
 class EmailSender:
@@ -84,9 +169,38 @@ class EmailSender:
         email_user: Union[str, None] = email,
         email_app_password: Union[str, None] = app_password,
         enable_loggin: bool = True,
+        min_sessions: int = 1,
+        max_sessions: int = 4,
+        idle_timeout: float = 300.0,
+        retry_base_delay: float = 30.0,
+        retry_max_delay: float = 3600.0,
+        attachment_cache_bytes: int = 64 * 1024 * 1024,
+        smtp_options: Optional[Dict[str, Any]] = None,
+        breaker_threshold: int = 5,
+        breaker_reset_timeout: float = 60.0,
+        transport: Union[str, Transport, None] = None,
+        spool_dir: Optional[str] = None,
     ) -> None:
         self.email_user = email_user
+        # extra yagmail.SMTP kwargs (host , port , smtp_ssl ...) , e.g. to point
+        # the sender at the local smtp sink instead of gmail
+        self.smtp_options = dict(smtp_options or {})
         self.email_app_password = email_app_password
+        # transient failures wait here with exponential backoff
+        self.retry_queue = RetryQueue()
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        # consecutive transport failures open the circuit , sends are deferred
+        self.breaker = CircuitBreaker(
+            failure_threshold=breaker_threshold,
+            reset_timeout=breaker_reset_timeout,
+            enable_loggin=enable_loggin,
+        )
+        # attachments are read and base64 encoded once , then shared by every message
+        self.attachment_cache = AttachmentCache(
+            max_bytes=attachment_cache_bytes, enable_loggin=enable_loggin
+        )
+        self.message_builder = MessageBuilder(self.attachment_cache)
         self.logger = logging.getLogger(__name__)
         if enable_loggin:
             logging.basicConfig(
@@ -97,11 +211,28 @@ class EmailSender:
             self.logger.setLevel(logging.CRITICAL + 1)
 
         """
-            yagmail init process 
+            transport init : smtp (pooled yagmail sessions) by default , or
+            null / file / maildir / sink picked by name or MAIL_TRANSPORT
         """
         try:
-            self.yagmail = yagmail.SMTP(email_user, email_app_password)
-            self.logger.info("the initiation was correctly done\n")
+            if isinstance(transport, Transport):
+                self.transport = transport
+            else:
+                self.transport = create_transport(
+                    transport or loading_optional_env_variable("MAIL_TRANSPORT") or SMTP,
+                    user=email_user,
+                    password=email_app_password,
+                    smtp_options=self.smtp_options,
+                    min_sessions=min_sessions,
+                    max_sessions=max_sessions,
+                    idle_timeout=idle_timeout,
+                    spool_dir=spool_dir or loading_optional_env_variable("MAIL_SPOOL_DIR"),
+                    enable_loggin=enable_loggin,
+                )
+            # smtp pool and its first warm session , kept for callers that used them
+            self.pool = getattr(self.transport, "pool", None)
+            self.yagmail = self.pool.primary if self.pool is not None else None
+            self.logger.info(f"the initiation was correctly done ({self.transport.name} transport)\n")
         except Exception as e:
             self.logger.error(
                 f"error the initiation could not proccede correctly : {e}\n"
@@ -152,13 +283,13 @@ class EmailSender:
             )
             raise
 
-    def saving_emails_in_queue(self, emails: List[EMAIL]):
+    def saving_emails_in_queue(self, emails: List[EMAIL]) -> OutboundQueue:
         try:
-            queue_init = Queue()
+            # ordered by priority then scheduled_for , urgent mail jumps the line
+            queue_init = OutboundQueue()
             if queue_init.empty():
                 self.logger.info("the queue is empty and ready to receive emails\n")
-            for email in emails:
-                queue_init.put(email)
+            queue_init.put_many(emails)
             return queue_init
         except Exception as e:
             self.logger.error(
@@ -166,7 +297,7 @@ class EmailSender:
             )
             raise RuntimeError
 
-    def send_single_email(self, email: EMAIL) -> bool:
+    def _check_recipients(self, email: EMAIL) -> bool:
         # normalize first so email.to can be str or List[str]
         recipient_list = normalize_recipients(email.to)
 
@@ -174,6 +305,7 @@ class EmailSender:
             self.logger.error("no recipient provided\n")
             email.status = EmailStatus.FAILED
             email.error_message = "no recipient"
+            EMAILS.labels("failed").inc()
             return False
 
         # validate each address once
@@ -182,38 +314,471 @@ class EmailSender:
                 self.logger.error(f"invalid email : {r}\n")
                 email.status = EmailStatus.FAILED
                 email.error_message = f"invalid address: {r}"
+                EMAILS.labels("failed").inc()
                 return False
+        return True
+
+    def _mark_sent(self, email: EMAIL) -> None:
+        email.status = EmailStatus.SUCCESS
+        email.priority = EmailPriority.NORMAL
+        email.sent_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        email.error_message = None
+        EMAILS.labels("sent").inc()
+
+    def _handle_send_failure(
+        self,
+        email: EMAIL,
+        error: BaseException,
+        defer_retry: bool = True,
+        min_delay: float = 0.0,
+        count_attempt: bool = True,
+    ) -> bool:
+        # count_attempt=False : the send never reached the server (open circuit) ,
+        # it is rescheduled without using up one of its retries
+        if count_attempt:
+            email.retry_count += 1
+        email.error_message = str(error)
+        kind = classify_smtp_error(error)
+        if kind is ErrorKind.TRANSIENT and email.retry_count < email.max_retries:
+            # park it in the delayed queue , the worker is free for other mail
+            delay = max(
+                min_delay,
+                compute_backoff(
+                    email.retry_count, base=self.retry_base_delay, cap=self.retry_max_delay
+                ),
+            )
+            email.status = EmailStatus.RETRYING
+            email.scheduled_for = datetime.fromtimestamp(
+                time.time() + delay
+            ).isoformat()
+            # defer_retry=False leaves the rescheduling to the caller (outbox)
+            if defer_retry:
+                self.retry_queue.push(email, delay)
+            EMAILS.labels("retrying").inc()
+            self.logger.warning(
+                f"attempt {email.retry_count}/{email.max_retries} failed for {email.to} "
+                f"({kind.value}) retrying in {delay:.0f}s : {error}\n"
+            )
+            return False
+
+        email.status = EmailStatus.FAILED
+        EMAILS.labels("failed").inc()
+        self.logger.error(
+            f"giving up on {email.to} after {email.retry_count} attempt(s) ({kind.value}) : {error}\n"
+        )
+        return False
+
+    def _circuit_open(self, emails: List[EMAIL], defer_retry: bool) -> bool:
+        # gate in front of every transaction , while open nothing touches the server
+        if self.breaker.allow_request():
+            return False
+        error = CircuitOpenError(
+            f"smtp circuit open , next probe in {self.breaker.retry_after():.0f}s"
+        )
+        for email in emails:
+            self._handle_send_failure(
+                email,
+                error,
+                defer_retry,
+                min_delay=self.breaker.retry_after(),
+                count_attempt=False,
+            )
+        return True
+
+    def send_single_email(self, email: EMAIL, defer_retry: bool = True) -> bool:
+        if not self._check_recipients(email):
+            return False
+        # the message is assembled here (attachments encoded once per run) and
+        # before the breaker gate : a bad header is this email's fault , it must
+        # not be taken as the outcome of a half open probe
+        from_address = self.email_user or self.transport.user
+        try:
+            message = self.message_builder.build_string(from_address, email)
+        except Exception as e:
+            return self._handle_send_failure(email, e, defer_retry)
+        if self._circuit_open([email], defer_retry):
+            return False
 
         self.logger.info(
-            f"starting send to {email.to} — max retries: {email.max_retries}\n"
+            f"starting send to {email.to} — attempt {email.retry_count + 1}/{email.max_retries}\n"
         )
 
-        while email.retry_count < email.max_retries:
-            try:
-                self.yagmail.send(
-                    to=recipient_list,
-                    subject=email.subject,
-                    contents=email.body,
-                    attachments=email.attachments if email.attachments else None,
-                    cc=email.cc,
-                    bcc=email.bcc,
+        try:
+            # handed to the transport (pooled smtp session , spool ...)
+            with TRANSPORT_SECONDS.labels(self.transport.name).time():
+                refused = self.transport.sendmail(
+                    from_address,
+                    self.message_builder.envelope_recipients(email),
+                    message,
                 )
-                email.status = EmailStatus.SUCCESS
-                email.priority = EmailPriority.NORMAL
-                email.sent_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                self.logger.info(f"email sent successfully to {email.to}\n")
-                return True
-
-            except Exception as e:
-                email.retry_count += 1
-                email.status = EmailStatus.RETRYING
-                email.error_message = str(e)
-                self.logger.warning(
-                    f"attempt {email.retry_count}/{email.max_retries} failed for {email.to}: {e}\n"
+            self.breaker.record(None)
+            if refused:
+                # partial RCPT refusal , the accepted addresses already have it
+                return self._handle_send_failure(
+                    email, smtplib.SMTPRecipientsRefused(refused), defer_retry
                 )
+            self._mark_sent(email)
+            self.logger.info(f"email sent successfully to {email.to}\n")
+            return True
 
-        email.status = EmailStatus.FAILED
-        self.logger.error(
-            f"all {email.max_retries} attempts exhausted for {email.to}\n"
+        except Exception as e:
+            self.breaker.record(e)
+            return self._handle_send_failure(email, e, defer_retry)
+
+    # ============================================================================
+    # GROUPED SENDING
+    # ============================================================================
+    def send_group(self, emails: List[EMAIL], defer_retry: bool = True) -> List[bool]:
+        """
+        one SMTP transaction for messages sharing subject , body and attachments :
+        a single DATA payload and one RCPT TO per address , the recipients only
+        live in the envelope (bcc semantics) so nobody sees the rest of the list ,
+        each RCPT reply is mapped back onto the EMAIL it came from
+        """
+        results = [False] * len(emails)
+        ready = [i for i, email in enumerate(emails) if self._check_recipients(email)]
+        if not ready:
+            return results
+        # built before the breaker gate , see send_single_email
+        from_address = self.email_user or self.transport.user
+        try:
+            message = self.message_builder.build_group_string(from_address, emails[ready[0]])
+        except Exception as e:
+            for i in ready:
+                self._handle_send_failure(emails[i], e, defer_retry)
+            return results
+        if self._circuit_open([emails[i] for i in ready], defer_retry):
+            return results
+
+        # address -> indexes of the emails that asked for it
+        owners: Dict[str, List[int]] = {}
+        for i in ready:
+            for address in self.message_builder.envelope_recipients(emails[i]):
+                owners.setdefault(address, []).append(i)
+
+        self.logger.info(
+            f"starting grouped send to {len(owners)} recipient(s) for {len(ready)} email(s)\n"
         )
-        return False
+        try:
+            with TRANSPORT_SECONDS.labels(self.transport.name).time():
+                refused = self.transport.sendmail(from_address, list(owners), message)
+            self.breaker.record(None)
+        except smtplib.SMTPRecipientsRefused as e:
+            # every address was rejected , nothing went out
+            self.breaker.record(e)
+            refused = e.recipients
+        except Exception as e:
+            self.breaker.record(e)
+            for i in ready:
+                self._handle_send_failure(emails[i], e, defer_retry)
+            return results
+
+        refused = refused or {}
+        for i in ready:
+            mine = {
+                address: refused[address]
+                for address in self.message_builder.envelope_recipients(emails[i])
+                if address in refused
+            }
+            if mine:
+                self._handle_send_failure(
+                    emails[i], smtplib.SMTPRecipientsRefused(mine), defer_retry
+                )
+            else:
+                self._mark_sent(emails[i])
+                results[i] = True
+        self.logger.info(
+            f"grouped send done - accepted : {sum(results)} | refused : {len(refused)}\n"
+        )
+        return results
+
+    def group_key(self, email: EMAIL) -> Optional[tuple]:
+        # cc is a visible header , those emails keep their own transaction
+        if email.cc:
+            return None
+        return (
+            email.subject,
+            email.body,
+            tuple(normalize_recipients(email.attachments)),
+        )
+
+    def send_grouped(
+        self,
+        emails: Iterable[EMAIL],
+        max_recipients: int = 50,
+        scheduler: Optional[EmailScheduler] = None,
+    ) -> Iterator[Tuple[EMAIL, bool]]:
+        """
+        opt in grouping mode : identical messages are sent as one transaction
+        per chunk of at most 'max_recipients' envelope addresses , emails that
+        can not be grouped (cc set) fall back to send_single_email , transient
+        refusals land in the retry queue like any other send (see drain_retries) ,
+        emails held back by the scheduler quota come last as (email , False)
+        with status PENDING
+        """
+        if max_recipients < 1:
+            raise ValueError(f"max_recipients must be at least 1 got {max_recipients}\n")
+
+        groups: Dict[tuple, List[EMAIL]] = {}
+        singles: List[EMAIL] = []
+        for email in emails:
+            key = self.group_key(email)
+            if key is None:
+                singles.append(email)
+            else:
+                groups.setdefault(key, []).append(email)
+
+        chunks: List[List[EMAIL]] = []
+        for members in groups.values():
+            chunk: List[EMAIL] = []
+            size = 0
+            for email in members:
+                count = max(1, len(self.message_builder.envelope_recipients(email)))
+                if chunk and size + count > max_recipients:
+                    chunks.append(chunk)
+                    chunk, size = [], 0
+                chunk.append(email)
+                size += count
+            if chunk:
+                chunks.append(chunk)
+        chunks.extend([email] for email in singles)
+
+        held: List[EMAIL] = []
+        for position, chunk in enumerate(chunks):
+            if scheduler is not None:
+                # the quota is per message , trim the chunk to what is left
+                remaining = scheduler.remaining_quota()
+                if remaining <= 0:
+                    self.logger.warning(
+                        "rate limit reached - no more emails will be dispatched\n"
+                    )
+                    held.extend(email for rest in chunks[position:] for email in rest)
+                    break
+                held.extend(chunk[remaining:])
+                chunk = chunk[:remaining]
+            if len(chunk) == 1 and self.group_key(chunk[0]) is None:
+                results = [self.send_single_email(chunk[0])]
+            else:
+                results = self.send_group(chunk)
+            for email, success in zip(chunk, results):
+                if success and scheduler is not None:
+                    scheduler.increment_counters()
+                yield email, success
+
+        # never attempted : still pending , handed back so the caller can requeue them
+        for email in held:
+            yield self._hold(email), False
+
+    def _hold(self, email: EMAIL) -> EMAIL:
+        email.status = EmailStatus.PENDING
+        email.error_message = "rate limit reached - not dispatched"
+        return email
+
+    def send_batch(
+        self,
+        emails: Iterable[EMAIL],
+        concurrency: int = 4,
+        scheduler: Optional[EmailScheduler] = None,
+        drain_retries: bool = True,
+        throttle: Optional[DomainThrottle] = None,
+        lookahead: int = 256,
+        max_quota_wait: float = 0.0,
+    ) -> Iterator[Tuple[EMAIL, bool]]:
+        """
+        send the emails over a bounded worker pool and yield (email , success)
+        as each delivery completes , the scheduler quota is reserved at dispatch
+        time so in flight messages can never push us over the hourly/daily limits
+
+        with a throttle , up to 'lookahead' emails are buffered per recipient
+        domain and handed out round robin as each domain gets a free slot
+
+        when the quota runs out and the next permit is at most 'max_quota_wait'
+        seconds away the batch sleeps exactly that long , otherwise it stops ,
+        emails already buffered for the throttle then come back as
+        (email , False) with status PENDING
+        """
+        if concurrency < 1:
+            raise ValueError(f"concurrency must be at least 1 got {concurrency}\n")
+        if concurrency > self.transport.max_sessions:
+            self.logger.warning(
+                f"concurrency {concurrency} is above the smtp pool size "
+                f"{self.transport.max_sessions} , workers will wait for a session\n"
+            )
+
+        pending = iter(emails)
+        in_flight: Dict[Future, EMAIL] = {}
+        exhausted = False
+        limit_hit = False
+        dispatcher = DomainDispatcher(throttle) if throttle is not None else None
+
+        with ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="mailer"
+        ) as executor:
+            while True:
+                # top up the window while we have workers and quota
+                while not limit_hit and len(in_flight) < concurrency:
+                    if scheduler is not None:
+                        remaining = scheduler.remaining_quota()
+                        if remaining <= len(in_flight):
+                            if not in_flight and max_quota_wait > 0:
+                                # only worth waiting for if something is left to send
+                                if not exhausted:
+                                    head = next(pending, None)
+                                    if head is None:
+                                        exhausted = True
+                                    else:
+                                        pending = chain([head], pending)
+                                has_work = (
+                                    not exhausted
+                                    or (drain_retries and self.retry_queue.next_due_in() is not None)
+                                    or (dispatcher is not None and len(dispatcher) > 0)
+                                )
+                                permit_in = scheduler.time_until_next_permit()
+                                if has_work and permit_in <= max_quota_wait:
+                                    self.logger.info(
+                                        f"rate limit reached - next permit in {permit_in:.1f}s\n"
+                                    )
+                                    time.sleep(permit_in)
+                                    continue
+                            if not in_flight:
+                                limit_hit = True
+                                self.logger.warning(
+                                    "rate limit reached - no more emails will be dispatched\n"
+                                )
+                            break
+                    # retries that came due go ahead of fresh mail
+                    due = self.retry_queue.pop_due(limit=1) if drain_retries else []
+                    if dispatcher is not None:
+                        dispatcher.extend(due)
+                        while not exhausted and len(dispatcher) < lookahead:
+                            email = next(pending, None)
+                            if email is None:
+                                exhausted = True
+                            else:
+                                dispatcher.add(email)
+                        # None : every waiting domain is throttled right now
+                        email = dispatcher.next_ready()
+                        if email is None:
+                            break
+                    elif due:
+                        email = due[0]
+                    elif not exhausted:
+                        email = next(pending, None)
+                        if email is None:
+                            exhausted = True
+                            continue
+                    else:
+                        break
+                    in_flight[
+                        executor.submit(self.send_single_email, email, drain_retries)
+                    ] = email
+
+                next_retry = self.retry_queue.next_due_in() if drain_retries else None
+                next_domain = dispatcher.next_ready_in() if dispatcher else None
+                wake_up = min(
+                    (delay for delay in (next_retry, next_domain) if delay is not None),
+                    default=None,
+                )
+                if not in_flight:
+                    if limit_hit or wake_up is None:
+                        break
+                    self.logger.info(f"waiting {wake_up:.1f}s for the next retry / domain slot\n")
+                    time.sleep(wake_up)
+                    continue
+
+                done, _ = wait(in_flight, timeout=wake_up, return_when=FIRST_COMPLETED)
+                for future in done:
+                    email = in_flight.pop(future)
+                    if throttle is not None:
+                        throttle.release(*domains_of(email))
+                    try:
+                        success = future.result()
+                    except Exception as e:
+                        self.logger.error(f"worker crashed sending to {email.to} : {e}\n")
+                        email.status = EmailStatus.FAILED
+                        email.error_message = str(e)
+                        success = False
+                    if success and scheduler is not None:
+                        scheduler.increment_counters()
+                    if not success and email.status is EmailStatus.RETRYING and drain_retries:
+                        # not final yet , it comes back through the retry queue
+                        continue
+                    yield email, success
+
+            if dispatcher is not None:
+                # pulled into the lookahead but never dispatched , handed back
+                # as (email , False) with status PENDING like send_grouped does
+                for email in dispatcher.drain():
+                    yield self._hold(email), False
+
+    def drain_retries(
+        self, scheduler: Optional[EmailScheduler] = None
+    ) -> Iterator[Tuple[EMAIL, bool]]:
+        # resend whatever is parked in the retry queue , waiting for each due time
+        return self.send_batch((), concurrency=1, scheduler=scheduler)
+
+    def send_from_outbox(
+        self,
+        outbox: "Outbox",
+        concurrency: int = 4,
+        scheduler: Optional[EmailScheduler] = None,
+        claim_size: int = 50,
+        ack_every: int = 10,
+        worker_id: Optional[str] = None,
+    ) -> Tuple[int, int]:
+        """
+        drain the durable outbox : lease a batch , send it , then ack / fail /
+        nack the rows in small groups so a crash only replays the unacked tail
+        """
+        sent_count = 0
+        failed_count = 0
+        while True:
+            if scheduler is not None and scheduler.remaining_quota() <= 0:
+                self.logger.warning("rate limit reached - leaving the outbox for later\n")
+                break
+            items = outbox.claim(limit=claim_size, worker_id=worker_id)
+            if not items:
+                break
+            ids_by_email = {id(item.email): item.outbox_id for item in items}
+            done: Dict[str, Dict[int, EMAIL]] = {"sent": {}, "failed": {}}
+
+            def flush() -> None:
+                outbox.ack(list(done["sent"]), done["sent"])
+                outbox.fail(list(done["failed"]), done["failed"])
+                done["sent"], done["failed"] = {}, {}
+
+            settled = 0
+            for email, success in self.send_batch(
+                (item.email for item in items),
+                concurrency=concurrency,
+                scheduler=scheduler,
+                drain_retries=False,
+            ):
+                outbox_id = ids_by_email.pop(id(email))
+                settled += 1
+                if success:
+                    sent_count += 1
+                    done["sent"][outbox_id] = email
+                elif email.status is EmailStatus.RETRYING:
+                    # back to the outbox , visible again once the backoff expires
+                    delay = max(
+                        0.0,
+                        datetime.fromisoformat(str(email.scheduled_for)).timestamp()
+                        - time.time(),
+                    )
+                    outbox.nack([outbox_id], delay=delay, emails={outbox_id: email})
+                else:
+                    failed_count += 1
+                    done["failed"][outbox_id] = email
+                if settled % ack_every == 0:
+                    flush()
+            flush()
+            if ids_by_email:
+                # never dispatched because a limit was hit , release the lease now
+                outbox.nack(list(ids_by_email.values()))
+                break
+        self.logger.info(f"outbox drained - sent : {sent_count} | failed : {failed_count}\n")
+        return sent_count, failed_count
+
+    def close(self) -> None:
+        self.transport.close()
@@ -0,0 +1,358 @@
+from __future__ import annotations
+import bisect
+import hashlib
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from configuration.config import loading_optional_env_variable
+from app.LocalDatabase.scheduler_state import SchedulerStateStore
+from app.Mailer.sender import EMAIL, EmailSender, EmailStatus
+from app.scheduler.pacing import PacingDispatcher
+from app.scheduler.scheduler import EmailScheduler
+from utils.normalize_recipients import normalize_recipients
+
+"""
+several gmail accounts behind one sender , each account keeps its own smtp pool
+and its own hourly / daily limits , so the total volume grows with the accounts
+"""
+
+LEAST_LOADED = "least_loaded"
+CONSISTENT_HASH = "consistent_hash"
+
+
+@dataclass
+class SenderAccount:
+    email_user: str
+    email_app_password: str
+    max_email_an_hour: int = 30
+    daily_batch_emails: int = 100
+    smtp_options: Dict[str, Any] = field(default_factory=dict)
+
+
+def load_accounts_from_env(
+    max_accounts: int = 16,
+    max_email_an_hour: int = 30,
+    daily_batch_emails: int = 100,
+) -> List[SenderAccount]:
+    """
+    EMAIL / GMAIL_APP_PASSWORD is the first account , the next ones are
+    EMAIL_1 / GMAIL_APP_PASSWORD_1 , EMAIL_2 / GMAIL_APP_PASSWORD_2 ...
+    """
+    accounts = []
+    for index in range(max_accounts):
+        suffix = f"_{index}" if index else ""
+        user = loading_optional_env_variable(f"EMAIL{suffix}")
+        password = loading_optional_env_variable(f"GMAIL_APP_PASSWORD{suffix}")
+        if not user or not password:
+            # index 0 may be missing while numbered accounts exist
+            if index:
+                break
+            continue
+        accounts.append(
+            SenderAccount(
+                user,
+                password,
+                max_email_an_hour=max_email_an_hour,
+                daily_batch_emails=daily_batch_emails,
+            )
+        )
+    return accounts
+
+
+def _ring_hash(value: str) -> int:
+    # python's hash() is salted per process , routing must be stable across runs
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class SenderShard:
+    """one account : its sender , its scheduler and the sends reserved on it"""
+
+    def __init__(self, account: SenderAccount, sender: EmailSender, scheduler: EmailScheduler) -> None:
+        self.account = account
+        self.sender = sender
+        self.scheduler = scheduler
+        self.in_flight = 0
+        self.sent = 0
+        self.failed = 0
+
+    @property
+    def name(self) -> str:
+        return self.account.email_user
+
+    def available(self) -> int:
+        return self.scheduler.remaining_quota() - self.in_flight
+
+
+class SenderPool:
+    def __init__(
+        self,
+        accounts: List[SenderAccount],
+        strategy: str = LEAST_LOADED,
+        virtual_nodes: int = 64,
+        enable_loggin: bool = True,
+        persist_state: bool = True,
+        sender_factory: Optional[Callable[[SenderAccount], EmailSender]] = None,
+        scheduler_factory: Optional[Callable[[SenderAccount], EmailScheduler]] = None,
+        **sender_kwargs: Any,
+    ) -> None:
+        if not accounts:
+            raise ValueError("the sender pool needs at least one account\n")
+        if strategy not in (LEAST_LOADED, CONSISTENT_HASH):
+            raise ValueError(f"unknown routing strategy {strategy}\n")
+        self.strategy = strategy
+        self.enable_loggin = enable_loggin
+        self.logger = logging.getLogger(__name__)
+        if not enable_loggin:
+            self.logger.setLevel(logging.CRITICAL + 1)
+
+        sender_factory = sender_factory or (
+            lambda account: EmailSender(
+                email_user=account.email_user,
+                email_app_password=account.email_app_password,
+                enable_loggin=enable_loggin,
+                smtp_options=account.smtp_options,
+                **sender_kwargs,
+            )
+        )
+        # every account restores its own hour / day counts , a dry run passes
+        # persist_state=False and never touches the saved quota
+        scheduler_factory = scheduler_factory or (
+            lambda account: EmailScheduler(
+                max_email_an_hour=account.max_email_an_hour,
+                daily_batch_emails=account.daily_batch_emails,
+                enable_loggin=enable_loggin,
+                account=account.email_user,
+                state_store=SchedulerStateStore(
+                    account=account.email_user, enable_loggin=enable_loggin
+                )
+                if persist_state
+                else None,
+            )
+        )
+        self.shards: List[SenderShard] = []
+        try:
+            for account in accounts:
+                self.shards.append(
+                    SenderShard(account, sender_factory(account), scheduler_factory(account))
+                )
+        except Exception as e:
+            self.logger.error(f"could not open the sender pool : {e}\n")
+            self.close()
+            raise
+
+        # consistent hash ring , each account owns 'virtual_nodes' points so
+        # adding or removing one only moves about 1/n of the recipients
+        self._ring: List[Tuple[int, int]] = sorted(
+            (_ring_hash(f"{shard.name}#{node}"), position)
+            for position, shard in enumerate(self.shards)
+            for node in range(virtual_nodes)
+        )
+        self._ring_keys = [point for point, _ in self._ring]
+        self._lock = threading.Lock()
+        self.logger.info(f"sender pool ready with {len(self.shards)} account(s)\n")
+
+    # ============================================================================
+    # ROUTING
+    # ============================================================================
+    def _least_loaded(self) -> Optional[SenderShard]:
+        best = max(self.shards, key=lambda shard: (shard.available(), -shard.in_flight))
+        return best if best.available() > 0 else None
+
+    def _by_recipient(self, email: EMAIL) -> Optional[SenderShard]:
+        recipients = normalize_recipients(email.to)
+        key = recipients[0].lower() if recipients else str(email.email_id)
+        start = bisect.bisect(self._ring_keys, _ring_hash(key)) % len(self._ring)
+        # walk clockwise , an account out of quota hands over to the next one
+        seen = set()
+        for offset in range(len(self._ring)):
+            position = self._ring[(start + offset) % len(self._ring)][1]
+            if position in seen:
+                continue
+            seen.add(position)
+            shard = self.shards[position]
+            if shard.available() > 0:
+                return shard
+            if len(seen) == len(self.shards):
+                break
+        return None
+
+    def route(self, email: EMAIL) -> Optional[SenderShard]:
+        """pick an account and reserve one send on it , None when every quota is spent"""
+        with self._lock:
+            if self.strategy == CONSISTENT_HASH:
+                shard = self._by_recipient(email)
+            else:
+                shard = self._least_loaded()
+            if shard is not None:
+                shard.in_flight += 1
+            return shard
+
+    def _settle(self, shard: SenderShard, success: bool) -> None:
+        with self._lock:
+            shard.in_flight -= 1
+            if success:
+                shard.sent += 1
+                shard.scheduler.increment_counters()
+            else:
+                shard.failed += 1
+
+    def remaining_quota(self) -> int:
+        return sum(max(0, shard.available()) for shard in self.shards)
+
+    # ============================================================================
+    # SENDING
+    # ============================================================================
+    def send_single_email(self, email: EMAIL) -> bool:
+        """
+        a transient failure returns False with the email RETRYING : it is parked
+        in its account's retry queue and not counted as failed , the caller
+        resends it with drain_retries()
+        """
+        shard = self.route(email)
+        if shard is None:
+            self.logger.warning(f"every account is out of quota , {email.to} not sent\n")
+            return False
+        success = False
+        try:
+            success = shard.sender.send_single_email(email)
+            return success
+        finally:
+            if email.status is EmailStatus.RETRYING:
+                with self._lock:
+                    shard.in_flight -= 1
+            else:
+                self._settle(shard, success)
+
+    def send_batch(
+        self, emails: Iterable[EMAIL], concurrency_per_account: int = 2
+    ) -> Iterator[Tuple[EMAIL, bool]]:
+        """
+        spread the emails over the accounts and yield (email , success) as each
+        delivery completes , transient failures sit in their account's retry
+        queue and are drained at the end , stops once every quota is spent
+        """
+        concurrency = max(1, concurrency_per_account) * len(self.shards)
+        pending = iter(emails)
+        in_flight: Dict[Future, Tuple[EMAIL, SenderShard]] = {}
+        exhausted = False
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="sender-pool") as executor:
+            while True:
+                while not exhausted and len(in_flight) < concurrency:
+                    email = next(pending, None)
+                    if email is None:
+                        exhausted = True
+                        break
+                    shard = self.route(email)
+                    if shard is None:
+                        exhausted = True
+                        self.logger.warning(
+                            "every account reached its limit - no more emails will be dispatched\n"
+                        )
+                        break
+                    in_flight[executor.submit(shard.sender.send_single_email, email)] = (email, shard)
+
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    email, shard = in_flight.pop(future)
+                    try:
+                        success = future.result()
+                    except Exception as e:
+                        self.logger.error(f"worker crashed sending to {email.to} : {e}\n")
+                        email.status = EmailStatus.FAILED
+                        email.error_message = str(e)
+                        success = False
+                    if email.status is EmailStatus.RETRYING:
+                        # the account's retry queue owns it now
+                        with self._lock:
+                            shard.in_flight -= 1
+                        continue
+                    self._settle(shard, success)
+                    yield email, success
+
+        yield from self.drain_retries()
+
+    def send_paced(
+        self, emails: Iterable[EMAIL], dispatcher: Optional[PacingDispatcher] = None
+    ) -> Iterator[Tuple[EMAIL, bool]]:
+        """
+        one email at a time with human like pacing per account : every account
+        is a lane of the dispatcher , while one waits out its pause the next due
+        account sends , the thread only sleeps when all of them are pausing
+        """
+        if dispatcher is None:
+            dispatcher = PacingDispatcher(enable_loggin=self.enable_loggin)
+        shards = {shard.name: shard for shard in self.shards}
+        pending = iter(emails)
+        exhausted = False
+        while True:
+            # route lazily , about one waiting email per account
+            while not exhausted and len(dispatcher) < len(self.shards):
+                email = next(pending, None)
+                if email is None:
+                    exhausted = True
+                    break
+                shard = self.route(email)
+                if shard is None:
+                    exhausted = True
+                    self.logger.warning(
+                        "every account reached its limit - no more emails will be dispatched\n"
+                    )
+                    break
+                dispatcher.add(shard.name, email)
+
+            ready = dispatcher.get()
+            if ready is None:
+                break
+            name, email = ready
+            shard = shards[name]
+            try:
+                success = shard.sender.send_single_email(email)
+            except Exception as e:
+                self.logger.error(f"could not send to {email.to} : {e}\n")
+                email.status = EmailStatus.FAILED
+                email.error_message = str(e)
+                success = False
+            if email.status is EmailStatus.RETRYING:
+                with self._lock:
+                    shard.in_flight -= 1
+                continue
+            self._settle(shard, success)
+            yield email, success
+
+        yield from self.drain_retries()
+
+    def drain_retries(self) -> Iterator[Tuple[EMAIL, bool]]:
+        # resend what every account parked in its retry queue
+        for shard in self.shards:
+            for email, success in shard.sender.drain_retries(shard.scheduler):
+                with self._lock:
+                    if success:
+                        shard.sent += 1
+                    else:
+                        shard.failed += 1
+                yield email, success
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            shard.name: {
+                "sent": shard.sent,
+                "failed": shard.failed,
+                "in_flight": shard.in_flight,
+                "remaining": shard.scheduler.remaining_quota(),
+            }
+            for shard in self.shards
+        }
+
+    def close(self) -> None:
+        for shard in self.shards:
+            try:
+                shard.scheduler.checkpoint()
+                shard.sender.close()
+            except Exception as e:
+                self.logger.warning(f"could not close the sender of {shard.name} : {e}\n")
@@ -0,0 +1,221 @@
+from __future__ import annotations
+import asyncio
+import logging
+import random
+import threading
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+"""
+in process smtp stand in , accepts (or rejects on purpose) everything it is sent
+so the mailer can be measured offline without touching gmail
+"""
+
+
+@dataclass
+class SinkStats:
+    connections: int = 0
+    messages: int = 0
+    recipients: int = 0
+    bytes_received: int = 0
+    transient_errors: int = 0
+    permanent_errors: int = 0
+    commands: int = 0
+
+
+@dataclass
+class ReceivedMessage:
+    mail_from: str
+    recipients: List[str]
+    data: bytes = field(repr=False)
+
+
+class SMTPSink:
+    """
+    minimal esmtp server running on its own event loop thread
+
+    latency          : seconds added before every reply (network round trip)
+    data_latency     : extra seconds before the reply to the message body
+    transient_rate   : share of RCPT / DATA answered with a 4xx
+    permanent_rate   : share of RCPT / DATA answered with a 5xx
+    error_stage      : "rcpt" or "data" , where the injected errors happen
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        data_latency: float = 0.0,
+        transient_rate: float = 0.0,
+        permanent_rate: float = 0.0,
+        error_stage: str = "rcpt",
+        keep_messages: bool = False,
+        seed: Optional[int] = None,
+        enable_loggin: bool = True,
+    ) -> None:
+        if error_stage not in ("rcpt", "data"):
+            raise ValueError(f"error_stage must be 'rcpt' or 'data' got {error_stage}\n")
+        if transient_rate + permanent_rate > 1:
+            raise ValueError("the error rates add up to more than 1\n")
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.data_latency = data_latency
+        self.transient_rate = transient_rate
+        self.permanent_rate = permanent_rate
+        self.error_stage = error_stage
+        self.keep_messages = keep_messages
+        self.random = random.Random(seed)
+        self.stats = SinkStats()
+        self.messages: List[ReceivedMessage] = []
+        self.logger = logging.getLogger(__name__)
+        if not enable_loggin:
+            self.logger.setLevel(logging.CRITICAL + 1)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    # ============================================================================
+    # LIFECYCLE
+    # ============================================================================
+    def start(self) -> SMTPSink:
+        self._thread = threading.Thread(target=self._run, name="smtp-sink", daemon=True)
+        self._thread.start()
+        if not self._ready.wait(timeout=10):
+            raise RuntimeError("the smtp sink did not start in time\n")
+        self.logger.info(f"smtp sink listening on {self.host}:{self.port}\n")
+        return self
+
+    def _run(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            self._loop.run_until_complete(self._server.wait_closed())
+            self._loop.close()
+
+    def stop(self) -> None:
+        if self._loop is None or self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+        self._loop = None
+        self._thread = None
+        self.logger.info("smtp sink stopped\n")
+
+    def __enter__(self) -> SMTPSink:
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def reset_stats(self) -> None:
+        self.stats = SinkStats()
+        self.messages = []
+
+    # ============================================================================
+    # PROTOCOL
+    # ============================================================================
+    def _injected_error(self, stage: str) -> Optional[Tuple[int, str]]:
+        if stage != self.error_stage:
+            return None
+        roll = self.random.random()
+        if roll < self.transient_rate:
+            self.stats.transient_errors += 1
+            return (451, "4.7.1 try again later")
+        if roll < self.transient_rate + self.permanent_rate:
+            self.stats.permanent_errors += 1
+            return (550, "5.1.1 mailbox unavailable")
+        return None
+
+    async def _reply(self, writer: asyncio.StreamWriter, code: int, text: str, extra: float = 0.0) -> None:
+        if self.latency or extra:
+            await asyncio.sleep(self.latency + extra)
+        writer.write(f"{code} {text}\r\n".encode())
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.stats.connections += 1
+        mail_from = ""
+        recipients: List[str] = []
+        try:
+            await self._reply(writer, 220, "smtp-sink ESMTP ready")
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.stats.commands += 1
+                command = line.decode("utf-8", errors="replace").strip()
+                verb = command.split(" ", 1)[0].upper()
+
+                if verb in ("EHLO", "HELO"):
+                    if self.latency:
+                        await asyncio.sleep(self.latency)
+                    writer.write(
+                        b"250-smtp-sink\r\n250-8BITMIME\r\n250-AUTH PLAIN LOGIN\r\n250 SIZE 52428800\r\n"
+                    )
+                    await writer.drain()
+                elif verb == "AUTH":
+                    await self._reply(writer, 235, "2.7.0 accepted")
+                elif verb == "MAIL":
+                    mail_from = command[command.find("<") + 1 : command.rfind(">")]
+                    recipients = []
+                    await self._reply(writer, 250, "2.1.0 ok")
+                elif verb == "RCPT":
+                    error = self._injected_error("rcpt")
+                    if error:
+                        await self._reply(writer, *error)
+                    else:
+                        recipients.append(command[command.find("<") + 1 : command.rfind(">")])
+                        await self._reply(writer, 250, "2.1.5 ok")
+                elif verb == "DATA":
+                    if not recipients:
+                        await self._reply(writer, 503, "5.5.1 no valid recipients")
+                        continue
+                    await self._reply(writer, 354, "end data with <CR><LF>.<CR><LF>")
+                    chunks: List[bytes] = []
+                    size = 0
+                    while True:
+                        chunk = await reader.readline()
+                        if not chunk or chunk == b".\r\n":
+                            break
+                        size += len(chunk)
+                        if self.keep_messages:
+                            chunks.append(chunk[1:] if chunk.startswith(b"..") else chunk)
+                    error = self._injected_error("data")
+                    if error:
+                        await self._reply(writer, *error, extra=self.data_latency)
+                    else:
+                        self.stats.messages += 1
+                        self.stats.recipients += len(recipients)
+                        self.stats.bytes_received += size
+                        if self.keep_messages:
+                            self.messages.append(
+                                ReceivedMessage(mail_from, list(recipients), b"".join(chunks))
+                            )
+                        await self._reply(writer, 250, "2.0.0 queued", extra=self.data_latency)
+                    recipients = []
+                elif verb == "RSET":
+                    recipients = []
+                    await self._reply(writer, 250, "2.0.0 ok")
+                elif verb == "NOOP":
+                    await self._reply(writer, 250, "2.0.0 ok")
+                elif verb == "QUIT":
+                    await self._reply(writer, 221, "2.0.0 bye")
+                    break
+                else:
+                    await self._reply(writer, 502, "5.5.2 command not implemented")
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,128 @@
+from __future__ import annotations
+import dataclasses
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from jinja2 import Environment, StrictUndefined, Template, Undefined
+
+from app.Mailer.sender import EMAIL
+from app.supabase.supabaseClient import EmailRecord
+
+"""
+jinja2 templates for personalised subjects and bodies , every source string is
+compiled once and cached by its content hash
+"""
+
+RECORD_FIELDS = tuple(field.name for field in dataclasses.fields(EmailRecord))
+
+
+class TemplateNotFoundError(KeyError):
+    pass
+
+
+class EmailTemplateEngine:
+    def __init__(
+        self,
+        default_language: str = "en",
+        cache_size: int = 256,
+        strict: bool = True,
+        enable_loggin: bool = True,
+    ) -> None:
+        self.default_language = default_language
+        self.cache_size = cache_size
+        # plain text mail , no html escaping , a missing variable is an error
+        # instead of silently sending "Dear ," to a real person
+        self.environment = Environment(
+            autoescape=False,
+            keep_trailing_newline=True,
+            undefined=StrictUndefined if strict else Undefined,
+        )
+        self.logger = logging.getLogger(__name__)
+        if not enable_loggin:
+            self.logger.setLevel(logging.CRITICAL + 1)
+
+        # content hash -> compiled template
+        self._compiled: "OrderedDict[str, Template]" = OrderedDict()
+        # (template name , language) -> (subject source , body source)
+        self._variants: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+        self.compilations = 0
+
+    # ============================================================================
+    # REGISTRATION / COMPILATION
+    # ============================================================================
+    def register(
+        self, name: str, subject: str, body: str, language: Optional[str] = None
+    ) -> None:
+        language = (language or self.default_language).lower()
+        self._variants[(name, language)] = (subject, body)
+        # compile eagerly so a syntax error shows up at registration time
+        self.compile(subject)
+        self.compile(body)
+        self.logger.info(f"template '{name}' registered for language '{language}'\n")
+
+    def compile(self, source: str) -> Template:
+        digest = hashlib.sha256(source.encode("utf-8")).hexdigest()
+        with self._lock:
+            template = self._compiled.get(digest)
+            if template is not None:
+                self._compiled.move_to_end(digest)
+                return template
+        try:
+            template = self.environment.from_string(source)
+        except Exception as e:
+            self.logger.error(f"the template could not be compiled : {e}\n")
+            raise
+        with self._lock:
+            self._compiled[digest] = template
+            self.compilations += 1
+            while len(self._compiled) > self.cache_size:
+                self._compiled.popitem(last=False)
+        return template
+
+    def variant(self, name: str, language: Optional[str] = None) -> Tuple[Template, Template]:
+        # fall back on the default language when there is no translation
+        for lang in ((language or "").lower(), self.default_language):
+            sources = self._variants.get((name, lang))
+            if sources is not None:
+                return self.compile(sources[0]), self.compile(sources[1])
+        raise TemplateNotFoundError(f"no template named '{name}'\n")
+
+    # ============================================================================
+    # RENDERING
+    # ============================================================================
+    @staticmethod
+    def context_for(record: EmailRecord, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        context = {field: getattr(record, field, "") for field in RECORD_FIELDS}
+        full_name = (context.get("full_name") or "").strip()
+        context["first_name"] = full_name.split(" ")[0] if full_name else ""
+        if extra:
+            context.update(extra)
+        return context
+
+    def render(self, name: str, record: EmailRecord, **extra: Any) -> Tuple[str, str]:
+        subject, body = self.variant(name, record.language)
+        context = self.context_for(record, extra)
+        return subject.render(context), body.render(context)
+
+    def render_many(
+        self, name: str, records: Iterable[EmailRecord], **extra: Any
+    ) -> Iterator[Tuple[EmailRecord, str, str]]:
+        # resolve each language variant once for the whole batch
+        resolved: Dict[str, Tuple[Template, Template]] = {}
+        for record in records:
+            language = (record.language or self.default_language).lower()
+            templates = resolved.get(language)
+            if templates is None:
+                templates = resolved[language] = self.variant(name, language)
+            context = self.context_for(record, extra)
+            yield record, templates[0].render(context), templates[1].render(context)
+
+    def build_emails(
+        self, name: str, records: Iterable[EmailRecord], **email_fields: Any
+    ) -> Iterator[EMAIL]:
+        for record, subject, body in self.render_many(name, records):
+            yield EMAIL(to=record.email, subject=subject, body=body, **email_fields)
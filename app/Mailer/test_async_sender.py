@@ -0,0 +1,298 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.Mailer.async_sender import AsyncEmailSender, AsyncSMTPConnection
+from app.Mailer.circuit_breaker import CircuitBreaker
+from app.Mailer.sender import EMAIL, EmailStatus
+
+
+class FakeSMTPServer:
+    """just enough smtp for the async client , records every message"""
+
+    def __init__(self, reject=(), reject_code=550, auth_ok=True):
+        self.reject = set(reject)
+        self.reject_code = reject_code
+        self.auth_ok = auth_ok
+        self.messages = []
+        self.connections = 0
+        self.quits = 0
+        self.auth = []
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        writer.write(b"220 fake ready\r\n")
+        rcpts = []
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            cmd = line.decode().strip()
+            upper = cmd.upper()
+            if upper.startswith("EHLO"):
+                writer.write(b"250-fake\r\n250-AUTH PLAIN\r\n250 8BITMIME\r\n")
+            elif upper.startswith("AUTH"):
+                self.auth.append(cmd)
+                writer.write(b"235 ok\r\n" if self.auth_ok else b"535 bad credentials\r\n")
+            elif upper.startswith("MAIL"):
+                rcpts = []
+                writer.write(b"250 ok\r\n")
+            elif upper.startswith("RCPT"):
+                address = cmd[cmd.index("<") + 1 : cmd.index(">")]
+                if address in self.reject:
+                    writer.write(f"{self.reject_code} no such user\r\n".encode())
+                else:
+                    rcpts.append(address)
+                    writer.write(b"250 ok\r\n")
+            elif upper == "DATA":
+                writer.write(b"354 go ahead\r\n")
+                await writer.drain()
+                data = []
+                while True:
+                    chunk = await reader.readline()
+                    if chunk == b".\r\n":
+                        break
+                    data.append(chunk)
+                self.messages.append((list(rcpts), b"".join(data)))
+                writer.write(b"250 queued\r\n")
+            elif upper in ("NOOP", "RSET"):
+                writer.write(b"250 ok\r\n")
+            elif upper == "QUIT":
+                self.quits += 1
+                writer.write(b"221 bye\r\n")
+                await writer.drain()
+                break
+            else:
+                writer.write(b"502 unknown\r\n")
+            await writer.drain()
+        writer.close()
+
+
+def run_with_server(server, scenario):
+    async def main():
+        listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            return await scenario(port)
+        finally:
+            listener.close()
+            await listener.wait_closed()
+
+    return asyncio.run(main())
+
+
+def make_sender(port, **kwargs):
+    return AsyncEmailSender(
+        email_user="me@example.com",
+        email_app_password="secret",
+        host="127.0.0.1",
+        port=port,
+        use_tls=False,
+        enable_loggin=False,
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def valid_pattern():
+    with patch(
+        "app.Mailer.async_sender.EmailManager.valid_email_pattern", return_value=True
+    ):
+        yield
+
+
+class TestAsyncSMTPConnection:
+    def test_refused_recipients_are_reported(self):
+        server = FakeSMTPServer(reject={"bad@example.com"})
+
+        async def scenario(port):
+            connection = AsyncSMTPConnection("127.0.0.1", port, use_tls=False)
+            await connection.connect()
+            refused = await connection.sendmail(
+                "me@example.com",
+                ["good@example.com", "bad@example.com"],
+                b"Subject: hi\r\n\r\n.leading dot\r\n",
+            )
+            await connection.quit()
+            return refused
+
+        refused = run_with_server(server, scenario)
+        assert list(refused) == ["bad@example.com"]
+        assert refused["bad@example.com"][0] == 550
+        rcpts, body = server.messages[0]
+        assert rcpts == ["good@example.com"]
+        # dot stuffed on the wire
+        assert b"..leading dot" in body
+
+
+class TestAsyncEmailSender:
+    def test_send_single_email(self, valid_pattern):
+        server = FakeSMTPServer()
+        email = EMAIL(to="friend@example.com", subject="hello", body="body text")
+
+        async def scenario(port):
+            sender = make_sender(port)
+            result = await sender.send_single_email(email)
+            await sender.close()
+            return result
+
+        assert run_with_server(server, scenario) is True
+        assert email.status == EmailStatus.SUCCESS
+        assert server.auth
+        assert b"Subject: hello" in server.messages[0][1]
+
+    def test_all_recipients_refused_fails(self, valid_pattern):
+        server = FakeSMTPServer(reject={"bad@example.com"})
+        email = EMAIL(to="bad@example.com", subject="s", body="b", max_retries=2)
+
+        async def scenario(port):
+            sender = make_sender(port)
+            result = await sender.send_single_email(email)
+            await sender.close()
+            return result
+
+        assert run_with_server(server, scenario) is False
+        assert email.status == EmailStatus.FAILED
+        # 550 is permanent , no second attempt
+        assert email.retry_count == 1
+
+    def test_partial_refusal_is_not_a_success(self, valid_pattern):
+        server = FakeSMTPServer(reject={"bad@example.com"})
+        email = EMAIL(to=["good@example.com", "bad@example.com"], subject="s", body="b")
+
+        async def scenario(port):
+            sender = make_sender(port)
+            result = await sender.send_single_email(email)
+            await sender.close()
+            return result
+
+        assert run_with_server(server, scenario) is False
+        assert email.status == EmailStatus.FAILED
+        assert "bad@example.com" in email.error_message
+        # the accepted address got the one copy
+        assert [rcpts for rcpts, _ in server.messages] == [["good@example.com"]]
+
+    def test_open_circuit_does_not_use_a_retry(self, valid_pattern):
+        server = FakeSMTPServer()
+        email = EMAIL(to="friend@example.com", subject="s", body="b", max_retries=1)
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05, enable_loggin=False)
+        breaker.record_failure(ConnectionError("down"))
+
+        async def scenario(port):
+            sender = make_sender(port, breaker=breaker, retry_base_delay=0)
+            result = await sender.send_single_email(email)
+            await sender.close()
+            return result
+
+        # the only attempt is the one made once the circuit lets it through
+        assert run_with_server(server, scenario) is True
+        assert email.retry_count == 0
+        assert len(server.messages) == 1
+
+    def test_partial_refusal_backoff_frees_the_session(self, valid_pattern):
+        server = FakeSMTPServer(reject={"busy@example.com"}, reject_code=450)
+        refused = EMAIL(
+            to=["good@example.com", "busy@example.com"], subject="s", body="b", max_retries=2
+        )
+        other = EMAIL(to="other@example.com", subject="s", body="b")
+
+        async def scenario(port):
+            sender = make_sender(port, max_connections=1, retry_base_delay=1.0)
+            started = asyncio.get_running_loop().time()
+
+            async def second():
+                await asyncio.sleep(0.05)
+                assert await sender.send_single_email(other)
+                return asyncio.get_running_loop().time() - started
+
+            _, elapsed = await asyncio.gather(sender.send_single_email(refused), second())
+            await sender.close()
+            return elapsed
+
+        # the backoff of the refused one is at least 0.5s , the only session is free meanwhile
+        assert run_with_server(server, scenario) < 0.4
+        assert refused.status == EmailStatus.FAILED
+
+    def test_failed_auth_closes_the_connection(self, valid_pattern):
+        server = FakeSMTPServer(auth_ok=False)
+        email = EMAIL(to="friend@example.com", subject="s", body="b", max_retries=1)
+
+        async def scenario(port):
+            sender = make_sender(port)
+            result = await sender.send_single_email(email)
+            await asyncio.sleep(0.05)
+            await sender.close()
+            return result
+
+        assert run_with_server(server, scenario) is False
+        assert server.connections == 1
+        # the client hung up itself instead of leaving the socket to the gc
+        assert server.quits == 1
+        assert "535" in email.error_message
+
+    def test_batch_reuses_connections(self, valid_pattern):
+        server = FakeSMTPServer()
+        emails = [
+            EMAIL(to=f"user{i}@example.com", subject="s", body="b") for i in range(20)
+        ]
+
+        async def scenario(port):
+            sender = make_sender(port, max_connections=3)
+            results = [r async for r in sender.send_batch(emails, concurrency=5)]
+            await sender.close()
+            return results
+
+        results = run_with_server(server, scenario)
+        assert len(results) == 20
+        assert all(success for _, success in results)
+        assert len(server.messages) == 20
+        assert server.connections <= 3
+
+    def test_batch_respects_scheduler_quota(self, valid_pattern):
+        server = FakeSMTPServer()
+        emails = [
+            EMAIL(to=f"user{i}@example.com", subject="s", body="b") for i in range(10)
+        ]
+        scheduler = MagicMock()
+        quota = {"left": 3}
+        scheduler.remaining_quota.side_effect = lambda: quota["left"]
+        scheduler.increment_counters.side_effect = lambda: quota.update(
+            left=quota["left"] - 1
+        )
+
+        async def scenario(port):
+            sender = make_sender(port)
+            results = [
+                r
+                async for r in sender.send_batch(
+                    emails, concurrency=4, scheduler=scheduler
+                )
+            ]
+            await sender.close()
+            return results
+
+        results = run_with_server(server, scenario)
+        assert len(results) == 3
+
+    def test_pacing_is_awaited(self, valid_pattern):
+        server = FakeSMTPServer()
+        emails = [EMAIL(to="a@example.com", subject="s", body="b")]
+
+        async def scenario(port):
+            sender = make_sender(port)
+            with patch(
+                "app.Mailer.async_sender.asyncio.sleep", new=AsyncMock()
+            ) as fake_sleep:
+                results = [
+                    r
+                    async for r in sender.send_batch(
+                        emails, concurrency=1, pacing=(15, 90)
+                    )
+                ]
+            await sender.close()
+            return results, fake_sleep
+
+        results, fake_sleep = run_with_server(server, scenario)
+        assert len(results) == 1
+        delay = fake_sleep.await_args[0][0]
+        assert 15 <= delay <= 90
@@ -0,0 +1,66 @@
+import base64
+import os
+import pytest
+
+from app.Mailer.attachment_cache import AttachmentCache
+
+
+@pytest.fixture
+def pdf(tmp_path):
+    path = tmp_path / "resume.pdf"
+    path.write_bytes(b"%PDF fake content" * 10)
+    return path
+
+
+def decoded(part):
+    return base64.b64decode(part.get_payload())
+
+
+class TestAttachmentCache:
+    def test_part_is_reused(self, pdf):
+        cache = AttachmentCache(enable_loggin=False)
+        first = cache.get_part(str(pdf))
+        second = cache.get_part(str(pdf))
+        assert first is second
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert decoded(first) == pdf.read_bytes()
+        assert first.get_content_type() == "application/pdf"
+
+    def test_modified_file_is_re_encoded(self, pdf):
+        cache = AttachmentCache(enable_loggin=False)
+        cache.get_part(str(pdf))
+        pdf.write_bytes(b"new content , different size")
+        stat = pdf.stat()
+        os.utime(pdf, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        part = cache.get_part(str(pdf))
+        assert decoded(part) == b"new content , different size"
+        # the stale version has been dropped
+        assert len(cache) == 1
+
+    def test_large_files_are_memory_mapped(self, tmp_path):
+        big = tmp_path / "big.bin"
+        big.write_bytes(os.urandom(4096))
+        cache = AttachmentCache(mmap_threshold=1024, enable_loggin=False)
+        assert decoded(cache.get_part(str(big))) == big.read_bytes()
+
+    def test_lru_eviction_under_byte_budget(self, tmp_path):
+        paths = []
+        for name in "abc":
+            path = tmp_path / f"{name}.txt"
+            path.write_bytes(name.encode() * 300)
+            paths.append(str(path))
+        cache = AttachmentCache(max_bytes=1000, enable_loggin=False)
+        cache.get_part(paths[0])
+        cache.get_part(paths[1])
+        # touch a so b becomes the least recently used
+        cache.get_part(paths[0])
+        cache.get_part(paths[2])
+        assert cache.size <= 1000
+        cache.get_part(paths[0])
+        assert cache.hits == 2
+
+    def test_oversized_file_is_not_cached(self, pdf):
+        cache = AttachmentCache(max_bytes=10, enable_loggin=False)
+        cache.get_part(str(pdf))
+        assert len(cache) == 0
+        assert cache.size == 0
@@ -0,0 +1,118 @@
+import smtplib
+import pytest
+
+from app.Mailer.circuit_breaker import (
+    CircuitBreaker,
+    CircuitOpenError,
+    CircuitState,
+    is_transport_failure,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(failure_threshold=3, reset_timeout=10, max_reset_timeout=40, clock=clock, enable_loggin=False)
+
+
+def trip(breaker, times=3):
+    for _ in range(times):
+        assert breaker.allow_request()
+        breaker.record_failure(smtplib.SMTPServerDisconnected("dropped"))
+
+
+class TestCircuitBreaker:
+    def test_trips_after_consecutive_failures(self, breaker):
+        trip(breaker, 2)
+        assert breaker.state is CircuitState.CLOSED
+        trip(breaker, 1)
+        assert breaker.state is CircuitState.OPEN
+        assert not breaker.allow_request()
+        assert breaker.retry_after() == pytest.approx(10)
+
+    def test_success_resets_the_count(self, breaker):
+        trip(breaker, 2)
+        breaker.record_success()
+        trip(breaker, 2)
+        assert breaker.state is CircuitState.CLOSED
+
+    def test_single_half_open_probe(self, breaker, clock):
+        trip(breaker)
+        clock.now = 10
+        assert breaker.allow_request()
+        assert breaker.state is CircuitState.HALF_OPEN
+        # only one probe at a time
+        assert not breaker.allow_request()
+        breaker.record_success()
+        assert breaker.state is CircuitState.CLOSED
+        assert breaker.allow_request()
+
+    def test_failed_probe_doubles_the_open_period(self, breaker, clock):
+        trip(breaker)
+        clock.now = 10
+        assert breaker.allow_request()
+        breaker.record_failure(smtplib.SMTPServerDisconnected("still down"))
+        assert breaker.state is CircuitState.OPEN
+        assert breaker.retry_after() == pytest.approx(20)
+        assert breaker.trips == 2
+
+    def test_listeners_see_every_transition(self, breaker, clock):
+        seen = []
+        breaker.add_listener(lambda snapshot: seen.append(snapshot["state"]))
+        trip(breaker)
+        clock.now = 10
+        breaker.allow_request()
+        breaker.record_success()
+        assert seen == ["open", "half_open", "closed"]
+
+    def test_listener_may_read_the_breaker(self, breaker, clock):
+        # listeners run outside the lock , reading back must not deadlock
+        seen = []
+        breaker.add_listener(
+            lambda snapshot: seen.append((breaker.state, breaker.retry_after(), breaker.snapshot()["trips"]))
+        )
+        trip(breaker)
+        clock.now = 10
+        breaker.allow_request()
+        assert seen == [(CircuitState.OPEN, 10, 1), (CircuitState.HALF_OPEN, 0.0, 1)]
+
+    def test_non_smtp_error_releases_the_probe_without_closing(self, breaker, clock):
+        trip(breaker)
+        clock.now = 10
+        assert breaker.allow_request()
+        breaker.record(ValueError("bad header"))
+        assert breaker.state is CircuitState.HALF_OPEN
+        # the probe slot is free again
+        assert breaker.allow_request()
+
+    def test_record_ignores_recipient_errors(self, breaker):
+        for _ in range(5):
+            breaker.record(smtplib.SMTPResponseException(550, b"no such user"))
+        assert breaker.state is CircuitState.CLOSED
+
+    @pytest.mark.parametrize(
+        "error,expected",
+        [
+            (smtplib.SMTPAuthenticationError(535, b"bad credentials"), True),
+            (smtplib.SMTPResponseException(421, b"slow down"), True),
+            (smtplib.SMTPServerDisconnected("dropped"), True),
+            (smtplib.SMTPResponseException(550, b"no such user"), False),
+            (smtplib.SMTPRecipientsRefused({"a@b.com": (451, b"later")}), False),
+            (CircuitOpenError("open"), False),
+            (ValueError("bug"), False),
+        ],
+    )
+    def test_is_transport_failure(self, error, expected):
+        assert is_transport_failure(error) is expected
@@ -0,0 +1,126 @@
+import threading
+import pytest
+from unittest.mock import MagicMock
+
+from app.Mailer.connection_pool import PoolExhaustedError, SMTPConnectionPool
+
+
+def make_session(alive: bool = True):
+    session = MagicMock()
+    session.smtp.noop.return_value = (250, b"OK") if alive else (421, b"closing")
+    return session
+
+
+@pytest.fixture
+def factory():
+    return MagicMock(side_effect=lambda: make_session())
+
+
+class TestPoolInit:
+    def test_prewarms_min_sessions(self, factory):
+        pool = SMTPConnectionPool(factory, min_sessions=2, enable_loggin=False)
+        assert factory.call_count == 2
+        assert pool.stats()["idle"] == 2
+        assert pool.primary is not None
+
+    def test_invalid_sizes(self, factory):
+        with pytest.raises(ValueError):
+            SMTPConnectionPool(factory, min_sessions=3, max_sessions=2)
+
+    def test_factory_failure_propagates(self):
+        factory = MagicMock(side_effect=Exception("auth failed"))
+        with pytest.raises(Exception):
+            SMTPConnectionPool(factory, enable_loggin=False)
+
+
+class TestBorrowAndReturn:
+    def test_reuses_released_session(self, factory):
+        pool = SMTPConnectionPool(factory, min_sessions=1, enable_loggin=False)
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+        assert first is second
+        assert factory.call_count == 1
+
+    def test_grows_up_to_max(self, factory):
+        pool = SMTPConnectionPool(
+            factory, min_sessions=1, max_sessions=2, enable_loggin=False
+        )
+        a = pool.acquire()
+        b = pool.acquire()
+        assert a is not b
+        assert pool.stats()["in_use"] == 2
+        with pytest.raises(PoolExhaustedError):
+            pool.acquire(timeout=0.01)
+        pool.release(a)
+        pool.release(b)
+
+    def test_waiting_borrower_is_woken_on_release(self, factory):
+        pool = SMTPConnectionPool(
+            factory, min_sessions=1, max_sessions=1, enable_loggin=False
+        )
+        held = pool.acquire()
+        got = []
+        worker = threading.Thread(target=lambda: got.append(pool.acquire(timeout=2)))
+        worker.start()
+        pool.release(held)
+        worker.join()
+        assert got == [held]
+
+    def test_broken_session_is_discarded(self, factory):
+        pool = SMTPConnectionPool(factory, min_sessions=1, enable_loggin=False)
+        session = pool.acquire()
+        pool.release(session, broken=True)
+        session.close.assert_called_once()
+        assert pool.stats()["total"] == 0
+
+
+class TestLiveness:
+    def test_dead_idle_session_is_reconnected(self, factory):
+        pool = SMTPConnectionPool(
+            factory, min_sessions=1, probe_after=0, enable_loggin=False
+        )
+        pool.primary.smtp.noop.return_value = (421, b"closing")
+        stale = pool.primary.smtp
+        session = pool.acquire()
+        session.login.assert_called_once()
+        # the dead socket is closed before logging in again
+        stale.close.assert_called_once()
+        pool.release(session)
+
+    def test_stale_close_error_does_not_stop_the_reconnect(self, factory):
+        pool = SMTPConnectionPool(
+            factory, min_sessions=1, probe_after=0, enable_loggin=False
+        )
+        pool.primary.smtp.noop.return_value = (421, b"closing")
+        pool.primary.smtp.close.side_effect = OSError("already reset")
+        session = pool.acquire()
+        assert session is pool.primary
+        session.login.assert_called_once()
+        pool.release(session)
+
+    def test_expired_idle_session_is_replaced(self, factory):
+        pool = SMTPConnectionPool(
+            factory, min_sessions=1, idle_timeout=0, enable_loggin=False
+        )
+        old = pool.primary
+        session = pool.acquire()
+        assert session is not old
+        old.close.assert_called_once()
+
+    def test_noop_exception_means_dead(self, factory):
+        pool = SMTPConnectionPool(factory, min_sessions=0, enable_loggin=False)
+        session = make_session()
+        session.smtp.noop.side_effect = OSError("reset")
+        assert pool.is_alive(session) is False
+
+    def test_prune_keeps_min_sessions(self, factory):
+        pool = SMTPConnectionPool(
+            factory, min_sessions=1, max_sessions=3, idle_timeout=0, enable_loggin=False
+        )
+        a, b = pool.acquire(), pool.acquire()
+        pool.release(a)
+        pool.release(b)
+        assert pool.prune_idle() == 1
+        assert pool.stats()["total"] == 1
@@ -6,7 +6,7 @@ from datetime import datetime
 from queue import Queue
 
 from yagmail.message import email
-from app.Mailer.sender import EMAIL, EmailPriority, EmailSender, EmailStatus
+from app.Mailer.sender import EMAIL, EMAIL_FIELDS, EmailPriority, EmailSender, EmailStatus
 from configuration.config import loading_env_variables
 
 email_personal = loading_env_variables("EMAIL")
@@ -39,7 +39,10 @@ def sample_email_attachement(tmp_path):
 
 @pytest.fixture
 def mock_yagmail():
-    with patch("app.Mailer.sender.yagmail.SMTP") as mock:
+    with patch("app.Mailer.transport.yagmail.SMTP") as mock:
+        mock.return_value.user = "test_email@gmail.com"
+        # smtplib returns the refused recipients , none by default
+        mock.return_value.smtp.sendmail.return_value = {}
         yield mock
 
 
@@ -103,6 +106,50 @@ class TestEmail:
         assert isinstance(email.to, list)
         assert len(email.to) == 2
 
+    def test_email_is_slotted(self):
+        email = EMAIL(to="test_email@gmail.com", subject="test", body="body")
+        assert not hasattr(email, "__dict__")
+        with pytest.raises(AttributeError):
+            email.unknown_field = 1
+
+    def test_to_dict_covers_every_field(self):
+        import dataclasses
+
+        email = EMAIL(to="test_email@gmail.com", subject="test", body="body")
+        assert tuple(email.to_dict()) == EMAIL_FIELDS
+        assert EMAIL_FIELDS == tuple(field.name for field in dataclasses.fields(EMAIL))
+
+    def test_from_dict_does_not_mutate_its_input(self):
+        email = EMAIL(
+            to=["a@gmail.com", "b@gmail.com"],
+            subject="test",
+            body="body",
+            priority=EmailPriority.URGENT,
+            retry_count=2,
+        )
+        data = email.to_dict()
+        snapshot = dict(data)
+
+        restored = EMAIL.from_dict(data)
+
+        assert data == snapshot
+        assert data["priority"] == "urgent"
+        assert restored == email
+
+    def test_from_dict_shares_campaign_strings(self):
+        import json
+
+        email = EMAIL(
+            to="a@gmail.com", subject="campaign subject", body="x" * 500, attachments=["cv.pdf"]
+        )
+        row = json.dumps(email.to_dict())
+        first = EMAIL.from_dict(json.loads(row))
+        second = EMAIL.from_dict(json.loads(row))
+        assert first.subject is second.subject
+        assert first.attachments[0] is second.attachments[0]
+        # bodies are not interned
+        assert first.body == second.body and first.body is not second.body
+
 
 class TestEmailSenderInit:
     def test_initialization_success(self, mock_yagmail):
@@ -231,20 +278,300 @@ class TestSendSingleEmail:
             result = email_sender.send_single_email(sample_email_attachement)
 
             assert result is True
-            email_sender.yagmail.send.assert_called_once()
+            email_sender.yagmail.smtp.sendmail.assert_called_once()
+            message = email_sender.yagmail.smtp.sendmail.call_args[0][2]
+            assert 'filename="test.pdf"' in message
 
     def test_send_email_exception(self, email_sender, sample_email):
         """Test email sending with exception"""
         with patch(
             "app.Mailer.sender.EmailManager.valid_email_pattern", return_value=True
         ):
-            email_sender.yagmail.send.side_effect = Exception("SMTP Error")
+            email_sender.yagmail.smtp.sendmail.side_effect = Exception("SMTP Error")
             result = email_sender.send_single_email(sample_email)
             assert result is False
             assert sample_email.status == EmailStatus.FAILED
             assert "SMTP Error" in sample_email.error_message
 
 
+class TestRetryScheduling:
+    def test_transient_failure_is_deferred(self, email_sender, sample_email):
+        import smtplib
+
+        with patch(
+            "app.Mailer.sender.EmailManager.valid_email_pattern", return_value=True
+        ):
+            email_sender.yagmail.smtp.sendmail.side_effect = (
+                smtplib.SMTPResponseException(421, b"try again later")
+            )
+            result = email_sender.send_single_email(sample_email)
+
+        assert result is False
+        assert sample_email.status == EmailStatus.RETRYING
+        assert sample_email.retry_count == 1
+        assert sample_email.scheduled_for is not None
+        assert len(email_sender.retry_queue) == 1
+        # a single attempt , no immediate retry storm
+        assert email_sender.yagmail.smtp.sendmail.call_count == 1
+
+    def test_permanent_failure_is_not_retried(self, email_sender, sample_email):
+        import smtplib
+
+        with patch(
+            "app.Mailer.sender.EmailManager.valid_email_pattern", return_value=True
+        ):
+            email_sender.yagmail.smtp.sendmail.side_effect = (
+                smtplib.SMTPResponseException(550, b"mailbox unavailable")
+            )
+            result = email_sender.send_single_email(sample_email)
+
+        assert result is False
+        assert sample_email.status == EmailStatus.FAILED
+        assert len(email_sender.retry_queue) == 0
+
+    def test_batch_resends_due_retries(self, email_sender, sample_email):
+        import smtplib
+
+        email_sender.retry_base_delay = 0
+        outcomes = [smtplib.SMTPServerDisconnected("dropped"), None]
+        email_sender.yagmail.smtp.sendmail.side_effect = outcomes
+        with patch(
+            "app.Mailer.sender.EmailManager.valid_email_pattern", return_value=True
+        ):
+            results = list(email_sender.send_batch([sample_email], concurrency=1))
+
+        assert results == [(sample_email, True)]
+        assert sample_email.retry_count == 1
+        assert sample_email.status == EmailStatus.SUCCESS
+        assert sample_email.error_message is None
+
+    def test_retries_stop_at_max(self, email_sender, sample_email):
+        import smtplib
+
+        email_sender.retry_base_delay = 0
+        sample_email.max_retries = 3
+        email_sender.yagmail.smtp.sendmail.side_effect = smtplib.SMTPServerDisconnected(
+            "dropped"
+        )
+        with patch(
+            "app.Mailer.sender.EmailManager.valid_email_pattern", return_value=True
+        ):
+            results = list(email_sender.send_batch([sample_email], concurrency=1))
+
+        assert results == [(sample_email, False)]
+        assert sample_email.retry_count == 3
+        assert sample_email.status == EmailStatus.FAILED
+
+
+class TestPartialRefusal:
+    def test_refused_recipient_is_retried(self, email_sender):
+        email = EMAIL(to=["ok@gmail.com", "busy@gmail.com"], subject="s", body="b")
+        email_sender.yagmail.smtp.sendmail.return_value = {"busy@gmail.com": (450, b"busy")}
+        with patch(
+            "app.Mailer.sender.EmailManager.valid_email_pattern", return_value=True
+        ):
+            assert email_sender.send_single_email(email) is False
+
+        assert email.status == EmailStatus.RETRYING
+        assert "busy@gmail.com" in email.error_message
+        assert len(email_sender.retry_queue) == 1
+
+
+class TestAttachmentReuse:
+    def test_attachment_is_encoded_once_per_run(
+        self, email_sender, sample_email_attachement
+    ):
+        with patch(
+            "app.Mailer.sender.EmailManager.valid_email_pattern", return_value=True
+        ):
+            for _ in range(3):
+                sample_email_attachement.status = EmailStatus.PENDING
+                assert email_sender.send_single_email(sample_email_attachement)
+
+        # read and encoded a single time for the whole run
+        assert email_sender.attachment_cache.misses == 1
+
+    def test_bcc_stays_out_of_headers(self, email_sender, sample_email):
+        sample_email.bcc = "hidden@gmail.com"
+        with patch(
+            "app.Mailer.sender.EmailManager.valid_email_pattern", return_value=True
+        ):
+            email_sender.send_single_email(sample_email)
+        _, envelope, message = email_sender.yagmail.smtp.sendmail.call_args[0]
+        assert "hidden@gmail.com" in envelope
+        assert "hidden@gmail.com" not in message
+
+
+class TestConnectionPooling:
+    def test_sessions_are_reused_between_sends(
+        self, email_sender, mock_yagmail, sample_email
+    ):
+        with patch(
+            "app.Mailer.sender.EmailManager.valid_email_pattern", return_value=True
+        ):
+            email_sender.send_single_email(sample_email)
+            second = EMAIL(to="other@gmail.com", subject="s", body="b")
+            email_sender.send_single_email(second)
+
+        # only the warm session has been opened , no reconnect per message
+        assert mock_yagmail.call_count == 1
+        mock_yagmail.return_value.send.assert_not_called()
+        assert email_sender.yagmail.smtp.sendmail.call_count == 2
+
+    def test_close_shuts_the_pool(self, email_sender):
+        email_sender.close()
+        email_sender.yagmail.close.assert_called_once()
+
+class TestCircuitBreakerIntegration:
+    def test_open_circuit_defers_without_touching_smtp(self, email_sender, sample_email):
+        import smtplib
+
+        email_sender.breaker.failure_threshold = 2
+        email_sender.yagmail.smtp.sendmail.side_effect = smtplib.SMTPResponseException(
+            421, b"slow down"
+        )
+        emails = [EMAIL(to=f"u{i}@gmail.com", subject="s", body="b") for i in range(4)]
+        with patch(
+            "app.Mailer.sender.EmailManager.valid_email_pattern", return_value=True
+        ):
+            for email in emails:
+                email_sender.send_single_email(email)
+
+        # two real attempts trip the breaker , the other two never reach the server
+        assert email_sender.yagmail.smtp.sendmail.call_count == 2
+        assert email_sender.breaker.state.value == "open"
+        assert all(email.status == EmailStatus.RETRYING for email in emails)
+        assert "circuit open" in emails[3].error_message
+        assert len(email_sender.retry_queue) == 4
+        # deferred by the open circuit , no attempt used up
+        assert [email.retry_count for email in emails] == [1, 1, 0, 0]
+
+    def test_bad_header_does_not_close_a_half_open_circuit(self, email_sender):
+        for _ in range(email_sender.breaker.failure_threshold):
+            email_sender.breaker.record_failure(ConnectionError("down"))
+        email_sender.breaker.clock = lambda: float("inf")
+        bad = EMAIL(to="u@gmail.com", subject="hi\r\nBcc: x@evil.com", body="b")
+        with patch(
+            "app.Mailer.sender.EmailManager.valid_email_pattern", return_value=True
+        ):
+            assert email_sender.send_single_email(bad) is False
+
+        email_sender.yagmail.smtp.sendmail.assert_not_called()
+        assert email_sender.breaker.state.value != "closed"
+        # the probe is still there for a real send
+        assert email_sender.breaker.allow_request() is True
+
+    def test_scheduler_sees_the_breaker(self, email_sender):
+        from app.scheduler.scheduler import EmailScheduler
+
+        scheduler = EmailScheduler(enable_loggin=False)
+        assert scheduler.check_transport_available()[0] is True
+        scheduler.attach_circuit_breaker(email_sender.breaker)
+        for _ in range(email_sender.breaker.failure_threshold):
+            email_sender.breaker.record_failure(ConnectionError("down"))
+        ok, message = scheduler.check_transport_available()
+        assert ok is False
+        assert "circuit is open" in message
+
+
+class TestGroupedSending:
+    def make_campaign(self, count):
+        return [
+            EMAIL(to=f"user{i}@gmail.com", subject="campaign", body="same body")
+            for i in range(count)
+        ]
+
+    def test_one_transaction_per_chunk(self, email_sender):
+        emails = self.make_campaign(5)
+        email_sender.yagmail.smtp.sendmail.return_value = {}
+        with patch(
+            "app.Mailer.sender.EmailManager.valid_email_pattern", return_value=True
+        ):
+            results = list(email_sender.send_grouped(emails, max_recipients=2))
+
+        assert [success for _, success in results] == [True] * 5
+        calls = email_sender.yagmail.smtp.sendmail.call_args_list
+        assert [len(call.args[1]) for call in calls] == [2, 2, 1]
+        # bcc semantics , the recipients are not in the headers
+        message = calls[0].args[2]
+        assert "To: undisclosed-recipients:;" in message
+        assert "user0@gmail.com" not in message
+        assert all(email.status == EmailStatus.SUCCESS for email in emails)
+
+    def test_refused_recipients_are_mapped_back(self, email_sender):
+        emails = self.make_campaign(3)
+        email_sender.yagmail.smtp.sendmail.return_value = {
+            "user1@gmail.com": (550, b"no such user"),
+            "user2@gmail.com": (452, b"mailbox full"),
+        }
+        with patch(
+            "app.Mailer.sender.EmailManager.valid_email_pattern", return_value=True
+        ):
+            results = email_sender.send_group(emails)
+
+        assert results == [True, False, False]
+        assert emails[0].status == EmailStatus.SUCCESS
+        assert emails[1].status == EmailStatus.FAILED
+        assert "no such user" in emails[1].error_message
+        assert emails[2].status == EmailStatus.RETRYING
+        assert len(email_sender.retry_queue) == 1
+
+    def test_all_refused(self, email_sender):
+        import smtplib
+
+        emails = self.make_campaign(2)
+        email_sender.yagmail.smtp.sendmail.side_effect = smtplib.SMTPRecipientsRefused(
+            {
+                "user0@gmail.com": (550, b"no such user"),
+                "user1@gmail.com": (550, b"no such user"),
+            }
+        )
+        with patch(
+            "app.Mailer.sender.EmailManager.valid_email_pattern", return_value=True
+        ):
+            results = email_sender.send_group(emails)
+
+        assert results == [False, False]
+        assert all(email.status == EmailStatus.FAILED for email in emails)
+
+    def test_cc_and_different_bodies_are_not_grouped(self, email_sender):
+        emails = self.make_campaign(2) + [
+            EMAIL(to="boss@gmail.com", subject="campaign", body="same body", cc="x@gmail.com"),
+            EMAIL(to="other@gmail.com", subject="campaign", body="another body"),
+        ]
+        email_sender.yagmail.smtp.sendmail.return_value = {}
+        with patch(
+            "app.Mailer.sender.EmailManager.valid_email_pattern", return_value=True
+        ):
+            results = list(email_sender.send_grouped(emails))
+
+        assert len(results) == 4
+        calls = email_sender.yagmail.smtp.sendmail.call_args_list
+        assert sorted(len(call.args[1]) for call in calls) == [1, 2, 2]
+        # the cc email keeps its own visible To header
+        cc_message = next(call.args[2] for call in calls if "boss@gmail.com" in call.args[1])
+        assert "To: boss@gmail.com" in cc_message
+
+    def test_scheduler_quota_caps_the_chunk(self, email_sender):
+        scheduler = MagicMock()
+        scheduler.remaining_quota.side_effect = [2, 0]
+        emails = self.make_campaign(5)
+        email_sender.yagmail.smtp.sendmail.return_value = {}
+        with patch(
+            "app.Mailer.sender.EmailManager.valid_email_pattern", return_value=True
+        ):
+            results = list(
+                email_sender.send_grouped(emails, max_recipients=3, scheduler=scheduler)
+            )
+
+        assert [success for _, success in results] == [True, True, False, False, False]
+        assert scheduler.increment_counters.call_count == 2
+        held = [email for email, success in results if not success]
+        assert all(email.status is EmailStatus.PENDING for email in held)
+        assert all("rate limit" in email.error_message for email in held)
+        assert email_sender.yagmail.smtp.sendmail.call_count == 1
+
+
 # Test Enums
 class TestEnums:
     def test_email_status_values(self):
@@ -258,3 +585,156 @@ class TestEnums:
         assert EmailPriority.LOW.value == "low"
         assert EmailPriority.NORMAL.value == "normal"
         assert EmailPriority.HIGH.value == "high"
+
+
+class TestSendBatch:
+    def build(self, count):
+        return [
+            EMAIL(to=f"user{i}@gmail.com", subject="s", body="b", email_id=str(i))
+            for i in range(count)
+        ]
+
+    def test_all_results_are_yielded(self, email_sender):
+        emails = self.build(10)
+        with patch(
+            "app.Mailer.sender.EmailManager.valid_email_pattern", return_value=True
+        ):
+            results = list(email_sender.send_batch(emails, concurrency=3))
+        assert len(results) == 10
+        assert all(success for _, success in results)
+        assert {e.email_id for e, _ in results} == {e.email_id for e in emails}
+
+    def test_concurrency_is_bounded(self, email_sender):
+        import threading
+        import time
+
+        lock = threading.Lock()
+        active = {"now": 0, "peak": 0}
+
+        def fake_send(email, defer_retry=True):
+            with lock:
+                active["now"] += 1
+                active["peak"] = max(active["peak"], active["now"])
+            time.sleep(0.01)
+            with lock:
+                active["now"] -= 1
+            return True
+
+        email_sender.send_single_email = fake_send
+        list(email_sender.send_batch(self.build(12), concurrency=3))
+        assert active["peak"] <= 3
+
+    def test_scheduler_limit_is_respected(self, email_sender):
+        scheduler = MagicMock()
+        quota = {"left": 4}
+
+        def increment():
+            quota["left"] -= 1
+
+        scheduler.remaining_quota.side_effect = lambda: quota["left"]
+        scheduler.increment_counters.side_effect = increment
+        email_sender.send_single_email = lambda email, defer_retry=True: True
+
+        results = list(
+            email_sender.send_batch(self.build(10), concurrency=3, scheduler=scheduler)
+        )
+        assert len(results) == 4
+        assert scheduler.increment_counters.call_count == 4
+
+    def test_throttle_lookahead_is_handed_back_on_the_quota(self, email_sender):
+        from app.scheduler.domain_throttle import DomainPolicy, DomainThrottle
+
+        scheduler = MagicMock()
+        quota = {"left": 3}
+
+        def increment():
+            quota["left"] -= 1
+
+        scheduler.remaining_quota.side_effect = lambda: quota["left"]
+        scheduler.increment_counters.side_effect = increment
+        email_sender.send_single_email = lambda email, defer_retry=True: True
+        throttle = DomainThrottle(
+            default_policy=DomainPolicy(per_minute=6000, burst=100, max_in_flight=10),
+            policies={},
+            enable_loggin=False,
+        )
+        emails = self.build(10)
+
+        results = list(
+            email_sender.send_batch(
+                emails, concurrency=2, scheduler=scheduler, throttle=throttle
+            )
+        )
+        # every input exactly once : three sent , the buffered rest handed back
+        assert sorted(e.email_id for e, _ in results) == sorted(e.email_id for e in emails)
+        assert sum(success for _, success in results) == 3
+        held = [e for e, success in results if not success]
+        assert len(held) == 7
+        assert all(e.status is EmailStatus.PENDING for e in held)
+
+    def test_worker_exception_is_reported_as_failure(self, email_sender):
+        def boom(email, defer_retry=True):
+            raise RuntimeError("worker died")
+
+        email_sender.send_single_email = boom
+        results = list(email_sender.send_batch(self.build(2), concurrency=2))
+        assert all(not success for _, success in results)
+        assert results[0][0].status == EmailStatus.FAILED
+
+    def test_invalid_concurrency(self, email_sender):
+        with pytest.raises(ValueError):
+            list(email_sender.send_batch(self.build(1), concurrency=0))
+
+    def test_domain_throttle_interleaves_and_caps(self, email_sender):
+        import threading
+        import time
+
+        from app.scheduler.domain_throttle import DomainPolicy, DomainThrottle
+
+        lock = threading.Lock()
+        active = {}
+        peak = {}
+        order = []
+
+        def fake_send(email, defer_retry=True):
+            domain = email.to.split("@")[1]
+            with lock:
+                order.append(domain)
+                active[domain] = active.get(domain, 0) + 1
+                peak[domain] = max(peak.get(domain, 0), active[domain])
+            time.sleep(0.01)
+            with lock:
+                active[domain] -= 1
+            return True
+
+        throttle = DomainThrottle(
+            default_policy=DomainPolicy(per_minute=60000, burst=100, max_in_flight=4),
+            policies={"slow.com": DomainPolicy(per_minute=60000, burst=100, max_in_flight=1)},
+            enable_loggin=False,
+        )
+        emails = [EMAIL(to=f"u{i}@slow.com", subject="s", body="b") for i in range(6)] + [
+            EMAIL(to=f"u{i}@fast.com", subject="s", body="b") for i in range(6)
+        ]
+        email_sender.send_single_email = fake_send
+
+        results = list(email_sender.send_batch(emails, concurrency=4, throttle=throttle))
+
+        assert len(results) == 12
+        assert peak["slow.com"] == 1
+        # fast.com is not stuck behind the six slow.com emails queued first
+        assert order.index("fast.com") == 1
+        assert throttle.in_flight("slow.com") == 0
+
+    def test_domain_throttle_waits_for_tokens(self, email_sender):
+        from app.scheduler.domain_throttle import DomainPolicy, DomainThrottle
+
+        throttle = DomainThrottle(
+            default_policy=DomainPolicy(per_minute=3000, burst=1, max_in_flight=4),
+            policies={},
+            enable_loggin=False,
+        )
+        email_sender.send_single_email = lambda email, defer_retry=True: True
+
+        results = list(email_sender.send_batch(self.build(3), concurrency=2, throttle=throttle))
+
+        assert len(results) == 3
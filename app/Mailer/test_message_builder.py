@@ -0,0 +1,114 @@
+import base64
+import email as email_lib
+import pytest
+
+from app.Mailer.attachment_cache import AttachmentCache
+from app.Mailer.message_builder import MessageBuilder
+from app.Mailer.sender import EMAIL
+
+SENDER = "me@example.com"
+
+
+@pytest.fixture
+def builder():
+    return MessageBuilder(AttachmentCache(enable_loggin=False))
+
+
+@pytest.fixture
+def campaign_email(tmp_path):
+    resume = tmp_path / "resume.pdf"
+    resume.write_bytes(b"%PDF fake resume")
+
+    def make(to, body="Hello,\nplease find my resume attached", subject="Application"):
+        return EMAIL(to=to, subject=subject, body=body, attachments=[str(resume)])
+
+    return make
+
+
+def parse(text):
+    return email_lib.message_from_string(text)
+
+
+class TestCampaignTemplate:
+    def test_rendered_message_is_valid_mime(self, builder, campaign_email):
+        message = parse(builder.build_string(SENDER, campaign_email("a@example.com")))
+        assert message["To"] == "a@example.com"
+        assert message["From"] == SENDER
+        assert message["Subject"] == "Application"
+        assert message.get_content_type() == "multipart/mixed"
+        parts = message.get_payload()
+        assert parts[0].get_content_type() == "multipart/alternative"
+        plain = parts[0].get_payload()[0].get_payload(decode=True).decode()
+        assert "please find my resume attached" in plain
+        assert base64.b64decode(parts[1].get_payload()) == b"%PDF fake resume"
+
+    def test_skeleton_is_built_once_per_campaign(self, builder, campaign_email):
+        first = builder.template_for(SENDER, campaign_email("a@example.com"))
+        second = builder.template_for(SENDER, campaign_email("b@example.com"))
+        assert first is second
+
+    def test_per_recipient_headers_differ(self, builder, campaign_email):
+        a = parse(builder.build_string(SENDER, campaign_email("a@example.com")))
+        b = parse(builder.build_string(SENDER, campaign_email("b@example.com")))
+        assert a["To"] == "a@example.com" and b["To"] == "b@example.com"
+        assert a["Message-ID"] != b["Message-ID"]
+        assert a["Message-ID"].endswith("@example.com>")
+
+    def test_personalised_body_is_patched(self, builder, campaign_email):
+        template = builder.template_for(SENDER, campaign_email("a@example.com"))
+        personal = campaign_email("b@example.com", body="Dear Bob")
+        message = parse(template.render(personal))
+        plain = message.get_payload()[0].get_payload()[0].get_payload(decode=True)
+        assert plain.decode() == "Dear Bob"
+        # attachment block is still the shared one
+        assert base64.b64decode(message.get_payload()[1].get_payload()) == b"%PDF fake resume"
+
+    def test_non_ascii_subject_is_encoded(self, builder):
+        text = builder.build_string(
+            SENDER, EMAIL(to="a@example.com", subject="Candidature été", body="b")
+        )
+        assert "=?utf-8?" in text
+        header = email_lib.header.decode_header(parse(text)["Subject"])[0]
+        assert header[0].decode(header[1]) == "Candidature été"
+
+    def test_template_cache_is_bounded(self, tmp_path):
+        builder = MessageBuilder(AttachmentCache(enable_loggin=False), max_templates=2)
+        for i in range(5):
+            builder.build_string(
+                SENDER, EMAIL(to="a@example.com", cc=f"c{i}@example.com", subject="s", body="b")
+            )
+        assert len(builder._templates) == 2
+
+    def test_personalised_messages_share_one_template(self, builder, campaign_email):
+        first = builder.template_for(SENDER, campaign_email("a@example.com", body="Dear Ann"))
+        second = builder.template_for(
+            SENDER, campaign_email("b@example.com", body="Dear Bob", subject="Hi Bob")
+        )
+        assert first is second
+        personal = campaign_email("b@example.com", subject="Hi Bob")
+        message = parse(builder.build_string(SENDER, personal))
+        assert message["Subject"] == "Hi Bob"
+
+    @pytest.mark.parametrize("subject", ["Hi\nBcc: victim@example.com", "Hi\r\nX-Evil: 1"])
+    def test_new_line_in_a_header_is_refused(self, builder, subject):
+        with pytest.raises(ValueError):
+            builder.build_string(SENDER, EMAIL(to="a@example.com", subject=subject, body="b"))
+
+    def test_long_headers_are_folded(self, builder):
+        recipients = [f"recipient{i}@example.com" for i in range(60)]
+        subject = "Candidature spontanée " * 40
+        text = builder.build_string(SENDER, EMAIL(to=recipients, subject=subject, body="b"))
+        head = text.split("\n\n", 1)[0].split("\n")
+        folded = [line for line in head if line.startswith(("To:", "Subject:", " "))]
+        assert len(folded) > 2
+        assert max(len(line) for line in folded) <= 78
+        message = parse(text)
+        assert [address.strip() for address in message["To"].split(",")] == recipients
+        decoded = email_lib.header.make_header(email_lib.header.decode_header(message["Subject"]))
+        assert str(decoded) == subject
+
+    def test_new_line_in_the_recipient_is_refused(self, builder):
+        with pytest.raises(ValueError):
+            builder.build_string(
+                SENDER, EMAIL(to="a@example.com\nBcc: victim@example.com", subject="s", body="b")
+            )
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+from queue import Queue
+
+from app.Mailer.outbound_queue import OutboundQueue
+from app.Mailer.sender import EMAIL, EmailPriority
+
+
+def make_email(name, priority=EmailPriority.NORMAL, scheduled_for=None):
+    return EMAIL(
+        to=f"{name}@gmail.com",
+        subject="s",
+        body="b",
+        email_id=name,
+        priority=priority,
+        scheduled_for=scheduled_for,
+    )
+
+
+class TestOrdering:
+    def test_is_a_queue(self):
+        assert isinstance(OutboundQueue(), Queue)
+
+    def test_urgent_jumps_a_normal_campaign(self):
+        queue = OutboundQueue()
+        queue.put_many(make_email(f"n{i}") for i in range(1000))
+        queue.put(make_email("boss", priority=EmailPriority.URGENT))
+        assert queue.get().email_id == "boss"
+
+    def test_priority_then_due_time(self):
+        now = datetime(2025, 1, 8, 10, 0)
+        queue = OutboundQueue()
+        queue.put(make_email("low", EmailPriority.LOW))
+        queue.put(make_email("high_late", EmailPriority.HIGH, (now + timedelta(hours=1)).isoformat()))
+        queue.put(make_email("high_early", EmailPriority.HIGH, now.isoformat()))
+        order = [queue.get().email_id for _ in range(3)]
+        assert order == ["high_early", "high_late", "low"]
+
+    def test_fifo_within_equal_keys(self):
+        queue = OutboundQueue()
+        queue.put_many(make_email(f"e{i}") for i in range(5))
+        assert [queue.get().email_id for _ in range(5)] == [f"e{i}" for i in range(5)]
+
+    def test_non_email_items_are_accepted(self):
+        queue = OutboundQueue()
+        queue.put_many(["a", "b"])
+        assert queue.qsize() == 2
+        assert queue.get() == "a"
+
+
+class TestDueTime:
+    def test_peek_next_due_skips_future_mail(self):
+        now = datetime(2025, 1, 8, 10, 0)
+        queue = OutboundQueue()
+        queue.put(make_email("urgent_tomorrow", EmailPriority.URGENT, (now + timedelta(days=1)).isoformat()))
+        queue.put(make_email("normal_now", EmailPriority.NORMAL, now.isoformat()))
+        assert queue.peek().email_id == "urgent_tomorrow"
+        assert queue.peek_next_due(now).email_id == "normal_now"
+
+    def test_get_next_due(self):
+        now = datetime(2025, 1, 8, 10, 0)
+        queue = OutboundQueue()
+        queue.put(make_email("later", scheduled_for=(now + timedelta(minutes=5)).isoformat()))
+        assert queue.get_next_due(now) is None
+        assert queue.get_next_due(now + timedelta(minutes=5)).email_id == "later"
+        assert queue.empty()
+
+    def test_snapshot_in_service_order(self):
+        queue = OutboundQueue()
+        queue.put(make_email("low", EmailPriority.LOW))
+        queue.put(make_email("urgent", EmailPriority.URGENT))
+        assert [e.email_id for e in queue.queue] == ["urgent", "low"]
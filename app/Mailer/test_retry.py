@@ -0,0 +1,76 @@
+import random
+import smtplib
+import time
+import pytest
+
+from app.Mailer.retry import (
+    ErrorKind,
+    RetryQueue,
+    classify_smtp_error,
+    compute_backoff,
+)
+
+
+class TestClassifySmtpError:
+    @pytest.mark.parametrize("code", [421, 450, 451, 452])
+    def test_transient_codes(self, code):
+        error = smtplib.SMTPResponseException(code, b"try later")
+        assert classify_smtp_error(error) is ErrorKind.TRANSIENT
+
+    @pytest.mark.parametrize("code", [550, 553, 554])
+    def test_permanent_codes(self, code):
+        error = smtplib.SMTPResponseException(code, b"no")
+        assert classify_smtp_error(error) is ErrorKind.PERMANENT
+
+    def test_authentication_is_permanent(self):
+        error = smtplib.SMTPAuthenticationError(535, b"bad credentials")
+        assert classify_smtp_error(error) is ErrorKind.PERMANENT
+
+    def test_disconnect_is_transient(self):
+        assert (
+            classify_smtp_error(smtplib.SMTPServerDisconnected("gone"))
+            is ErrorKind.TRANSIENT
+        )
+        assert classify_smtp_error(ConnectionResetError()) is ErrorKind.TRANSIENT
+
+    def test_recipients_refused_mixed(self):
+        error = smtplib.SMTPRecipientsRefused(
+            {"a@x.com": (550, b"no"), "b@x.com": (451, b"later")}
+        )
+        assert classify_smtp_error(error) is ErrorKind.TRANSIENT
+
+    def test_unknown_error_is_permanent(self):
+        assert classify_smtp_error(ValueError("bad")) is ErrorKind.PERMANENT
+
+
+class TestComputeBackoff:
+    def test_grows_exponentially_within_bounds(self):
+        rng = random.Random(7)
+        for attempt, window in [(1, 30), (2, 60), (3, 120)]:
+            delay = compute_backoff(attempt, base=30, cap=3600, rng=rng)
+            assert window / 2 <= delay <= window
+
+    def test_capped(self):
+        assert compute_backoff(20, base=30, cap=100) <= 100
+
+
+class TestRetryQueue:
+    def test_only_due_items_are_popped(self):
+        queue = RetryQueue()
+        queue.push("now", 0)
+        queue.push("later", 60)
+        assert queue.pop_due() == ["now"]
+        assert len(queue) == 1
+        assert 0 < queue.next_due_in() <= 60
+
+    def test_due_order(self):
+        queue = RetryQueue()
+        queue.push("second", 0.02)
+        queue.push("first", 0)
+        time.sleep(0.03)
+        assert queue.pop_due() == ["first", "second"]
+
+    def test_empty(self):
+        queue = RetryQueue()
+        assert queue.pop_due() == []
+        assert queue.next_due_in() is None
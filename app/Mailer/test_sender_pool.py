@@ -0,0 +1,183 @@
+import pytest
+
+import app.LocalDatabase.database as db_module
+from app.Mailer.sender import EMAIL, EmailStatus
+from app.Mailer.sender_pool import (
+    CONSISTENT_HASH,
+    SenderAccount,
+    SenderPool,
+    load_accounts_from_env,
+)
+from app.Mailer.smtp_sink import SMTPSink
+from app.scheduler.pacing import PacingDispatcher
+
+
+@pytest.fixture(autouse=True)
+def fresh_db_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(db_module, "DATABASE_PATH", str(tmp_path / "test.db"))
+
+
+@pytest.fixture
+def sink():
+    with SMTPSink(keep_messages=True, enable_loggin=False) as running:
+        yield running
+
+
+def make_accounts(sink, count, hourly=30):
+    options = {"host": sink.host, "port": sink.port, "smtp_ssl": False, "smtp_starttls": False}
+    return [
+        SenderAccount(
+            f"account{i}@example.com",
+            "secret",
+            max_email_an_hour=hourly,
+            smtp_options=options,
+        )
+        for i in range(count)
+    ]
+
+
+def make_emails(count):
+    return [EMAIL(to=f"user{i}@example.com", subject="hello", body="body") for i in range(count)]
+
+
+class TestSenderPool:
+    def test_least_loaded_spreads_the_volume(self, sink):
+        pool = SenderPool(make_accounts(sink, 3, hourly=4), enable_loggin=False)
+        try:
+            results = list(pool.send_batch(make_emails(15)))
+        finally:
+            pool.close()
+
+        # three accounts of four per hour , the rest is never dispatched
+        assert len(results) == 12
+        assert all(success for _, success in results)
+        assert [stats["sent"] for stats in pool.stats().values()] == [4, 4, 4]
+        assert pool.remaining_quota() == 0
+        senders = {message.mail_from for message in sink.messages}
+        assert senders == {"account0@example.com", "account1@example.com", "account2@example.com"}
+
+    def test_consistent_hash_is_sticky(self, sink):
+        pool = SenderPool(make_accounts(sink, 3), strategy=CONSISTENT_HASH, enable_loggin=False)
+        try:
+            first = [pool.route(email).name for email in make_emails(20)]
+            second = [pool.route(email).name for email in make_emails(20)]
+        finally:
+            pool.close()
+
+        assert first == second
+        # the ring actually spreads the recipients
+        assert len(set(first)) > 1
+
+    def test_consistent_hash_falls_over_when_quota_is_spent(self, sink):
+        pool = SenderPool(make_accounts(sink, 2, hourly=1), strategy=CONSISTENT_HASH, enable_loggin=False)
+        email = EMAIL(to="same@example.com", subject="hello", body="body")
+        try:
+            assert pool.send_single_email(email) is True
+            again = EMAIL(to="same@example.com", subject="hello", body="body")
+            assert pool.send_single_email(again) is True
+            third = EMAIL(to="same@example.com", subject="hello", body="body")
+            assert pool.send_single_email(third) is False
+        finally:
+            pool.close()
+
+        assert sorted(message.mail_from for message in sink.messages) == [
+            "account0@example.com",
+            "account1@example.com",
+        ]
+        assert third.status == EmailStatus.PENDING
+
+    def test_transient_failure_is_parked_not_failed(self, sink):
+        pool = SenderPool(make_accounts(sink, 1), enable_loggin=False)
+        shard = pool.shards[0]
+        send = shard.sender.send_single_email
+
+        def deferred(email):
+            email.status = EmailStatus.RETRYING
+            shard.sender.retry_queue.push(email, 0)
+            return False
+
+        email = EMAIL(to="later@example.com", subject="hello", body="body")
+        try:
+            shard.sender.send_single_email = deferred
+            assert pool.send_single_email(email) is False
+            assert pool.stats()[shard.name]["failed"] == 0
+            assert shard.in_flight == 0
+
+            shard.sender.send_single_email = send
+            assert list(pool.drain_retries()) == [(email, True)]
+        finally:
+            pool.close()
+
+        assert pool.stats()[shard.name]["sent"] == 1
+        assert [message.mail_from for message in sink.messages] == ["account0@example.com"]
+
+    def test_paced_sends_interleave_the_accounts(self, sink):
+        now = [0.0]
+        naps = []
+
+        def sleep(seconds):
+            naps.append(seconds)
+            now[0] += seconds
+
+        dispatcher = PacingDispatcher(
+            interval=lambda lane: 10, clock=lambda: now[0], sleep=sleep, enable_loggin=False
+        )
+        pool = SenderPool(make_accounts(sink, 2), enable_loggin=False)
+        try:
+            results = list(pool.send_paced(make_emails(4), dispatcher=dispatcher))
+        finally:
+            pool.close()
+
+        assert len(results) == 4 and all(success for _, success in results)
+        # both accounts send , then one 10s pause covers both of them
+        assert naps == [10]
+        assert [stats["sent"] for stats in pool.stats().values()] == [2, 2]
+
+    def test_account_quota_survives_a_restart(self, sink):
+        accounts = make_accounts(sink, 2, hourly=2)
+        pool = SenderPool(accounts, enable_loggin=False)
+        try:
+            assert len(list(pool.send_batch(make_emails(4)))) == 4
+        finally:
+            pool.close()
+
+        restarted = SenderPool(accounts, enable_loggin=False)
+        try:
+            assert restarted.remaining_quota() == 0
+        finally:
+            restarted.close()
+
+        fresh = SenderPool(accounts, enable_loggin=False, persist_state=False)
+        try:
+            assert fresh.remaining_quota() == 4
+        finally:
+            fresh.close()
+
+    def test_invalid_configuration(self, sink):
+        with pytest.raises(ValueError):
+            SenderPool([], enable_loggin=False)
+        with pytest.raises(ValueError):
+            SenderPool(make_accounts(sink, 1), strategy="random", enable_loggin=False)
+
+
+class TestLoadAccountsFromEnv:
+    def test_numbered_accounts(self, monkeypatch):
+        monkeypatch.setenv("EMAIL", "first@gmail.com")
+        monkeypatch.setenv("GMAIL_APP_PASSWORD", "one")
+        monkeypatch.setenv("EMAIL_1", "second@gmail.com")
+        monkeypatch.setenv("GMAIL_APP_PASSWORD_1", "two")
+        monkeypatch.delenv("EMAIL_2", raising=False)
+
+        accounts = load_accounts_from_env(max_email_an_hour=10)
+
+        assert [account.email_user for account in accounts] == ["first@gmail.com", "second@gmail.com"]
+        assert accounts[1].email_app_password == "two"
+        assert accounts[0].max_email_an_hour == 10
+
+    def test_account_without_password_stops_the_scan(self, monkeypatch):
+        monkeypatch.setenv("EMAIL", "first@gmail.com")
+        monkeypatch.setenv("GMAIL_APP_PASSWORD", "one")
+        monkeypatch.setenv("EMAIL_1", "second@gmail.com")
+        monkeypatch.delenv("GMAIL_APP_PASSWORD_1", raising=False)
+
+        assert len(load_accounts_from_env()) == 1
@@ -0,0 +1,154 @@
+import asyncio
+import smtplib
+import pytest
+
+from app.Mailer.async_sender import AsyncEmailSender
+from app.Mailer.benchmark import benchmark_email_objects, make_sender, percentile, run_benchmark
+from app.Mailer.sender import EMAIL, EmailStatus
+from app.Mailer.smtp_sink import SMTPSink
+
+
+@pytest.fixture
+def sink():
+    with SMTPSink(keep_messages=True, seed=7, enable_loggin=False) as running:
+        yield running
+
+
+class TestSMTPSink:
+    def test_accepts_a_message(self, sink):
+        with smtplib.SMTP(sink.host, sink.port) as client:
+            client.login("me@example.com", "secret")
+            refused = client.sendmail(
+                "me@example.com",
+                ["a@example.com", "b@example.com"],
+                "Subject: hi\r\n\r\n.leading dot\r\n",
+            )
+        assert refused == {}
+        assert sink.stats.messages == 1
+        assert sink.stats.recipients == 2
+        received = sink.messages[0]
+        assert received.mail_from == "me@example.com"
+        assert received.recipients == ["a@example.com", "b@example.com"]
+        # dot stuffing is undone on receive
+        assert b"\r\n.leading dot" in received.data
+
+    def test_transient_rcpt_errors(self):
+        with SMTPSink(transient_rate=1.0, enable_loggin=False) as sink:
+            with smtplib.SMTP(sink.host, sink.port) as client:
+                with pytest.raises(smtplib.SMTPRecipientsRefused) as error:
+                    client.sendmail("me@example.com", ["a@example.com"], "body")
+        assert error.value.recipients["a@example.com"][0] == 451
+        assert sink.stats.transient_errors == 1
+        assert sink.stats.messages == 0
+
+    def test_permanent_data_errors(self):
+        with SMTPSink(permanent_rate=1.0, error_stage="data", enable_loggin=False) as sink:
+            with smtplib.SMTP(sink.host, sink.port) as client:
+                with pytest.raises(smtplib.SMTPDataError) as error:
+                    client.sendmail("me@example.com", ["a@example.com"], "body")
+        assert error.value.smtp_code == 550
+        assert sink.stats.permanent_errors == 1
+
+    def test_error_rates_are_validated(self):
+        with pytest.raises(ValueError):
+            SMTPSink(transient_rate=0.7, permanent_rate=0.7)
+        with pytest.raises(ValueError):
+            SMTPSink(error_stage="mail")
+
+    def test_stop_is_idempotent(self):
+        sink = SMTPSink(enable_loggin=False).start()
+        assert sink.port != 0
+        sink.stop()
+        sink.stop()
+
+
+class TestSendersAgainstSink:
+    def test_email_sender_end_to_end(self, sink):
+        sender = make_sender(sink, concurrency=2)
+        email = EMAIL(to="friend@example.com", subject="hello", body="body text", cc="boss@example.com")
+        try:
+            assert sender.send_single_email(email) is True
+        finally:
+            sender.close()
+        assert email.status == EmailStatus.SUCCESS
+        received = sink.messages[0]
+        assert received.recipients == ["friend@example.com", "boss@example.com"]
+        assert b"Subject: hello" in received.data
+
+    def test_email_sender_transient_failure_is_retried(self):
+        with SMTPSink(transient_rate=1.0, enable_loggin=False) as sink:
+            sender = make_sender(sink, concurrency=1)
+            email = EMAIL(to="friend@example.com", subject="hello", body="body text")
+            try:
+                assert sender.send_single_email(email) is False
+            finally:
+                sender.close()
+        assert email.status == EmailStatus.RETRYING
+        assert len(sender.retry_queue) == 1
+
+    def test_grouped_send_uses_one_transaction(self, sink):
+        sender = make_sender(sink, concurrency=1)
+        emails = [
+            EMAIL(to=f"user{i}@example.com", subject="hello", body="body text") for i in range(6)
+        ]
+        try:
+            results = list(sender.send_grouped(emails, max_recipients=3))
+        finally:
+            sender.close()
+        assert all(success for _, success in results)
+        assert sink.stats.messages == 2
+        assert sink.stats.recipients == 6
+
+    def test_async_sender_end_to_end(self, sink):
+        emails = [
+            EMAIL(to=f"user{i}@example.com", subject="hello", body="body text") for i in range(5)
+        ]
+
+        async def scenario():
+            sender = AsyncEmailSender(
+                email_user="me@example.com",
+                email_app_password="secret",
+                host=sink.host,
+                port=sink.port,
+                use_tls=False,
+                max_connections=2,
+                enable_loggin=False,
+            )
+            try:
+                return [result async for result in sender.send_batch(emails, concurrency=5)]
+            finally:
+                await sender.close()
+
+        results = asyncio.run(scenario())
+        assert len(results) == 5
+        assert sink.stats.messages == 5
+
+
+class TestBenchmark:
+    def test_run_benchmark_reports_every_message(self):
+        with SMTPSink(permanent_rate=0.1, seed=3, enable_loggin=False) as sink:
+            result = run_benchmark(sink, 50, concurrency=2, body_size=256, trace_memory=False)
+        assert result.sent + result.failed == 50
+        assert result.sent == sink.stats.messages
+        assert result.failed == sink.stats.permanent_errors
+        assert result.per_second > 0
+        assert result.p99_ms >= result.p50_ms
+        assert result.peak_memory_mb is None
+
+    def test_memory_pass(self, sink):
+        result = run_benchmark(sink, 20, concurrency=2, body_size=256)
+        assert result.sent == 20
+        assert result.peak_memory_mb > 0
+
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        assert percentile(samples, 50) == 50
+        assert percentile(samples, 99) == 99
+        assert percentile([], 99) == 0.0
+
+    def test_email_object_benchmark(self):
+        report = benchmark_email_objects(200, body_size=512)
+        assert report["objects"] == 200
+        # every object holds its own body , the slotted object adds little on top
+        assert 512 < report["bytes_per_object"] < 512 + 512
+        assert report["to_dict_per_second"] > 0
@@ -0,0 +1,91 @@
+import pytest
+from jinja2 import UndefinedError
+
+from app.Mailer.sender import EMAIL
+from app.Mailer.template_engine import EmailTemplateEngine, TemplateNotFoundError
+from app.supabase.supabaseClient import EmailRecord
+
+
+@pytest.fixture
+def engine():
+    engine = EmailTemplateEngine(enable_loggin=False)
+    engine.register(
+        "application",
+        subject="Application - {{ category }}",
+        body="Hello {{ first_name }},\nI am applying for a {{ category }} role.",
+        language="en",
+    )
+    engine.register(
+        "application",
+        subject="Candidature - {{ category }}",
+        body="Bonjour {{ first_name }},\nje postule pour un poste {{ category }}.",
+        language="fr",
+    )
+    return engine
+
+
+def record(name="Jane Doe", language="en", category="tech", email="jane@example.com"):
+    return EmailRecord(email=email, full_name=name, language=language, category=category)
+
+
+class TestRendering:
+    def test_render_uses_record_fields(self, engine):
+        subject, body = engine.render("application", record())
+        assert subject == "Application - tech"
+        assert body.startswith("Hello Jane,")
+
+    def test_language_variant(self, engine):
+        subject, body = engine.render("application", record(language="FR"))
+        assert subject == "Candidature - tech"
+        assert body.startswith("Bonjour Jane,")
+
+    def test_unknown_language_falls_back_to_default(self, engine):
+        subject, _ = engine.render("application", record(language="de"))
+        assert subject == "Application - tech"
+
+    def test_unknown_template(self, engine):
+        with pytest.raises(TemplateNotFoundError):
+            engine.render("missing", record())
+
+    def test_missing_variable_is_an_error(self, engine):
+        engine.register("broken", subject="hi", body="{{ nickname }}")
+        with pytest.raises(UndefinedError):
+            engine.render("broken", record())
+
+    def test_extra_context(self, engine):
+        engine.register("signed", subject="hi", body="-- {{ signature }}")
+        _, body = engine.render("signed", record(), signature="Bachir")
+        assert body == "-- Bachir"
+
+
+class TestCompiledCache:
+    def test_templates_compile_once(self, engine):
+        before = engine.compilations
+        records = [record(email=f"u{i}@example.com") for i in range(500)]
+        rendered = list(engine.render_many("application", records))
+        assert len(rendered) == 500
+        assert engine.compilations == before
+
+    def test_same_source_shares_compiled_template(self, engine):
+        assert engine.compile("{{ a }}") is engine.compile("{{ a }}")
+
+    def test_cache_is_bounded(self):
+        engine = EmailTemplateEngine(cache_size=3, enable_loggin=False)
+        for i in range(10):
+            engine.compile(f"template {i}")
+        assert len(engine._compiled) == 3
+
+
+class TestBuildEmails:
+    def test_builds_email_objects(self, engine):
+        emails = list(
+            engine.build_emails(
+                "application",
+                [record(), record(name="Ali", language="fr", email="ali@example.com")],
+                attachments=["resume.pdf"],
+            )
+        )
+        assert all(isinstance(e, EMAIL) for e in emails)
+        assert emails[1].to == "ali@example.com"
+        assert emails[1].subject == "Candidature - tech"
+        assert emails[1].attachments == ["resume.pdf"]
@@ -0,0 +1,94 @@
+import email
+import pytest
+
+from app.Mailer.sender import EMAIL, EmailSender, EmailStatus
+from app.Mailer.transport import (
+    MAILDIR,
+    NULL,
+    SINK,
+    FileTransport,
+    NullTransport,
+    SinkTransport,
+    Transport,
+    create_transport,
+)
+
+
+def make_sender(transport, **kwargs):
+    return EmailSender("me@example.com", "secret", enable_loggin=False, transport=transport, **kwargs)
+
+
+def sample(to="you@example.com", **kwargs):
+    return EMAIL(to=to, subject="hello", body="body", **kwargs)
+
+
+class TestTransports:
+    def test_sendmail_is_abstract(self):
+        class Incomplete(Transport):
+            name = "incomplete"
+
+        with pytest.raises(TypeError):
+            Transport()
+        with pytest.raises(TypeError):
+            Incomplete()
+
+    def test_null_transport_counts_and_drops(self):
+        sender = make_sender(NULL)
+        assert sender.send_single_email(sample())
+        assert sender.pool is None
+        assert sender.transport.stats()["messages"] == 1
+        assert not sender.transport.delivers
+
+    def test_eml_files_keep_the_envelope(self, tmp_path):
+        sender = make_sender(FileTransport(tmp_path, enable_loggin=False))
+        assert sender.send_single_email(sample(bcc="hidden@example.com"))
+
+        [path] = list(tmp_path.glob("*.eml"))
+        message = email.message_from_bytes(path.read_bytes())
+        assert message["X-Envelope-From"] == "me@example.com"
+        assert "hidden@example.com" in message["X-Envelope-To"]
+        assert message["Bcc"] is None
+        assert message["Subject"] == "hello"
+
+    def test_maildir_layout(self, tmp_path):
+        sender = make_sender(MAILDIR, spool_dir=str(tmp_path))
+        results = sender.send_group([sample(f"user{i}@example.com") for i in range(3)])
+
+        assert results == [True, True, True]
+        # one grouped transaction , one message in new/ and nothing left in tmp/
+        assert len(list((tmp_path / "new").iterdir())) == 1
+        assert not list((tmp_path / "tmp").iterdir())
+
+    def test_sink_transport_owns_its_server(self):
+        sender = make_sender(SINK)
+        try:
+            assert isinstance(sender.transport, SinkTransport)
+            emails = [sample(f"user{i}@example.com") for i in range(5)]
+            results = list(sender.send_batch(emails, concurrency=2))
+            assert all(success for _, success in results)
+            assert sender.transport.sink.stats.messages == 5
+        finally:
+            sender.close()
+        assert sender.transport.sink._thread is None
+
+    def test_transport_from_the_environment(self, monkeypatch, tmp_path):
+        monkeypatch.setenv("MAIL_TRANSPORT", "maildir")
+        monkeypatch.setenv("MAIL_SPOOL_DIR", str(tmp_path))
+        sender = make_sender(None)
+        assert sender.transport.name == MAILDIR
+        assert (tmp_path / "new").is_dir()
+
+    def test_unknown_transport(self):
+        with pytest.raises(ValueError, match="unknown transport"):
+            create_transport("carrier-pigeon")
+
+    def test_file_write_failure_is_a_failed_send(self, tmp_path):
+        transport = FileTransport(tmp_path / "spool", enable_loggin=False)
+        sender = make_sender(transport)
+        (tmp_path / "spool").rmdir()
+        email_obj = sample()
+        assert not sender.send_single_email(email_obj, defer_retry=False)
+        assert email_obj.status in (EmailStatus.FAILED, EmailStatus.RETRYING)
+
+    def test_null_transport_default_user(self):
+        assert NullTransport().user == "dry-run@localhost"
@@ -0,0 +1,248 @@
+from __future__ import annotations
+import logging
+import os
+from abc import ABC, abstractmethod
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import yagmail
+
+from app.Mailer.connection_pool import SMTPConnectionPool
+from app.Mailer.smtp_sink import SMTPSink
+
+"""
+where a finished message goes : the real smtp server , nowhere (null) , a
+directory of .eml files / a maildir , or the in process smtp sink , the sender
+only ever calls transport.sendmail() so each can be swapped by config
+"""
+
+SMTP = "smtp"
+NULL = "null"
+FILE = "file"
+MAILDIR = "maildir"
+SINK = "sink"
+TRANSPORTS = (SMTP, NULL, FILE, MAILDIR, SINK)
+
+# refused recipients as returned by smtplib : address -> (code , reply)
+Refused = Dict[str, Tuple[int, bytes]]
+
+
+class Transport(ABC):
+    name = "base"
+    # False : nothing reaches a mailbox , safe for dry runs
+    delivers = False
+    # how many sends can usefully run at the same time
+    max_sessions = 1024
+
+    def __init__(self, user: Optional[str] = None, enable_loggin: bool = True) -> None:
+        self.user = user
+        self.logger = logging.getLogger(__name__)
+        if not enable_loggin:
+            self.logger.setLevel(logging.CRITICAL + 1)
+        self._lock = threading.Lock()
+        self.messages = 0
+        self.bytes = 0
+
+    def _record(self, message: str) -> None:
+        with self._lock:
+            self.messages += 1
+            self.bytes += len(message)
+
+    @abstractmethod
+    def sendmail(self, from_address: str, recipients: List[str], message: str) -> Refused:
+        # every transport returns the refused recipients , {} when all were accepted
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        return {"transport": self.name, "messages": self.messages, "bytes": self.bytes}
+
+    def close(self) -> None:
+        pass
+
+
+class SMTPTransport(Transport):
+    name = SMTP
+    delivers = True
+
+    def __init__(
+        self,
+        user: Optional[str],
+        password: Optional[str],
+        smtp_options: Optional[Dict[str, Any]] = None,
+        min_sessions: int = 1,
+        max_sessions: int = 4,
+        idle_timeout: float = 300.0,
+        enable_loggin: bool = True,
+    ) -> None:
+        super().__init__(user, enable_loggin)
+        # extra yagmail.SMTP kwargs (host , port , smtp_ssl ...)
+        self.smtp_options = dict(smtp_options or {})
+        # sessions are pooled and reused between sends
+        self.pool = SMTPConnectionPool(
+            factory=lambda: yagmail.SMTP(user, password, **self.smtp_options),
+            min_sessions=min_sessions,
+            max_sessions=max_sessions,
+            idle_timeout=idle_timeout,
+            enable_loggin=enable_loggin,
+        )
+        self.max_sessions = max_sessions
+        if self.user is None and self.pool.primary is not None:
+            self.user = self.pool.primary.user
+
+    def sendmail(self, from_address: str, recipients: List[str], message: str) -> Refused:
+        # yagmail.send() logs in again on every call , the message is pushed on
+        # the open connection of a pooled session instead
+        with self.pool.connection() as session:
+            refused = session.smtp.sendmail(from_address, recipients, message)
+        self._record(message)
+        return refused
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), **self.pool.stats()}
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+class NullTransport(Transport):
+    # accepts everything and throws it away , profiles the pipeline without the wire
+    name = NULL
+
+    def __init__(self, user: Optional[str] = None, enable_loggin: bool = True) -> None:
+        super().__init__(user or "dry-run@localhost", enable_loggin)
+
+    def sendmail(self, from_address: str, recipients: List[str], message: str) -> Refused:
+        self._record(message)
+        return {}
+
+
+class FileTransport(Transport):
+    """
+    writes every message to disk instead of sending it
+
+    layout "eml"     : one <directory>/<time>-<id>.eml per message
+    layout "maildir" : written in tmp/ then renamed into new/ , readable by any
+                       mail client pointed at the directory
+    the envelope (bcc recipients included) is kept in X-Envelope-* headers
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        layout: str = FILE,
+        user: Optional[str] = None,
+        enable_loggin: bool = True,
+    ) -> None:
+        if layout not in (FILE, MAILDIR):
+            raise ValueError(f"layout must be '{FILE}' or '{MAILDIR}' got {layout}\n")
+        super().__init__(user or "spool@localhost", enable_loggin)
+        self.name = layout
+        self.directory = Path(directory)
+        if layout == MAILDIR:
+            for sub in ("tmp", "new", "cur"):
+                (self.directory / sub).mkdir(parents=True, exist_ok=True)
+        else:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self._host = socket.gethostname().replace("/", "_").replace(":", "_")
+
+    def _unique_name(self) -> str:
+        return f"{time.time():.6f}.{os.getpid()}_{uuid.uuid4().hex}.{self._host}"
+
+    def sendmail(self, from_address: str, recipients: List[str], message: str) -> Refused:
+        envelope = (
+            f"X-Envelope-From: {from_address}\r\n"
+            f"X-Envelope-To: {', '.join(recipients)}\r\n"
+        )
+        data = (envelope + message).encode("utf-8")
+        name = self._unique_name()
+        if self.name == MAILDIR:
+            # rename is atomic , a reader never sees half a message in new/
+            temporary = self.directory / "tmp" / name
+            temporary.write_bytes(data)
+            temporary.replace(self.directory / "new" / name)
+        else:
+            (self.directory / f"{name}.eml").write_bytes(data)
+        self._record(message)
+        return {}
+
+
+class SinkTransport(SMTPTransport):
+    # real smtp code path against an in process SMTPSink started for the run
+    name = SINK
+    delivers = False
+
+    def __init__(
+        self,
+        user: Optional[str] = None,
+        sink: Optional[SMTPSink] = None,
+        min_sessions: int = 1,
+        max_sessions: int = 4,
+        enable_loggin: bool = True,
+    ) -> None:
+        self._owns_sink = sink is None
+        self.sink = sink or SMTPSink(enable_loggin=enable_loggin).start()
+        try:
+            super().__init__(
+                user or "sink@localhost",
+                "sink",
+                smtp_options={
+                    "host": self.sink.host,
+                    "port": self.sink.port,
+                    "smtp_ssl": False,
+                    "smtp_starttls": False,
+                },
+                min_sessions=min_sessions,
+                max_sessions=max_sessions,
+                enable_loggin=enable_loggin,
+            )
+        except Exception:
+            if self._owns_sink:
+                self.sink.stop()
+            raise
+
+    def close(self) -> None:
+        super().close()
+        if self._owns_sink:
+            self.sink.stop()
+
+
+def create_transport(
+    kind: str,
+    user: Optional[str] = None,
+    password: Optional[str] = None,
+    smtp_options: Optional[Dict[str, Any]] = None,
+    min_sessions: int = 1,
+    max_sessions: int = 4,
+    idle_timeout: float = 300.0,
+    spool_dir: Union[str, Path, None] = None,
+    enable_loggin: bool = True,
+) -> Transport:
+    kind = kind.strip().lower()
+    if kind == SMTP:
+        return SMTPTransport(
+            user,
+            password,
+            smtp_options=smtp_options,
+            min_sessions=min_sessions,
+            max_sessions=max_sessions,
+            idle_timeout=idle_timeout,
+            enable_loggin=enable_loggin,
+        )
+    if kind == NULL:
+        return NullTransport(user, enable_loggin=enable_loggin)
+    if kind in (FILE, MAILDIR):
+        return FileTransport(
+            spool_dir or "outbox_spool", layout=kind, user=user, enable_loggin=enable_loggin
+        )
+    if kind == SINK:
+        return SinkTransport(
+            user,
+            min_sessions=min_sessions,
+            max_sessions=max_sessions,
+            enable_loggin=enable_loggin,
+        )
+    raise ValueError(f"unknown transport {kind!r} , expected one of {', '.join(TRANSPORTS)}\n")
@@ -0,0 +1,195 @@
+from __future__ import annotations
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Deque, Dict, Iterable, List, Optional
+
+from app.scheduler.rate_limiter import Clock, TokenBucket
+from utils.normalize_recipients import normalize_recipients
+
+if TYPE_CHECKING:
+    from app.Mailer.sender import EMAIL
+
+"""
+per recipient domain throttling , layered under the global hourly / daily limits
+of EmailScheduler : every receiving provider gets its own token bucket and its
+own cap on concurrent deliveries
+"""
+
+
+@dataclass(frozen=True)
+class DomainPolicy:
+    per_minute: float = 20.0
+    burst: int = 5
+    max_in_flight: int = 2
+
+
+# conservative defaults for the big providers , anything else uses the default policy
+DEFAULT_POLICIES: Dict[str, DomainPolicy] = {
+    "gmail.com": DomainPolicy(per_minute=30, burst=10, max_in_flight=4),
+    "googlemail.com": DomainPolicy(per_minute=30, burst=10, max_in_flight=4),
+    "outlook.com": DomainPolicy(per_minute=20, burst=5, max_in_flight=2),
+    "hotmail.com": DomainPolicy(per_minute=20, burst=5, max_in_flight=2),
+    "yahoo.com": DomainPolicy(per_minute=20, burst=5, max_in_flight=2),
+}
+
+
+def _domain(address: str) -> str:
+    return address.rpartition("@")[2].strip().lower()
+
+
+def domain_of(email: EMAIL) -> str:
+    # first visible recipient , the lane an email waits in
+    recipients = normalize_recipients(email.to)
+    if not recipients:
+        return ""
+    return _domain(recipients[0])
+
+
+def domains_of(email: EMAIL) -> List[str]:
+    """
+    every distinct domain the email goes to (to , cc and bcc) , a multi
+    recipient email takes a slot on each of them , lane domain first
+    """
+    domains = [domain_of(email)]
+    for address in (
+        normalize_recipients(email.to)
+        + normalize_recipients(email.cc)
+        + normalize_recipients(email.bcc)
+    ):
+        domain = _domain(address)
+        if domain not in domains:
+            domains.append(domain)
+    return domains
+
+
+class DomainThrottle:
+    def __init__(
+        self,
+        default_policy: Optional[DomainPolicy] = None,
+        policies: Optional[Dict[str, DomainPolicy]] = None,
+        clock: Clock = time.monotonic,
+        enable_loggin: bool = True,
+    ) -> None:
+        self.default_policy = default_policy or DomainPolicy()
+        self.policies = dict(DEFAULT_POLICIES if policies is None else policies)
+        self.clock = clock
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        if not enable_loggin:
+            self.logger.setLevel(logging.CRITICAL + 1)
+
+    def policy_for(self, domain: str) -> DomainPolicy:
+        return self.policies.get(domain, self.default_policy)
+
+    def _bucket(self, domain: str) -> TokenBucket:
+        bucket = self._buckets.get(domain)
+        if bucket is None:
+            policy = self.policy_for(domain)
+            bucket = self._buckets[domain] = TokenBucket(
+                rate=policy.per_minute / 60.0, capacity=policy.burst, clock=self.clock
+            )
+        return bucket
+
+    def _blocked(self, domain: str) -> bool:
+        # caller holds the lock
+        return self._in_flight.get(domain, 0) >= self.policy_for(domain).max_in_flight
+
+    def try_acquire(self, *domains: str) -> bool:
+        # one delivery slot on every domain : free in flight slots and a token
+        # on each of them , or nothing is taken
+        with self._lock:
+            if any(self._blocked(domain) for domain in domains):
+                return False
+            if any(self._bucket(domain).tokens < 1 for domain in domains):
+                return False
+            for domain in domains:
+                self._bucket(domain).try_acquire()
+                self._in_flight[domain] = self._in_flight.get(domain, 0) + 1
+            return True
+
+    def release(self, *domains: str) -> None:
+        with self._lock:
+            for domain in domains:
+                count = self._in_flight.get(domain, 0) - 1
+                if count > 0:
+                    self._in_flight[domain] = count
+                else:
+                    self._in_flight.pop(domain, None)
+
+    def in_flight(self, domain: str) -> int:
+        return self._in_flight.get(domain, 0)
+
+    def time_until_ready(self, *domains: str) -> Optional[float]:
+        """
+        seconds until every bucket has a token , None when a domain is only
+        blocked by its in flight cap (a completion will free it , not time)
+        """
+        with self._lock:
+            if any(self._blocked(domain) for domain in domains):
+                return None
+            return max(self._bucket(domain).time_until_available() for domain in domains)
+
+
+class DomainDispatcher:
+    """
+    round robin over recipient domains : each call hands out the next email
+    whose domain has a free slot , so a throttled provider only holds back its
+    own mail while every other domain keeps flowing
+    """
+
+    def __init__(self, throttle: DomainThrottle) -> None:
+        self.throttle = throttle
+        # domain -> its waiting emails , insertion order is the rotation order
+        self._lanes: "OrderedDict[str, Deque[EMAIL]]" = OrderedDict()
+        self._size = 0
+
+    def add(self, email: EMAIL) -> None:
+        domain = domain_of(email)
+        lane = self._lanes.get(domain)
+        if lane is None:
+            lane = self._lanes[domain] = deque()
+        lane.append(email)
+        self._size += 1
+
+    def extend(self, emails: Iterable[EMAIL]) -> None:
+        for email in emails:
+            self.add(email)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def drain(self) -> List[EMAIL]:
+        # every waiting email , lane by lane , the dispatcher is empty afterwards
+        waiting = [email for lane in self._lanes.values() for email in lane]
+        self._lanes.clear()
+        self._size = 0
+        return waiting
+
+    def next_ready(self) -> Optional[EMAIL]:
+        for _ in range(len(self._lanes)):
+            domain, lane = next(iter(self._lanes.items()))
+            # rotate : this domain goes to the back whatever happens
+            self._lanes.move_to_end(domain)
+            if self.throttle.try_acquire(*domains_of(lane[0])):
+                email = lane.popleft()
+                self._size -= 1
+                if not lane:
+                    del self._lanes[domain]
+                return email
+        return None
+
+    def next_ready_in(self) -> Optional[float]:
+        # shortest wait over the waiting domains , None if only completions can help
+        waits = [
+            wait
+            for wait in (
+                self.throttle.time_until_ready(*domains_of(lane[0])) for lane in self._lanes.values()
+            )
+            if wait is not None
+        ]
+        return min(waits) if waits else None
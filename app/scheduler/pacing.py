@@ -0,0 +1,162 @@
+from __future__ import annotations
+import heapq
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Generic, Hashable, Iterator, List, Optional, Tuple, TypeVar
+
+from app.scheduler.rate_limiter import Clock
+
+"""
+human like pacing without a sleeping worker : every lane (an account , a
+domain ...) carries a "not before" timestamp and the lanes are kept in a min
+heap on it , the dispatcher hands out whichever lane is due first and only
+sleeps once , exactly until the earliest lane is due , so a lane that has to
+wait never holds back the others
+"""
+
+T = TypeVar("T")
+
+# lane -> seconds to wait after a send on that lane
+Interval = Callable[[Hashable], float]
+
+
+def random_interval(min_seconds: int = 15, max_seconds: int = 90) -> Interval:
+    # same range as EmailScheduler.random_email_interval_between_delivery
+    return lambda lane: random.randint(min_seconds, max_seconds)
+
+
+class PacingDispatcher(Generic[T]):
+    def __init__(
+        self,
+        interval: Optional[Interval] = None,
+        clock: Clock = time.monotonic,
+        sleep: Optional[Callable[[float], None]] = None,
+        enable_loggin: bool = True,
+    ) -> None:
+        self.interval = interval or random_interval()
+        self.clock = clock
+        # None : wait on an event , add() wakes a dispatcher that sleeps for a
+        # lane further away than the one just added
+        self._sleep = sleep
+        self._wakeup = threading.Event()
+        self.logger = logging.getLogger(__name__)
+        if not enable_loggin:
+            self.logger.setLevel(logging.CRITICAL + 1)
+
+        self._lanes: Dict[Hashable, Deque[T]] = {}
+        self._not_before: Dict[Hashable, float] = {}
+        # (not before , sequence , lane) , stale entries are skipped on pop
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._live: Dict[Hashable, int] = {}
+        self._sequence = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    # ============================================================================
+    # LANES
+    # ============================================================================
+    def _schedule(self, lane: Hashable) -> None:
+        # caller holds the lock , one live heap entry per lane with waiting items
+        self._sequence += 1
+        self._live[lane] = self._sequence
+        heapq.heappush(self._heap, (self._not_before.get(lane, 0.0), self._sequence, lane))
+
+    def add(self, lane: Hashable, item: T) -> None:
+        with self._lock:
+            waiting = self._lanes.get(lane)
+            if waiting is None:
+                waiting = self._lanes[lane] = deque()
+            waiting.append(item)
+            self._size += 1
+            if lane not in self._live:
+                self._schedule(lane)
+        self._wakeup.set()
+
+    def defer(self, lane: Hashable, seconds: float) -> None:
+        # push a lane back (rate limit hit , 4xx from the provider ...)
+        with self._lock:
+            self._not_before[lane] = max(self._not_before.get(lane, 0.0), self.clock() + seconds)
+            if lane in self._live:
+                self._schedule(lane)
+
+    def not_before(self, lane: Hashable) -> float:
+        return self._not_before.get(lane, 0.0)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _peek(self) -> Optional[Tuple[float, Hashable]]:
+        # caller holds the lock
+        while self._heap:
+            due, sequence, lane = self._heap[0]
+            if self._live.get(lane) == sequence:
+                return due, lane
+            heapq.heappop(self._heap)
+        return None
+
+    # ============================================================================
+    # DISPATCH
+    # ============================================================================
+    def next_ready_in(self) -> Optional[float]:
+        # seconds until the earliest lane is due , None when nothing is waiting
+        with self._lock:
+            head = self._peek()
+        return None if head is None else max(0.0, head[0] - self.clock())
+
+    def next_ready(self) -> Optional[Tuple[Hashable, T]]:
+        """(lane , item) of the earliest lane if it is due , never blocks"""
+        with self._lock:
+            head = self._peek()
+            now = self.clock()
+            if head is None or head[0] > now:
+                return None
+            _, lane = head
+            heapq.heappop(self._heap)
+            del self._live[lane]
+            waiting = self._lanes[lane]
+            item = waiting.popleft()
+            self._size -= 1
+            pause = self.interval(lane)
+            self._not_before[lane] = now + pause
+            if waiting:
+                self._schedule(lane)
+            else:
+                del self._lanes[lane]
+        self.logger.info(f"pacing : {lane} dispatched , next send on it in {pause:.0f}s\n")
+        return lane, item
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Tuple[Hashable, T]]:
+        """
+        blocking next_ready() : one sleep per decision , until the earliest
+        lane is due , None once nothing is waiting or the timeout is over
+        """
+        deadline = None if timeout is None else self.clock() + timeout
+        while True:
+            self._wakeup.clear()
+            ready = self.next_ready()
+            if ready is not None:
+                return ready
+            wait = self.next_ready_in()
+            if wait is None:
+                return None
+            if deadline is not None:
+                left = deadline - self.clock()
+                if left <= 0:
+                    return None
+                wait = min(wait, left)
+            self.logger.debug(f"pacing : nothing due , sleeping {wait:.1f}s\n")
+            if self._sleep is not None:
+                self._sleep(wait)
+            else:
+                self._wakeup.wait(wait)
+
+    def drain(self) -> Iterator[Tuple[Hashable, T]]:
+        # everything added so far (and while draining) , in pacing order
+        while True:
+            ready = self.get()
+            if ready is None:
+                return
+            yield ready
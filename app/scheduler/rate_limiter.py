@@ -0,0 +1,210 @@
+from __future__ import annotations
+import math
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, Optional, Union
+
+"""
+rate limiting primitives shared by the schedulers
+"""
+
+Clock = Callable[[], float]
+
+
+class TokenBucket:
+    """
+    classic token bucket : 'rate' tokens per second refill up to 'capacity' ,
+    tokens are refilled lazily on access so every call is O(1)
+    """
+
+    def __init__(self, rate: float, capacity: float, clock: Clock = time.monotonic) -> None:
+        if rate <= 0 or capacity <= 0:
+            raise ValueError(f"rate and capacity must be positive got {rate} / {capacity}\n")
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def time_until_available(self, tokens: float = 1.0) -> float:
+        # seconds to wait before try_acquire(tokens) can succeed
+        if tokens > self.capacity:
+            return math.inf
+        with self._lock:
+            self._refill()
+            missing = tokens - self._tokens
+            return max(0.0, missing / self.rate)
+
+    def record(self, tokens: float = 1.0) -> None:
+        # take tokens for something that already happened , may go into debt
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+
+    @property
+    def remaining(self) -> int:
+        return max(0, math.floor(self.tokens))
+
+
+class SlidingWindowLog:
+    """
+    exact "at most 'limit' events in any 'window' seconds" : one timestamp per
+    event , expired ones are popped from the left so acquire is amortized O(1)
+    and the log never holds much more than 'limit' entries , unlike a fixed
+    window there is no reset edge where twice the limit can slip through
+    """
+
+    def __init__(self, limit: int, window: float, clock: Clock = time.monotonic) -> None:
+        if limit < 0 or window <= 0:
+            raise ValueError(f"limit must be >= 0 and window positive got {limit} / {window}\n")
+        # may be changed at runtime , the next call uses the new value
+        self.limit = limit
+        self.window = window
+        self.clock = clock
+        self._events: Deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float) -> None:
+        horizon = now - self.window
+        events = self._events
+        while events and events[0] <= horizon:
+            events.popleft()
+
+    @property
+    def count(self) -> int:
+        with self._lock:
+            self._evict(self.clock())
+            return len(self._events)
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.limit - self.count)
+
+    def try_acquire(self, tokens: int = 1) -> bool:
+        with self._lock:
+            now = self.clock()
+            self._evict(now)
+            if len(self._events) + tokens > self.limit:
+                return False
+            self._events.extend([now] * tokens)
+            return True
+
+    def record(self, tokens: int = 1) -> None:
+        # log events that already happened , even past the limit
+        with self._lock:
+            now = self.clock()
+            self._evict(now)
+            self._events.extend([now] * tokens)
+
+    def set_count(self, count: int) -> None:
+        # force the number of events in the window : the oldest are dropped ,
+        # or new ones are logged now (restoring a counter , tests ...)
+        with self._lock:
+            now = self.clock()
+            self._evict(now)
+            while len(self._events) > count:
+                self._events.popleft()
+            self._events.extend([now] * (count - len(self._events)))
+
+    def restore(self, timestamps: Iterable[float]) -> None:
+        # seed the log with events from a previous run , on this limiter's clock
+        with self._lock:
+            merged = sorted([*self._events, *timestamps])
+            self._events = deque(merged)
+            self._evict(self.clock())
+
+    def time_until_available(self, tokens: int = 1) -> float:
+        if tokens > self.limit:
+            return math.inf
+        with self._lock:
+            now = self.clock()
+            self._evict(now)
+            excess = len(self._events) + tokens - self.limit
+            if excess <= 0:
+                return 0.0
+            # the permit frees up when the excess-th oldest event leaves the window
+            return max(0.0, self._events[excess - 1] + self.window - now)
+
+
+Limiter = Union[TokenBucket, SlidingWindowLog]
+
+
+class CompositeLimiter:
+    """
+    several limits that must all agree (per minute , per hour , per day ...) ,
+    a permit is only taken when every limiter has one so a refusal never
+    burns quota in the others
+    """
+
+    def __init__(self, limiters: Dict[str, Limiter], sleep: Callable[[float], None] = time.sleep) -> None:
+        self.limiters = dict(limiters)
+        self.sleep = sleep
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens: int = 1) -> bool:
+        with self._lock:
+            if any(limiter.time_until_available(tokens) > 0 for limiter in self.limiters.values()):
+                return False
+            for limiter in self.limiters.values():
+                limiter.record(tokens)
+            return True
+
+    def record(self, tokens: int = 1) -> None:
+        with self._lock:
+            for limiter in self.limiters.values():
+                limiter.record(tokens)
+
+    def time_until_next_permit(self, tokens: int = 1) -> float:
+        # exact , the caller can sleep this long instead of polling
+        return max(
+            (limiter.time_until_available(tokens) for limiter in self.limiters.values()),
+            default=0.0,
+        )
+
+    def blocking_limit(self, tokens: int = 1) -> Optional[str]:
+        # name of the limiter that is holding things up , None when free
+        waits = {name: limiter.time_until_available(tokens) for name, limiter in self.limiters.items()}
+        name = max(waits, key=waits.__getitem__, default=None)
+        return name if name is not None and waits[name] > 0 else None
+
+    @property
+    def remaining(self) -> int:
+        return min((limiter.remaining for limiter in self.limiters.values()), default=0)
+
+    def acquire(self, tokens: int = 1, timeout: Optional[float] = None) -> bool:
+        """
+        wait for a permit , sleeping exactly until the next one frees up ,
+        False when it would take longer than 'timeout' (None waits forever)
+        """
+        waited = 0.0
+        while True:
+            if self.try_acquire(tokens):
+                return True
+            delay = self.time_until_next_permit(tokens)
+            if math.isinf(delay) or (timeout is not None and waited + delay > timeout):
+                return False
+            self.sleep(delay)
+            waited += delay
@@ -1,3 +1,4 @@
+import asyncio
 import time as time_module
 from os import wait
 import random
@@ -6,6 +7,21 @@ from typing import Any, Optional, Callable, Union, Tuple
 from enum import Enum
 import logging
 
+from app.scheduler.rate_limiter import Clock, CompositeLimiter, SlidingWindowLog, TokenBucket
+from utils.metrics import REGISTRY
+
+# what the scheduler decided , rate(...) of allowed="false" shows when limits bite
+DECISIONS = REGISTRY.counter(
+    "scheduler_decisions_total", "rate limit / transport checks by outcome", ("check", "allowed")
+)
+# one series per sending account , the shards of a SenderPool each publish their own
+SENT_THIS_HOUR = REGISTRY.gauge(
+    "scheduler_sent_this_hour", "emails counted against the hourly limit", ("account",)
+)
+SENT_TODAY = REGISTRY.gauge(
+    "scheduler_sent_today", "emails counted against the daily limit", ("account",)
+)
+
 
 class PriorityState(Enum):
     LOW = "low"
@@ -29,6 +45,10 @@ class EmailScheduler:
         max_email_a_day=70,
         max_email_an_hour=30,
         enable_loggin: bool = True,
+        max_email_a_minute: Optional[int] = None,
+        clock: Clock = time_module.monotonic,
+        state_store: Optional[Any] = None,
+        account: str = "default",
     ):
         variation = random.randint(-10, 25)
         # when the program will fire it will a time interval until it starts sending depending on the time
@@ -52,19 +72,23 @@ class EmailScheduler:
         self.buisness_hours_starting = buisness_hours_start
         self.buisness_hours_ending = buisness_hours_end
 
-        # rate limits - single assignement each
-        self.max_email_an_hour = max_email_an_hour
-        self.max_email_a_day = daily_batch_emails + variation
+        # rate limits : sliding windows over the last hour / 24 hours , plus an
+        # optional per minute token bucket that smooths bursts
+        self.hourly_limiter = SlidingWindowLog(max_email_an_hour, 3600, clock)
+        self.daily_limiter = SlidingWindowLog(daily_batch_emails + variation, 86400, clock)
+        limiters = {"hour": self.hourly_limiter, "day": self.daily_limiter}
+        if max_email_a_minute:
+            limiters["minute"] = TokenBucket(
+                rate=max_email_a_minute / 60, capacity=max_email_a_minute, clock=clock
+            )
+        self.limiter = CompositeLimiter(limiters)
+        self.clock = clock
+        # sender address these limits belong to , labels the published counters
+        self.account = account
+
+        # smtp circuit breaker of the sender , attached later (see attach_circuit_breaker)
+        self.transport_breaker: Optional[Any] = None
 
-        # tracking metricks
-        self.email_sent_during_an_hour = 0
-        self.email_sent_during_a_day = 0
-        self.current_hour_start = datetime.now().replace(
-            hour=0, minute=0, second=0, microsecond=0
-        )
-        self.current_day_start = datetime.now().replace(
-            hour=0, minute=0, second=0, microsecond=0
-        )
         logging.basicConfig(
             level=logging.INFO,
             format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -76,6 +100,12 @@ class EmailScheduler:
         else:
             self.logger.setLevel(logging.CRITICAL + 1)
 
+        # SchedulerStateStore (or anything with load / record / flush) , the
+        # hour and day windows survive a restart , the minute bucket starts full
+        self.state_store = state_store
+        if state_store is not None:
+            self.restore_state()
+
         self.logger.info("Email scheduler initialised successfully\n")
 
     def get_current_time(self) -> datetime:
@@ -85,25 +115,40 @@ class EmailScheduler:
             self.logger.error(f"Could not get the current date time: {e}\n")
             raise
 
-    def _reset_daily_counter_if_needed(self):
-        now = self.get_current_time()
-        if now.date() > self.current_day_start.date():
-            self.logger.info(
-                f"Daily counter reset - was {self.email_sent_during_a_day}\n"
-            )
-            self.email_sent_during_a_day = 0
-            self.current_day_start = now.replace(
-                hour=0, minute=0, second=0, microsecond=0
-            )
+    # ============================================================================
+    # COUNTERS (views over the limiter windows , assignable like plain ints)
+    # ============================================================================
+    @property
+    def max_email_an_hour(self) -> int:
+        return self.hourly_limiter.limit
 
-    def _reset_hourly_counter_if_needed(self):
-        now = self.get_current_time()
-        if (now - self.current_hour_start).seconds >= 3600:
-            self.logger.info(
-                f"Hourly counter reset - was {self.email_sent_during_an_hour}\n"
-            )
-            self.email_sent_during_an_hour = 0
-            self.current_hour_start = now.replace(minute=0, second=0, microsecond=0)
+    @max_email_an_hour.setter
+    def max_email_an_hour(self, value: int) -> None:
+        self.hourly_limiter.limit = value
+
+    @property
+    def max_email_a_day(self) -> int:
+        return self.daily_limiter.limit
+
+    @max_email_a_day.setter
+    def max_email_a_day(self, value: int) -> None:
+        self.daily_limiter.limit = value
+
+    @property
+    def email_sent_during_an_hour(self) -> int:
+        return self.hourly_limiter.count
+
+    @email_sent_during_an_hour.setter
+    def email_sent_during_an_hour(self, value: int) -> None:
+        self.hourly_limiter.set_count(value)
+
+    @property
+    def email_sent_during_a_day(self) -> int:
+        return self.daily_limiter.count
+
+    @email_sent_during_a_day.setter
+    def email_sent_during_a_day(self, value: int) -> None:
+        self.daily_limiter.set_count(value)
 
     def checking_buisness_hours(self, check_time: Optional[datetime] = None) -> bool:
         if check_time is None:
@@ -149,32 +194,36 @@ class EmailScheduler:
 
     def random_email_interval_between_delivery(
         self, max_seconds: int = 90, min_seconds: int = 15
-    ):
+    ) -> int:
+        # one sleep and one log line , a dispatcher serving several accounts
+        # should use app.scheduler.pacing.PacingDispatcher instead of blocking
         wait_time = random.randint(min_seconds, max_seconds)
-        self.logger.warning(
-            f"to not being flagged by robots we need to simulate some type of sleep between each email sent {wait_time}s\n"
-        )
-        while wait_time > 0:
-            self.logger.info(f"\r{wait_time}s remaining ")
-            time_module.sleep(1)
-            wait_time -= 1
+        self.logger.info(f"pacing the next delivery by {wait_time}s\n")
+        time_module.sleep(wait_time)
+        return wait_time
 
-        print("\rDone")
+    async def async_random_email_interval_between_delivery(
+        self, max_seconds: int = 90, min_seconds: int = 15
+    ) -> int:
+        # same pacing as above but awaited , the event loop keeps running other sends
+        wait_time = random.randint(min_seconds, max_seconds)
+        self.logger.info(f"pacing the next delivery by {wait_time}s\n")
+        await asyncio.sleep(wait_time)
+        return wait_time
 
     def check_hourly_email_rate_limit(self) -> tuple[bool, str]:
         try:
             if self.email_sent_during_an_hour >= self.max_email_an_hour:
-                return (
+                return self._decision(
+                    "hourly",
                     False,
                     f"WARNING max email an hour has been reached {self.max_email_an_hour}\n",
                 )
-            elif self.email_sent_during_a_day < self.max_email_a_day:
-                return (
-                    True,
-                    f"still good to go for the hour the limit is {self.max_email_a_day}\n",
-                )
-            else:
-                return False, "Unexpected condition occured\n"
+            return self._decision(
+                "hourly",
+                True,
+                f"still good to go for the hour the limit is {self.max_email_an_hour}\n",
+            )
         except Exception as e:
             self.logger.error(
                 f"the function check_hourly_email_rate_limit has crashed see error : {e}\n"
@@ -184,26 +233,88 @@ class EmailScheduler:
     def check_daily_email_rate_limit(self) -> tuple[bool, str]:
         try:
             if self.email_sent_during_a_day >= self.max_email_a_day:
-                return (
+                return self._decision(
+                    "daily",
                     False,
                     f"WARNING max email an a day has been reached {self.max_email_a_day}\n",
                 )
-            elif self.email_sent_during_a_day < self.max_email_a_day:
-                return (
-                    True,
-                    f"still good to go for the hour the limit is {self.max_email_a_day}\n",
+            return self._decision(
+                "daily",
+                True,
+                f"still good to go for the day the limit is {self.max_email_a_day}\n",
+            )
+        except Exception as e:
+            self.logger.error(
+                f"the function check_daily_email_rate_limit has crashed see error : {e}\n"
+            )
+            raise
+
+    def _decision(self, check: str, allowed: bool, message: str) -> tuple[bool, str]:
+        DECISIONS.labels(check, "true" if allowed else "false").inc()
+        return allowed, message
+
+    def _publish_counters(self) -> None:
+        SENT_THIS_HOUR.labels(self.account).set(self.email_sent_during_an_hour)
+        SENT_TODAY.labels(self.account).set(self.email_sent_during_a_day)
+
+    def attach_circuit_breaker(self, breaker: Any) -> None:
+        # the sender's CircuitBreaker , so the send loop can see an smtp outage
+        self.transport_breaker = breaker
+
+    def check_transport_available(self) -> tuple[bool, str]:
+        try:
+            if self.transport_breaker is None:
+                return self._decision("transport", True, "no circuit breaker attached\n")
+            state = self.transport_breaker.state.value
+            if state == "open":
+                return self._decision(
+                    "transport",
+                    False,
+                    f"WARNING the smtp circuit is open , next probe in {self.transport_breaker.retry_after():.0f}s\n",
                 )
-            else:
-                return False, "Unexpected condition occured\n"
+            return self._decision("transport", True, f"smtp transport is {state}\n")
         except Exception as e:
             self.logger.error(
-                f"the function check_hourly_email_rate_limit has crashed see error : {e}\n"
+                f"the function check_transport_available has crashed see error : {e}\n"
             )
             raise
 
+    def remaining_quota(self) -> int:
+        # how many more emails can go out right now without breaking a limit
+        self._publish_counters()
+        return self.limiter.remaining
+
+    def time_until_next_permit(self) -> float:
+        # exact seconds until the next send is allowed (0 now , inf never)
+        return self.limiter.time_until_next_permit()
+
+    def try_acquire(self) -> bool:
+        # reserve one send in every window at once , nothing taken on refusal
+        return self.limiter.try_acquire()
+
+    def restore_state(self) -> int:
+        # the store hands back ages in seconds , replayed on the limiter clock
+        ages = self.state_store.load()
+        now = self.clock()
+        timestamps = [now - age for age in ages]
+        self.hourly_limiter.restore(timestamps)
+        self.daily_limiter.restore(timestamps)
+        self._publish_counters()
+        self.logger.info(
+            f"limiter state restored - hour : {self.email_sent_during_an_hour} | "
+            f"day : {self.email_sent_during_a_day}\n"
+        )
+        return len(timestamps)
+
+    def checkpoint(self) -> None:
+        if self.state_store is not None:
+            self.state_store.flush()
+
     def increment_counters(self):
-        self.email_sent_during_a_day += 1
-        self.email_sent_during_an_hour += 1
+        self.limiter.record()
+        if self.state_store is not None:
+            self.state_store.record()
+        self._publish_counters()
         self.logger.info(f"""Counters updated — hour:
         {self.email_sent_during_an_hour}/{self.max_email_an_hour} ' f'|
         day: {self.email_sent_during_a_day}/{self.max_email_a_day}\n""")
@@ -0,0 +1,207 @@
+from __future__ import annotations
+import logging
+import math
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from app.scheduler.scheduler import EmailScheduler
+
+"""
+campaign send plan computed up front : every recipient gets a send time inside
+business hours on a working day , the hourly / daily limits and the human like
+gaps hold by construction , so a 20k campaign is spread over the days it needs
+instead of stopping on the first limit , the whole timeline is built with numpy
+array operations and handed to the scheduled email daemon
+"""
+
+logger = logging.getLogger(__name__)
+
+HOUR = 3600.0
+
+
+def _weekmask(weekdays: Sequence[int]) -> str:
+    # numpy busday weekmask , monday first
+    return "".join("1" if day in weekdays else "0" for day in range(7))
+
+
+@dataclass
+class SendPlan:
+    # epoch seconds , sorted , one per recipient
+    send_at: np.ndarray
+    # index of the working day each send falls on (0 = first day of the plan)
+    day_index: np.ndarray
+    # calendar date of every working day of the plan
+    days: List[date]
+    per_day_capacity: int
+    first_day_sends: int
+
+    def __len__(self) -> int:
+        return len(self.send_at)
+
+    @property
+    def starts_at(self) -> Optional[datetime]:
+        return datetime.fromtimestamp(self.send_at[0]) if len(self) else None
+
+    @property
+    def completes_at(self) -> Optional[datetime]:
+        # projected time of the last send
+        return datetime.fromtimestamp(self.send_at[-1]) if len(self) else None
+
+    def per_day(self) -> Dict[date, int]:
+        counts = np.bincount(self.day_index, minlength=len(self.days))
+        return {day: int(count) for day, count in zip(self.days, counts) if count}
+
+    def datetimes(self) -> List[datetime]:
+        return [datetime.fromtimestamp(value) for value in self.send_at.tolist()]
+
+    def assign(
+        self, messages: Iterable[Tuple[str, str, str]]
+    ) -> Iterator[Tuple[str, str, str, float]]:
+        """
+        (recipient , subject , body) in campaign order -> the same with its send
+        time , ready for ScheduledEmailDaemon.schedule_many
+        """
+        for (recipient, subject, body), send_at in zip(messages, self.send_at.tolist()):
+            yield recipient, subject, body, send_at
+
+    def summary(self) -> str:
+        if not len(self):
+            return "empty send plan"
+        per_day = self.per_day()
+        return (
+            f"{len(self)} email(s) over {len(per_day)} working day(s) , "
+            f"{self.per_day_capacity} a full day , first send {self.starts_at:%Y-%m-%d %H:%M} , "
+            f"projected completion {self.completes_at:%Y-%m-%d %H:%M}"
+        )
+
+
+def plan_campaign(
+    count: int,
+    start: Optional[datetime] = None,
+    business_start: time = time(9, 0),
+    business_end: time = time(17, 0),
+    max_per_hour: int = 30,
+    max_per_day: int = 100,
+    min_gap: float = 15.0,
+    jitter: Optional[float] = None,
+    first_day_quota: Optional[int] = None,
+    weekdays: Sequence[int] = (0, 1, 2, 3, 4),
+    holidays: Sequence[date] = (),
+    seed: Optional[int] = None,
+) -> SendPlan:
+    """
+    every working day is cut in equal slots , one send per slot pushed later
+    by a random jitter :
+
+    - slot length s = window / sends per day , and the jitter stays under
+      s - g (g = max(min_gap , 1h / max_per_hour)) so two sends are always at
+      least g apart , which also keeps any hour under max_per_hour
+    - a full day takes min(max_per_day , window / g) sends
+    - when the daily limit is what fills the day , a send is never earlier in
+      its day than the same slot the day before , so the 24h sliding window of
+      EmailScheduler never holds more than max_per_day
+    - the first day only uses the slots after 'start' and 'first_day_quota'
+      (what is left of today's quota , the live limiter still has the last word)
+    """
+    if count < 0:
+        raise ValueError(f"count must be >= 0 got {count}\n")
+    if max_per_hour < 1 or max_per_day < 1:
+        raise ValueError(f"limits must be at least 1 got {max_per_hour} / {max_per_day}\n")
+    window = (
+        datetime.combine(date.min, business_end) - datetime.combine(date.min, business_start)
+    ).total_seconds()
+    if window <= 0:
+        raise ValueError(f"business hours end before they start {business_start} - {business_end}\n")
+    if not weekdays:
+        raise ValueError("at least one working day is needed\n")
+
+    start = start or datetime.now()
+    gap = max(min_gap, HOUR / max_per_hour)
+    per_day = max(1, min(max_per_day, int(window // gap)))
+    slot = window / per_day
+    slack = max(0.0, slot - gap)
+    spread = slack if jitter is None else min(max(0.0, jitter), slack)
+    weekmask = _weekmask(weekdays)
+    holidays = np.array(list(holidays), dtype="datetime64[D]")
+
+    # first working day on or after start , and its free slots
+    first = np.busday_offset(
+        np.datetime64(start.date()), 0, roll="forward", weekmask=weekmask, holidays=holidays
+    )
+    first_slot = 0
+    first_day_cap = per_day
+    if first == np.datetime64(start.date()):
+        elapsed = (start - datetime.combine(start.date(), business_start)).total_seconds()
+        first_slot = min(per_day, max(0, math.ceil(elapsed / slot)))
+        if first_day_quota is not None:
+            first_day_cap = max(0, first_day_quota)
+    first_count = min(count, per_day - first_slot, first_day_cap)
+
+    # working days needed , day 0 may end up empty
+    full_days = math.ceil((count - first_count) / per_day) if count > first_count else 0
+    day_dates = np.busday_offset(
+        first, np.arange(full_days + 1), roll="forward", weekmask=weekmask, holidays=holidays
+    )
+    days = [value.item() for value in day_dates]
+
+    # (day , slot) of every send : the tail of day 0 , then full days
+    k = np.arange(count)
+    later = k >= first_count
+    day_index = np.where(later, 1 + (k - first_count) // per_day, 0)
+    slot_index = np.where(later, (k - first_count) % per_day, first_slot + k)
+
+    rng = np.random.default_rng(seed)
+    offsets = slot_index * slot + rng.uniform(0.0, spread, count)
+
+    if per_day == max_per_day and count:
+        # the daily limit binds : same slot never earlier than the day before ,
+        # as a running max over runs of consecutive days (reset on gaps) , each
+        # run gets a base larger than any offset so the max cannot leak across
+        grid = np.full((len(days), per_day), -np.inf)
+        grid[day_index, slot_index] = offsets
+        ordinals = day_dates.astype("int64")
+        run = np.concatenate(([0], np.cumsum(np.diff(ordinals) > 1)))
+        base = (run * 2 * window)[:, None]
+        grid = np.maximum.accumulate(grid + base, axis=0) - base
+        offsets = grid[day_index, slot_index]
+
+    # local day starts : across a dst change the 24h rule is off by the shift ,
+    # the live limiter of the daemon still holds those few sends back
+    day_starts = np.array([datetime.combine(day, business_start).timestamp() for day in days])
+    send_at = day_starts[day_index] + offsets
+    plan = SendPlan(
+        send_at=send_at,
+        day_index=day_index,
+        days=days,
+        per_day_capacity=per_day,
+        first_day_sends=first_count,
+    )
+    logger.info(f"send plan ready : {plan.summary()}\n")
+    return plan
+
+
+def plan_for_scheduler(
+    scheduler: EmailScheduler,
+    count: int,
+    start: Optional[datetime] = None,
+    **kwargs,
+) -> SendPlan:
+    # limits , business hours and what is left of today's quota from the scheduler
+    start = start or datetime.now()
+    wait = scheduler.time_until_next_permit()
+    if math.isfinite(wait) and wait > 0:
+        start += timedelta(seconds=wait)
+    return plan_campaign(
+        count,
+        start=start,
+        business_start=scheduler.buisness_hours_starting,
+        business_end=scheduler.buisness_hours_ending,
+        max_per_hour=scheduler.max_email_an_hour,
+        max_per_day=scheduler.max_email_a_day,
+        first_day_quota=scheduler.max_email_a_day - scheduler.email_sent_during_a_day,
+        **kwargs,
+    )
@@ -0,0 +1,165 @@
+import pytest
+
+from app.Mailer.sender import EMAIL
+from app.scheduler.domain_throttle import (
+    DomainDispatcher,
+    DomainPolicy,
+    DomainThrottle,
+    domain_of,
+    domains_of,
+)
+from app.scheduler.rate_limiter import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def mail(address):
+    return EMAIL(to=address, subject="s", body="b")
+
+
+class TestTokenBucket:
+    def test_burst_then_refill(self, clock):
+        bucket = TokenBucket(rate=1.0, capacity=2, clock=clock)
+        assert bucket.try_acquire()
+        assert bucket.try_acquire()
+        assert not bucket.try_acquire()
+        assert bucket.time_until_available() == pytest.approx(1.0)
+        clock.now = 1.0
+        assert bucket.try_acquire()
+
+    def test_never_refills_above_capacity(self, clock):
+        bucket = TokenBucket(rate=10.0, capacity=3, clock=clock)
+        clock.now = 100.0
+        assert bucket.tokens == 3
+
+    def test_invalid_parameters(self):
+        with pytest.raises(ValueError):
+            TokenBucket(rate=0, capacity=1)
+
+
+class TestDomainThrottle:
+    def test_in_flight_cap(self, clock):
+        throttle = DomainThrottle(
+            default_policy=DomainPolicy(per_minute=600, burst=10, max_in_flight=1),
+            policies={},
+            clock=clock,
+            enable_loggin=False,
+        )
+        assert throttle.try_acquire("example.com")
+        assert not throttle.try_acquire("example.com")
+        # blocked by the cap , only a completion frees it
+        assert throttle.time_until_ready("example.com") is None
+        throttle.release("example.com")
+        assert throttle.try_acquire("example.com")
+
+    def test_domains_are_independent(self, clock):
+        throttle = DomainThrottle(
+            default_policy=DomainPolicy(per_minute=60, burst=1, max_in_flight=5),
+            policies={},
+            clock=clock,
+            enable_loggin=False,
+        )
+        assert throttle.try_acquire("a.com")
+        assert not throttle.try_acquire("a.com")
+        assert throttle.try_acquire("b.com")
+        assert throttle.time_until_ready("a.com") == pytest.approx(1.0)
+
+    def test_domain_of(self):
+        assert domain_of(mail("Someone@GMail.com")) == "gmail.com"
+        assert domain_of(EMAIL(to=None, subject="s", body="b")) == ""
+
+    def test_domains_of_covers_every_recipient(self):
+        email = EMAIL(
+            to=["a@gmail.com", "b@yahoo.com"],
+            cc="c@GMAIL.com",
+            bcc=["d@outlook.com"],
+            subject="s",
+            body="b",
+        )
+        assert domains_of(email) == ["gmail.com", "yahoo.com", "outlook.com"]
+
+    def test_multi_domain_slot_is_all_or_nothing(self, clock):
+        throttle = DomainThrottle(
+            default_policy=DomainPolicy(per_minute=60, burst=5, max_in_flight=1),
+            policies={},
+            clock=clock,
+            enable_loggin=False,
+        )
+        assert throttle.try_acquire("b.com")
+        # b.com is full , a.com must not be taken either
+        assert not throttle.try_acquire("a.com", "b.com")
+        assert throttle.in_flight("a.com") == 0
+        assert throttle.time_until_ready("a.com", "b.com") is None
+        throttle.release("b.com")
+        assert throttle.try_acquire("a.com", "b.com")
+        throttle.release("a.com", "b.com")
+        assert throttle.in_flight("a.com") == throttle.in_flight("b.com") == 0
+
+
+class TestDomainDispatcher:
+    def test_slow_domain_does_not_stall_the_others(self, clock):
+        throttle = DomainThrottle(
+            default_policy=DomainPolicy(per_minute=600, burst=10, max_in_flight=10),
+            policies={"slow.com": DomainPolicy(per_minute=1, burst=1, max_in_flight=1)},
+            clock=clock,
+            enable_loggin=False,
+        )
+        dispatcher = DomainDispatcher(throttle)
+        dispatcher.extend(mail(f"user{i}@slow.com") for i in range(3))
+        dispatcher.extend(mail(f"user{i}@fast.com") for i in range(3))
+
+        handed_out = []
+        while True:
+            email = dispatcher.next_ready()
+            if email is None:
+                break
+            handed_out.append(domain_of(email))
+
+        assert handed_out == ["slow.com", "fast.com", "fast.com", "fast.com"]
+        assert len(dispatcher) == 2
+        # slow.com is capped by its in flight slot , not by time
+        assert dispatcher.next_ready_in() is None
+        throttle.release("slow.com")
+        assert dispatcher.next_ready_in() == pytest.approx(60.0)
+
+    def test_second_recipient_domain_is_throttled(self, clock):
+        throttle = DomainThrottle(
+            default_policy=DomainPolicy(per_minute=600, burst=10, max_in_flight=10),
+            policies={"slow.com": DomainPolicy(per_minute=1, burst=1, max_in_flight=1)},
+            clock=clock,
+            enable_loggin=False,
+        )
+        dispatcher = DomainDispatcher(throttle)
+        dispatcher.add(EMAIL(to=["a@fast.com", "b@slow.com"], subject="s", body="b"))
+        dispatcher.add(EMAIL(to=["c@fast.com", "d@slow.com"], subject="s", body="b"))
+
+        assert dispatcher.next_ready() is not None
+        # the second one waits on slow.com although its lane is fast.com
+        assert dispatcher.next_ready() is None
+        assert throttle.in_flight("slow.com") == 1
+
+    def test_round_robin_between_domains(self, clock):
+        throttle = DomainThrottle(
+            default_policy=DomainPolicy(per_minute=600, burst=10, max_in_flight=10),
+            policies={},
+            clock=clock,
+            enable_loggin=False,
+        )
+        dispatcher = DomainDispatcher(throttle)
+        dispatcher.extend([mail("1@a.com"), mail("2@a.com"), mail("3@a.com"), mail("1@b.com")])
+
+        order = [dispatcher.next_ready().to for _ in range(4)]
+
+        assert order == ["1@a.com", "1@b.com", "2@a.com", "3@a.com"]
+        assert dispatcher.next_ready() is None
@@ -0,0 +1,95 @@
+import threading
+
+import pytest
+
+from app.scheduler.pacing import PacingDispatcher, random_interval
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.naps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.naps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def make(clock, interval=10):
+    return PacingDispatcher(
+        interval=lambda lane: interval, clock=clock, sleep=clock.sleep, enable_loggin=False
+    )
+
+
+class TestPacingDispatcher:
+    def test_one_lane_is_paced(self, clock):
+        dispatcher = make(clock)
+        for item in "abc":
+            dispatcher.add("account", item)
+        assert [item for _, item in dispatcher.drain()] == ["a", "b", "c"]
+        # one sleep per decision , none after the last item
+        assert clock.naps == [10, 10]
+
+    def test_a_waiting_lane_does_not_hold_the_others(self, clock):
+        dispatcher = make(clock)
+        dispatcher.add("slow", 1)
+        dispatcher.add("slow", 2)
+        dispatcher.add("fast", 3)
+        assert dispatcher.next_ready() == ("slow", 1)
+        assert dispatcher.next_ready() == ("fast", 3)
+        assert dispatcher.next_ready() is None
+        assert dispatcher.next_ready_in() == pytest.approx(10)
+        assert dispatcher.get() == ("slow", 2)
+        assert clock.naps == [10]
+        assert len(dispatcher) == 0
+
+    def test_a_lane_keeps_its_pause_when_it_runs_dry(self, clock):
+        dispatcher = make(clock)
+        dispatcher.add("account", 1)
+        dispatcher.get()
+        clock.now += 4
+        dispatcher.add("account", 2)
+        assert dispatcher.next_ready() is None
+        assert dispatcher.next_ready_in() == pytest.approx(6)
+
+    def test_defer_pushes_a_lane_back(self, clock):
+        dispatcher = make(clock)
+        dispatcher.add("a", 1)
+        dispatcher.add("b", 2)
+        dispatcher.defer("a", 30)
+        assert dispatcher.get() == ("b", 2)
+        assert dispatcher.get() == ("a", 1)
+        assert clock.now == pytest.approx(30)
+
+    def test_timeout(self, clock):
+        dispatcher = make(clock)
+        dispatcher.add("a", 1)
+        dispatcher.add("a", 2)
+        dispatcher.get()
+        assert dispatcher.get(timeout=3) is None
+        assert clock.now == pytest.approx(3)
+
+    def test_empty(self, clock):
+        dispatcher = make(clock)
+        assert dispatcher.get() is None
+        assert dispatcher.next_ready_in() is None
+
+    def test_add_wakes_a_sleeping_dispatcher(self):
+        dispatcher = PacingDispatcher(interval=lambda lane: 60, enable_loggin=False)
+        dispatcher.add("slow", 1)
+        dispatcher.add("slow", 2)
+        dispatcher.get()
+        threading.Timer(0.05, dispatcher.add, args=("fast", 3)).start()
+        assert dispatcher.get(timeout=5) == ("fast", 3)
+
+    def test_random_interval_range(self):
+        interval = random_interval(15, 90)
+        assert all(15 <= interval("lane") <= 90 for _ in range(50))
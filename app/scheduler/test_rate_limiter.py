@@ -0,0 +1,146 @@
+import math
+
+import pytest
+
+from app.Mailer.sender import EMAIL, EmailSender
+from app.Mailer.transport import NULL
+from app.scheduler.rate_limiter import CompositeLimiter, SlidingWindowLog, TokenBucket
+from app.scheduler.scheduler import EmailScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+class TestSlidingWindowLog:
+    def test_limit_within_the_window(self, clock):
+        log = SlidingWindowLog(limit=2, window=10, clock=clock)
+        assert log.try_acquire()
+        clock.now += 4
+        assert log.try_acquire()
+        assert not log.try_acquire()
+        # the first event leaves the window 10s after it was logged
+        assert log.time_until_available() == pytest.approx(6)
+        clock.now += 6
+        assert log.try_acquire()
+        assert log.count == 2
+
+    def test_no_burst_at_the_window_edge(self, clock):
+        # a fixed window would allow 2x the limit around the reset
+        log = SlidingWindowLog(limit=3, window=60, clock=clock)
+        clock.now = 59
+        assert all(log.try_acquire() for _ in range(3))
+        clock.now = 61
+        assert not log.try_acquire()
+
+    def test_restore_keeps_order_and_drops_expired(self, clock):
+        clock.now = 100
+        log = SlidingWindowLog(limit=3, window=60, clock=clock)
+        log.try_acquire()
+        log.restore([90, 30, 70])
+        assert log.count == 3
+        assert log.time_until_available() == pytest.approx(30)
+
+    def test_set_count(self, clock):
+        log = SlidingWindowLog(limit=10, window=60, clock=clock)
+        log.set_count(7)
+        assert (log.count, log.remaining) == (7, 3)
+        log.set_count(2)
+        assert log.count == 2
+
+    def test_more_than_the_limit_never_fits(self, clock):
+        assert math.isinf(SlidingWindowLog(limit=1, window=1, clock=clock).time_until_available(2))
+
+
+class TestCompositeLimiter:
+    def test_refusal_does_not_burn_the_other_limits(self, clock):
+        minute = SlidingWindowLog(limit=1, window=60, clock=clock)
+        hour = SlidingWindowLog(limit=10, window=3600, clock=clock)
+        limiter = CompositeLimiter({"minute": minute, "hour": hour})
+        assert limiter.try_acquire()
+        assert not limiter.try_acquire()
+        assert hour.count == 1
+        assert limiter.blocking_limit() == "minute"
+        assert limiter.time_until_next_permit() == pytest.approx(60)
+
+    def test_acquire_sleeps_exactly_until_the_next_permit(self, clock):
+        naps = []
+
+        def sleep(seconds):
+            naps.append(seconds)
+            clock.sleep(seconds)
+
+        bucket = TokenBucket(rate=0.5, capacity=1, clock=clock)
+        limiter = CompositeLimiter({"bucket": bucket}, sleep=sleep)
+        assert limiter.acquire()
+        assert limiter.acquire()
+        assert naps == [pytest.approx(2.0)]
+        assert not limiter.acquire(timeout=1)
+
+
+class TestSchedulerLimits:
+    def make(self, clock, **kwargs):
+        return EmailScheduler(enable_loggin=False, clock=clock, **kwargs)
+
+    def test_hourly_check_ignores_the_daily_counter(self, clock):
+        scheduler = self.make(clock, max_email_an_hour=30)
+        scheduler.email_sent_during_a_day = scheduler.max_email_a_day
+        ok, message = scheduler.check_hourly_email_rate_limit()
+        assert ok
+        assert "30" in message
+
+    def test_hourly_window_slides_past_a_day(self, clock):
+        scheduler = self.make(clock, max_email_an_hour=2)
+        scheduler.increment_counters()
+        scheduler.increment_counters()
+        assert scheduler.remaining_quota() == 0
+        assert scheduler.time_until_next_permit() == pytest.approx(3600)
+        # timedelta.seconds wrapped at one day , 25h later the window is free
+        clock.now += 25 * 3600
+        assert scheduler.email_sent_during_an_hour == 0
+        assert scheduler.email_sent_during_a_day == 0
+
+    def test_counters_stay_assignable(self, clock):
+        scheduler = self.make(clock)
+        scheduler.email_sent_during_an_hour += 1
+        scheduler.email_sent_during_an_hour += 1
+        assert scheduler.email_sent_during_an_hour == 2
+        scheduler.max_email_an_hour = 2
+        assert not scheduler.check_hourly_email_rate_limit()[0]
+
+    def test_minute_bucket(self, clock):
+        scheduler = self.make(clock, max_email_a_minute=2)
+        assert scheduler.try_acquire()
+        assert scheduler.try_acquire()
+        assert not scheduler.try_acquire()
+        assert scheduler.time_until_next_permit() == pytest.approx(30)
+
+    def test_send_batch_waits_for_the_next_permit(self, clock, monkeypatch):
+        monkeypatch.setattr("app.Mailer.sender.time.sleep", clock.sleep)
+        scheduler = self.make(clock, max_email_an_hour=100, max_email_a_minute=2)
+        sender = EmailSender("me@example.com", "secret", enable_loggin=False, transport=NULL)
+        emails = [EMAIL(to=f"user{i}@example.com", subject="s", body="b") for i in range(4)]
+
+        results = list(sender.send_batch(emails, concurrency=1, scheduler=scheduler, max_quota_wait=60))
+
+        assert len(results) == 4
+        assert clock.now - 1000 == pytest.approx(60)
+
+    def test_send_batch_stops_when_the_wait_is_too_long(self, clock):
+        scheduler = self.make(clock, max_email_an_hour=2)
+        sender = EmailSender("me@example.com", "secret", enable_loggin=False, transport=NULL)
+        emails = [EMAIL(to=f"user{i}@example.com", subject="s", body="b") for i in range(4)]
+        results = list(sender.send_batch(emails, concurrency=1, scheduler=scheduler, max_quota_wait=60))
+        assert len(results) == 2
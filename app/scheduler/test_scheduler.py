@@ -155,23 +155,20 @@ class TestRandomEmailIntervalBetweenDelivery:
     @patch("time.sleep")
     def test_default_interval(self, mock_sleep):
         scheduler = EmailScheduler(enable_loggin=False)
-        scheduler.random_email_interval_between_delivery()
-        call_count = mock_sleep.call_count
-        assert 15 <= call_count <= 90
+        waited = scheduler.random_email_interval_between_delivery()
+        # a single sleep for the whole interval , no per second loop
+        mock_sleep.assert_called_once_with(waited)
+        assert 15 <= waited <= 90
 
-        for call in mock_sleep.call_args_list:
-            assert call[0][0] == 1
-
-    # @patch("time.sleep")
-    # def test_custom_interval(self, mock_sleep):
-    #     scheduler = EmailScheduler(enable_loggin=False)
-    #     scheduler.random_email_interval_between_delivery(
-    #         max_seconds=120, min_seconds=30
-    #     )
-    #     mock_sleep.assert_called_once()
-    #     call_args = mock_sleep.call_args[0][0]
-    #     assert 30 <= call_args <= 120
-    #
+    @patch("time.sleep")
+    def test_custom_interval(self, mock_sleep):
+        scheduler = EmailScheduler(enable_loggin=False)
+        scheduler.random_email_interval_between_delivery(
+            max_seconds=120, min_seconds=30
+        )
+        mock_sleep.assert_called_once()
+        call_args = mock_sleep.call_args[0][0]
+        assert 30 <= call_args <= 120
 
 
 class TestCheckHourlyEmailRateLimit:
@@ -203,3 +200,33 @@ class TestLogging:
             scheduler = EmailScheduler(enable_loggin=False)
             mock_config.assert_not_called()
             assert scheduler.logger.level == logging.CRITICAL + 1
+
+
+class TestRemainingQuota:
+    def test_smallest_of_hourly_and_daily(self):
+        scheduler = EmailScheduler(max_email_an_hour=30, enable_loggin=False)
+        scheduler.max_email_a_day = 12
+        scheduler.email_sent_during_a_day = 5
+        assert scheduler.remaining_quota() == 7
+
+    def test_never_negative(self):
+        scheduler = EmailScheduler(enable_loggin=False)
+        scheduler.email_sent_during_a_day = scheduler.max_email_a_day + 10
+        assert scheduler.remaining_quota() == 0
+
+
+class TestAsyncRandomInterval:
+    def test_awaits_a_single_sleep(self):
+        import asyncio
+
+        scheduler = EmailScheduler(enable_loggin=False)
+        with patch(
+            "app.scheduler.scheduler.asyncio.sleep", new=mock.AsyncMock()
+        ) as fake_sleep:
+            waited = asyncio.run(
+                scheduler.async_random_email_interval_between_delivery(
+                    max_seconds=20, min_seconds=10
+                )
+            )
+        fake_sleep.assert_awaited_once_with(waited)
+        assert 10 <= waited <= 20
@@ -0,0 +1,91 @@
+from datetime import date, datetime, time
+
+import numpy as np
+import pytest
+
+from app.scheduler.scheduler import EmailScheduler
+from app.scheduler.send_plan import plan_campaign, plan_for_scheduler
+
+# a monday
+MONDAY = datetime(2026, 3, 2, 8, 0)
+
+
+def in_business_hours(plan, start=time(9, 0), end=time(17, 0)):
+    return all(start <= moment.time() < end and moment.weekday() < 5 for moment in plan.datetimes())
+
+
+class TestPlanCampaign:
+    def test_large_campaign_respects_every_limit(self):
+        plan = plan_campaign(20_000, start=MONDAY, max_per_hour=30, max_per_day=100, seed=7)
+        send_at = plan.send_at
+
+        assert len(plan) == 20_000
+        assert np.all(np.diff(send_at) > 0)
+        # at most 100 in any 24h and 30 in any hour , as the sliding windows count them
+        assert np.all(send_at[100:] - send_at[:-100] >= 86400)
+        assert np.all(send_at[30:] - send_at[:-30] >= 3600)
+        assert in_business_hours(plan)
+        assert set(plan.per_day().values()) == {100}
+        # 200 working days from monday march 2nd
+        assert plan.completes_at.date() == date(2026, 12, 4)
+
+    def test_hourly_limit_sets_the_day_capacity(self):
+        plan = plan_campaign(100, start=MONDAY, max_per_hour=5, max_per_day=100, seed=1)
+        assert plan.per_day_capacity == 40
+        assert np.diff(plan.send_at).min() >= 720
+        assert list(plan.per_day().values()) == [40, 40, 20]
+
+    def test_starts_after_now_and_skips_the_weekend(self):
+        friday_afternoon = datetime(2026, 3, 6, 16, 0)
+        plan = plan_campaign(30, start=friday_afternoon, max_per_day=20, seed=3)
+
+        assert plan.starts_at >= friday_afternoon
+        # 24 minute slots , 16:00 leaves the last two of friday
+        assert plan.first_day_sends == 2
+        assert list(plan.per_day().values()) == [2, 20, 8]
+        assert list(plan.per_day())[1] == date(2026, 3, 9)
+        assert in_business_hours(plan)
+
+    def test_first_day_quota_and_holidays(self):
+        plan = plan_campaign(
+            50, start=MONDAY, max_per_day=20, first_day_quota=5, holidays=[date(2026, 3, 3)], seed=0
+        )
+        assert plan.per_day() == {
+            date(2026, 3, 2): 5,
+            date(2026, 3, 4): 20,
+            date(2026, 3, 5): 20,
+            date(2026, 3, 6): 5,
+        }
+
+    def test_jitter_is_bounded_and_seeded(self):
+        first = plan_campaign(10, start=MONDAY, max_per_day=10, jitter=0)
+        assert np.allclose(np.diff(first.send_at), 2880)
+        assert np.array_equal(
+            plan_campaign(50, start=MONDAY, seed=4).send_at,
+            plan_campaign(50, start=MONDAY, seed=4).send_at,
+        )
+
+    def test_assign_pairs_messages_with_times(self):
+        plan = plan_campaign(2, start=MONDAY, seed=2)
+        rows = list(plan.assign([("a@x.com", "s", "b"), ("b@x.com", "s", "b")]))
+        assert [row[0] for row in rows] == ["a@x.com", "b@x.com"]
+        assert [row[3] for row in rows] == plan.send_at.tolist()
+
+    def test_empty_and_invalid(self):
+        assert plan_campaign(0, start=MONDAY).completes_at is None
+        with pytest.raises(ValueError):
+            plan_campaign(10, business_start=time(17), business_end=time(9))
+        with pytest.raises(ValueError):
+            plan_campaign(10, max_per_day=0)
+
+
+class TestPlanForScheduler:
+    def test_uses_the_scheduler_limits_and_quota(self):
+        scheduler = EmailScheduler(enable_loggin=False, max_email_an_hour=10)
+        scheduler.max_email_a_day = 60
+        scheduler.email_sent_during_a_day = 50
+        plan = plan_for_scheduler(scheduler, 100, start=MONDAY, seed=5)
+
+        assert plan.first_day_sends == 10
+        assert plan.per_day_capacity == 60
+        assert np.diff(plan.send_at).min() >= 360
@@ -1,8 +1,14 @@
 from PySide6 import QtCore
 from PySide6.QtWidgets import QHBoxLayout, QLabel, QVBoxLayout, QWidget
 
+# circuit state -> label colour
+TRANSPORT_COLORS = {"closed": "green", "half_open": "orange", "open": "red"}
+
 
 class DashBorad(QWidget):
+    # the breaker calls back from a mailer thread , a signal hops to the gui thread
+    transport_state_changed = QtCore.Signal(dict)
+
     def __init__(self, parent=None):
         super().__init__(parent)
         layout = QVBoxLayout(self)
@@ -16,3 +22,23 @@ class DashBorad(QWidget):
             """
         )
         layout.addWidget(label)
+
+        self.transport_label = QLabel("SMTP transport : unknown")
+        self.transport_label.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
+        layout.addWidget(self.transport_label)
+        self.transport_state_changed.connect(self.set_transport_state)
+
+    def watch_circuit_breaker(self, breaker):
+        # breaker is the sender's CircuitBreaker (sender.breaker)
+        breaker.add_listener(self.transport_state_changed.emit)
+        self.set_transport_state(breaker.snapshot())
+
+    def set_transport_state(self, snapshot: dict):
+        state = snapshot.get("state", "unknown")
+        text = f"SMTP transport : {state.replace('_', ' ')}"
+        if state == "open" and snapshot.get("last_error"):
+            text += f" ({snapshot['last_error']})"
+        self.transport_label.setText(text)
+        self.transport_label.setStyleSheet(
+            f"color : {TRANSPORT_COLORS.get(state, 'gray')} ; font-size : 14px ;"
+        )
@@ -0,0 +1,303 @@
+from __future__ import annotations
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+from app.Mailer.sender import EMAIL, EmailSender, EmailStatus
+from app.scheduler.domain_throttle import DomainThrottle
+from app.scheduler.scheduler import EmailScheduler
+from app.supabase.status_writer import BufferedStatusWriter
+from app.supabase.supabaseClient import DatabaseOperation, EmailRecord
+from utils.metrics import REGISTRY
+
+"""
+streaming campaign pipeline : load -> build -> validate -> send -> write back ,
+every stage runs on its own thread(s) and hands over through a bounded queue so
+a slow stage blocks the ones upstream instead of letting lists pile up , the
+first email leaves as soon as the first page is loaded
+"""
+
+# end of stream marker , travels down the queues behind the last item
+_END = object()
+
+# how often a blocked put / get looks at the stop flags
+_POLL_INTERVAL = 0.1
+
+# a queue pinned at queue_size means the stage after it is the bottleneck
+QUEUE_DEPTH = REGISTRY.gauge(
+    "pipeline_queue_depth", "items waiting between two pipeline stages", ("queue",)
+)
+
+
+@dataclass
+class PipelineStats:
+    loaded: int = 0
+    built: int = 0
+    valid: int = 0
+    invalid: int = 0
+    sent: int = 0
+    failed: int = 0
+    # never attempted (quota spent) , their status is left for the next run
+    held: int = 0
+    # seconds from start to the first successful send
+    first_sent_after: Optional[float] = None
+    elapsed: float = 0.0
+
+
+class CampaignPipeline:
+    def __init__(
+        self,
+        database: DatabaseOperation,
+        sender: EmailSender,
+        build: Callable[[EmailRecord], Optional[EMAIL]],
+        scheduler: Optional[EmailScheduler] = None,
+        status_writer: Optional[BufferedStatusWriter] = None,
+        status: Optional[str] = None,
+        page_size: int = 500,
+        queue_size: int = 1000,
+        build_workers: int = 2,
+        validate_workers: int = 1,
+        concurrency: int = 4,
+        throttle: Optional[DomainThrottle] = None,
+        max_quota_wait: float = 0.0,
+        enable_loggin: bool = True,
+    ) -> None:
+        if min(page_size, queue_size, build_workers, validate_workers, concurrency) < 1:
+            raise ValueError("page_size , queue_size , workers and concurrency must be at least 1\n")
+        self.database = database
+        self.sender = sender
+        # EmailRecord -> EMAIL , None drops the record
+        self.build = build
+        self.scheduler = scheduler
+        self.status_writer = status_writer
+        # only load the rows in this status (None loads the whole table)
+        self.status = status
+        self.page_size = page_size
+        self.queue_size = queue_size
+        self.build_workers = build_workers
+        self.validate_workers = validate_workers
+        self.concurrency = concurrency
+        self.throttle = throttle
+        # sleep up to this long for the next rate limit permit instead of stopping
+        self.max_quota_wait = max_quota_wait
+        self.logger = logging.getLogger(__name__)
+        if not enable_loggin:
+            self.logger.setLevel(logging.CRITICAL + 1)
+
+        self.stats = PipelineStats()
+        self._stats_lock = threading.Lock()
+        # producers stop once this is set (send stage done or a stage crashed)
+        self._halt = threading.Event()
+        # everything stops , the write back stage is gone
+        self._abort = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._started = 0.0
+
+    # ============================================================================
+    # QUEUE HELPERS
+    # ============================================================================
+    def _put(self, target: queue.Queue, item: Any, stop: threading.Event) -> bool:
+        # blocking put that gives up when the pipeline is stopping (backpressure)
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source: queue.Queue, stop: threading.Event) -> Any:
+        while not stop.is_set():
+            try:
+                return source.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _drain(self, source: queue.Queue) -> Iterator[Any]:
+        while True:
+            item = self._get(source, self._halt)
+            if item is _END:
+                return
+            yield item
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            setattr(self.stats, name, getattr(self.stats, name) + amount)
+
+    def _fail(self, stage: str, error: BaseException) -> None:
+        self.logger.error(f"pipeline stage {stage} crashed , stopping the campaign : {error}\n")
+        if self._error is None:
+            self._error = error
+        self._halt.set()
+
+    # ============================================================================
+    # STAGES
+    # ============================================================================
+    def _load(self, outbox: queue.Queue) -> None:
+        try:
+            for record in self.database.fetch_records_paginated(
+                page_size=self.page_size, status=self.status
+            ):
+                if not self._put(outbox, record, self._halt):
+                    return
+                self._count("loaded")
+        except Exception as e:
+            # what was loaded so far still goes out , the error is raised at the end
+            self.logger.error(f"pipeline stage load crashed after {self.stats.loaded} record(s) : {e}\n")
+            self._error = e
+        finally:
+            self._put(outbox, _END, self._halt)
+
+    def _worker(
+        self,
+        stage: str,
+        handle: Callable[[Any], Optional[Any]],
+        inbox: queue.Queue,
+        outbox: queue.Queue,
+        remaining: List[int],
+        lock: threading.Lock,
+    ) -> None:
+        try:
+            while True:
+                item = self._get(inbox, self._halt)
+                if item is _END:
+                    # let the sibling workers see the end too
+                    self._put(inbox, _END, self._halt)
+                    break
+                result = handle(item)
+                if result is not None and not self._put(outbox, result, self._halt):
+                    break
+        except Exception as e:
+            self._fail(stage, e)
+        finally:
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            # the last worker out closes the stream for the next stage
+            if last:
+                self._put(outbox, _END, self._halt)
+
+    def _build_one(self, record: EmailRecord) -> Optional[EMAIL]:
+        try:
+            email = self.build(record)
+        except Exception as e:
+            # one bad record (missing template variable ...) must not stop the run
+            self.logger.error(f"could not build the email for {record.email} : {e}\n")
+            email = None
+        if email is None:
+            self._count("invalid")
+            return None
+        self._count("built")
+        return email
+
+    def _validate_one(self, email: EMAIL) -> Optional[EMAIL]:
+        try:
+            valid = self.sender.validate_email_structure(email)
+        except Exception as e:
+            self.logger.error(f"could not validate the email for {email.to} : {e}\n")
+            valid = False
+        self._count("valid" if valid else "invalid")
+        return email if valid else None
+
+    def _send(self, inbox: queue.Queue, outbox: queue.Queue) -> None:
+        try:
+            # send_batch already bounds the in flight window , reserves the quota
+            # and parks transient failures in the retry queue , a dry run is the
+            # same path on a sender with the null transport
+            results = self.sender.send_batch(
+                self._drain(inbox),
+                concurrency=self.concurrency,
+                scheduler=self.scheduler,
+                throttle=self.throttle,
+                max_quota_wait=self.max_quota_wait,
+            )
+            for result in results:
+                if not self._put(outbox, result, self._abort):
+                    return
+        except Exception as e:
+            self._fail("send", e)
+        finally:
+            # a rate limit ends the campaign early , nothing upstream is needed
+            self._halt.set()
+            self._put(outbox, _END, self._abort)
+
+    def _write_back(self, inbox: queue.Queue, status_writer: BufferedStatusWriter) -> None:
+        while True:
+            item = self._get(inbox, self._abort)
+            if item is _END:
+                return
+            email, success = item
+            if success:
+                with self._stats_lock:
+                    self.stats.sent += 1
+                    if self.stats.first_sent_after is None:
+                        self.stats.first_sent_after = time.monotonic() - self._started
+                status_writer.add(email.to, EmailStatus.SUCCESS.value)
+            elif email.status is EmailStatus.PENDING:
+                self._count("held")
+            else:
+                self._count("failed")
+                status_writer.add(email.to, EmailStatus.FAILED.value)
+
+    # ============================================================================
+    # RUN
+    # ============================================================================
+    def run(self) -> PipelineStats:
+        if self.status_writer is not None:
+            return self._run(self.status_writer)
+        with BufferedStatusWriter(self.database) as status_writer:
+            return self._run(status_writer)
+
+    def _run(self, status_writer: BufferedStatusWriter) -> PipelineStats:
+        self._started = time.monotonic()
+        records: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        built: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        valid: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        results: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        for name, waiting in (("records", records), ("built", built), ("valid", valid), ("results", results)):
+            QUEUE_DEPTH.labels(name).set_function(waiting.qsize)
+
+        threads = [threading.Thread(target=self._load, args=(records,), name="pipeline-load")]
+        for stage, handle, inbox, outbox, workers in (
+            ("build", self._build_one, records, built, self.build_workers),
+            ("validate", self._validate_one, built, valid, self.validate_workers),
+        ):
+            remaining, lock = [workers], threading.Lock()
+            threads.extend(
+                threading.Thread(
+                    target=self._worker,
+                    args=(stage, handle, inbox, outbox, remaining, lock),
+                    name=f"pipeline-{stage}-{i}",
+                )
+                for i in range(workers)
+            )
+        threads.append(
+            threading.Thread(target=self._send, args=(valid, results), name="pipeline-send")
+        )
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        # the calling thread is the write back stage
+        try:
+            self._write_back(results, status_writer)
+        except Exception as e:
+            self._fail("write back", e)
+            self._abort.set()
+        finally:
+            for thread in threads:
+                thread.join()
+        self.stats.elapsed = time.monotonic() - self._started
+
+        self.logger.info(
+            f"pipeline done in {self.stats.elapsed:.1f}s - loaded : {self.stats.loaded} | "
+            f"valid : {self.stats.valid} | invalid : {self.stats.invalid} | "
+            f"sent : {self.stats.sent} | failed : {self.stats.failed}\n"
+        )
+        if self._error is not None:
+            raise self._error
+        return self.stats
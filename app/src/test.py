@@ -2,13 +2,23 @@ from __future__ import annotations
 import datetime
 import logging
 import sys
-from typing import List
+from typing import List, Optional
 
 
 # class imports
+from app.LocalDatabase.scheduled_emails import ScheduledEmailDaemon
+from app.LocalDatabase.scheduler_state import SchedulerStateStore
 from app.Mailer.sender import EMAIL, EmailPriority, EmailSender, EmailStatus
+from app.Mailer.transport import NULL
+from app.Mailer.template_engine import EmailTemplateEngine
+from app.scheduler.pacing import PacingDispatcher
 from app.scheduler.scheduler import EmailScheduler
+from app.scheduler.send_plan import SendPlan, plan_for_scheduler
+from app.src.pipeline import CampaignPipeline, PipelineStats
+from app.supabase.status_writer import BufferedStatusWriter
 from app.supabase.supabaseClient import DatabaseOperation, EmailRecord
+from configuration.config import loading_optional_env_variable
+from utils.metrics import REGISTRY
 
 """
 LOGGIN SETUP
@@ -49,12 +59,15 @@ def check_health() -> DatabaseOperation | None:
         raise
 
 
-def run_scheduler_check() -> EmailScheduler | None:
+def run_scheduler_check(persist_state: bool = False) -> EmailScheduler | None:
     logger.info("=" * 60)
     logger.info("step two : scheduer readiness check")
     logger.info("=" * 60)
     try:
-        scheduler = EmailScheduler()
+        # a real run picks up the hour / day counts of the previous runs , a dry
+        # run never touches the saved quota
+        state_store = SchedulerStateStore() if persist_state else None
+        scheduler = EmailScheduler(state_store=state_store)
         # checking buisness hours :
         is_buisness_hours = scheduler.checking_buisness_hours()
         if is_buisness_hours:
@@ -96,6 +109,23 @@ def load_recipients(database: DatabaseOperation) -> List[str]:
 
 
 # building the email object :
+def build_test_email(recipient: str) -> EMAIL:
+    return EMAIL(
+        to=recipient,
+        subject="test email forwarder",
+        body=(
+            "Hello,\n\n"
+            "This is an automated integration test from the mail forwarder pipeline.\n"
+            "If you received this, all three components (DB / Scheduler / Mailer) "
+            "are communicating correctly.\n\n"
+            "Best regards."
+        ),
+        priority=EmailPriority.NORMAL,
+        status=EmailStatus.PENDING,
+        created_at=datetime.datetime.now().isoformat(),
+    )
+
+
 def building_email_object(recipients: list[str]) -> list[EMAIL]:
     logger.info("=" * 60)
     logger.info("step three : loading emails")
@@ -103,22 +133,31 @@ def building_email_object(recipients: list[str]) -> list[EMAIL]:
 
     emails: list[EMAIL] = []
     for recipent in recipients:
-        email_object = EMAIL(
-            to=recipent,
-            subject="test email forwarder",
-            body=(
-                "Hello,\n\n"
-                "This is an automated integration test from the mail forwarder pipeline.\n"
-                "If you received this, all three components (DB / Scheduler / Mailer) "
-                "are communicating correctly.\n\n"
-                "Best regards."
-            ),
+        emails.append(build_test_email(recipent))
+        logger.info(f"Built email object for {recipent}")
+    logger.info(f"\n total emails built : {len(emails)} \n")
+    return emails
+
+
+# personalised variant : subject / body rendered from each EmailRecord
+def building_personalised_email_objects(
+    records: List[EmailRecord],
+    engine: EmailTemplateEngine,
+    template_name: str,
+) -> list[EMAIL]:
+    logger.info("=" * 60)
+    logger.info("step three : building personalised emails")
+    logger.info("=" * 60)
+    created_at = datetime.datetime.now().isoformat()
+    emails = list(
+        engine.build_emails(
+            template_name,
+            records,
             priority=EmailPriority.NORMAL,
             status=EmailStatus.PENDING,
-            created_at=datetime.datetime.now().isoformat(),
+            created_at=created_at,
         )
-        emails.append(email_object)
-        logger.info(f"Built email object for {recipent}")
+    )
     logger.info(f"\n total emails built : {len(emails)} \n")
     return emails
 
@@ -147,6 +186,19 @@ def queue_and_validate(sender: EmailSender, emails: list[EMAIL]):
     return valid_emails, invalid_emails
 
 
+# a dry run goes through the same send path , on a transport that delivers nothing
+def make_sender(dry_run) -> EmailSender:
+    return EmailSender(transport=NULL if dry_run else None)
+
+
+def check_dry_run(sender: EmailSender, dry_run) -> None:
+    if dry_run and sender.transport.delivers:
+        raise ValueError(
+            f"dry run requested on the {sender.transport.name} transport , "
+            "build the sender with make_sender(dry_run=True)\n"
+        )
+
+
 # sending the mail :
 def send_mails(
     sender: EmailSender,
@@ -154,6 +206,31 @@ def send_mails(
     valid_emails: list[EMAIL],
     database: DatabaseOperation,
     dry_run,
+    concurrency: int = 1,
+    group_recipients: int = 0,
+):
+    check_dry_run(sender, dry_run)
+    # statuses are written back in bulk , flushed on size / time and on the way out
+    with BufferedStatusWriter(database) as status_writer:
+        return _send_mails(
+            sender,
+            scheduler,
+            valid_emails,
+            status_writer,
+            dry_run,
+            concurrency,
+            group_recipients,
+        )
+
+
+def _send_mails(
+    sender: EmailSender,
+    scheduler: EmailScheduler,
+    valid_emails: list[EMAIL],
+    status_writer: BufferedStatusWriter,
+    dry_run,
+    concurrency: int = 1,
+    group_recipients: int = 0,
 ):
     logger.info("=" * 60)
     logger.info("step three : queue and validate")
@@ -161,42 +238,109 @@ def send_mails(
 
     sent_count: int = 0
     failed_count: int = 0
+    if concurrency > 1:
+        # concurrent path : no human-like pacing , throughput bound by the smtp pool
+        for email_obj, success in sender.send_batch(
+            valid_emails, concurrency=concurrency, scheduler=scheduler
+        ):
+            if success:
+                sent_count += 1
+                status_writer.add(email_obj.to, EmailStatus.SUCCESS.value)
+            elif email_obj.status != EmailStatus.PENDING:
+                # pending : held back by the quota , left for the next run
+                failed_count += 1
+                status_writer.add(email_obj.to, EmailStatus.FAILED.value)
+        logger.info(f"\n sent : {sent_count} | failed : {failed_count} \n")
+        return sent_count, failed_count
+
+    if group_recipients > 0:
+        # identical campaign messages share one smtp transaction per chunk
+        for email_obj, success in sender.send_grouped(
+            valid_emails, max_recipients=group_recipients, scheduler=scheduler
+        ):
+            if success:
+                sent_count += 1
+                status_writer.add(email_obj.to, EmailStatus.SUCCESS.value)
+            elif email_obj.status not in (EmailStatus.RETRYING, EmailStatus.PENDING):
+                # pending : held back by the quota , left for the next run
+                failed_count += 1
+                status_writer.add(email_obj.to, EmailStatus.FAILED.value)
+        valid_emails = []
+
+    # human like pacing only matters when the mail really goes out , the
+    # dispatcher sleeps once before each send and never after the last one
+    pacing = PacingDispatcher(interval=(lambda lane: 0) if dry_run else None)
+    lane = sender.email_user or sender.transport.user
     for email_obj in valid_emails:
+        pacing.add(lane, email_obj)
+
+    for _, email_obj in pacing.drain():
         # first guard : the hours :
         hourly_ok, hourly_msg = scheduler.check_hourly_email_rate_limit()
         if not hourly_ok:
-            logger.warning(f"Hourly limit hit - stopping the program {hourly_msg}")
+            logger.warning(
+                f"Hourly limit hit - stopping the program , next permit in "
+                f"{scheduler.time_until_next_permit():.0f}s {hourly_msg}"
+            )
             break
         # second guard the daily quota
         daily_ok, daily_msg = scheduler.check_daily_email_rate_limit()
         if not daily_ok:
             logger.warning(f"Daily limit hit - exiting the program : {daily_msg}")
             break
-        if dry_run:
-            logger.info(f"dry run : would send to {email_obj.to}")
-            email_obj.status = EmailStatus.SUCCESS
-            email_obj.sent_at = datetime.datetime.now().strftime("%H:%M:%S")
+        # third guard : gmail is rejecting us , the rest stays pending for the next run
+        transport_ok, transport_msg = scheduler.check_transport_available()
+        if not transport_ok:
+            logger.warning(f"SMTP transport down - stopping the program : {transport_msg}")
+            break
+        success = sender.send_single_email(email_obj)
+        if success:
             sent_count += 1
+            scheduler.increment_counters()
+            status_writer.add(email_obj.to, EmailStatus.SUCCESS.value)
+        elif email_obj.status == EmailStatus.RETRYING:
+            # transient failure , it is resent below once its backoff expires
+            logger.info(f"deferred {email_obj.to} : {email_obj.error_message}")
+        else:
+            failed_count += 1
+            status_writer.add(email_obj.to, EmailStatus.FAILED.value)
 
-            database.update_email_status(email_obj.to, EmailStatus.SUCCESS.value)
-            scheduler.email_sent_during_a_day += 1
-            scheduler.email_sent_during_an_hour += 1
+    for email_obj, success in sender.drain_retries(scheduler):
+        if success:
+            sent_count += 1
+            status_writer.add(email_obj.to, EmailStatus.SUCCESS.value)
         else:
-            success = sender.send_single_email(email_obj)
-            if success:
-                sent_count += 1
-                scheduler.email_sent_during_an_hour += 1
-                scheduler.email_sent_during_a_day += 1
-                database.update_email_status(email_obj.to, EmailStatus.SUCCESS.value)
-            else:
-                failed_count += 1
-                database.update_email_status(email_obj.to, EmailStatus.FAILED.value)
-            if len(valid_emails) > 1:
-                scheduler.random_email_interval_between_delivery()
+            failed_count += 1
+            status_writer.add(email_obj.to, EmailStatus.FAILED.value)
     logger.info(f"\n sent : {sent_count} | failed : {failed_count} \n")
     return sent_count, failed_count
 
 
+# streaming variant (opt in , streaming=True) : the stages above run side by side
+# over bounded queues , the contact table is paged in so memory does not grow
+# with the list , sends only wait on the scheduler limits , there is no human
+# like pause between them as in send_mails
+def stream_campaign(
+    sender: EmailSender,
+    scheduler: EmailScheduler,
+    database: DatabaseOperation,
+    dry_run,
+    concurrency: int = 4,
+) -> PipelineStats:
+    logger.info("=" * 60)
+    logger.info("step three : streaming the campaign")
+    logger.info("=" * 60)
+    check_dry_run(sender, dry_run)
+    pipeline = CampaignPipeline(
+        database,
+        sender,
+        build=lambda record: build_test_email(record.email),
+        scheduler=scheduler,
+        concurrency=concurrency,
+    )
+    return pipeline.run()
+
+
 def print_summary(
     total_recipients: int,
     total_valid: int,
@@ -215,8 +359,96 @@ def print_summary(
     logger.info("=" * 60 + "\n")
 
 
+def print_latency_summary():
+    # percentiles estimated from the histogram buckets , same as prometheus does
+    for metric_name, title in (
+        ("mailer_transport_seconds", "transport"),
+        ("supabase_request_seconds", "database"),
+    ):
+        metric = REGISTRY.get(metric_name)
+        if metric is None:
+            continue
+        for (label,), series in metric.series():
+            if series.count:
+                logger.info(
+                    f"  {title} {label:<24} : {series.count} call(s) | "
+                    f"p50 {series.quantile(0.5) * 1000:.1f}ms | p99 {series.quantile(0.99) * 1000:.1f}ms"
+                )
+
+
+def schedule_campaign(dry_run: bool = True) -> SendPlan:
+    """
+    plan the whole campaign up front and write it to scheduled_emails , the
+    daemon (run_scheduled_daemon) then sends every email at its planned time
+    """
+    db = check_health()
+    scheduler = run_scheduler_check(persist_state=not dry_run)
+    if db is None or scheduler is None:
+        logger.critical("Cannot plan the campaign without the database and the scheduler")
+        sys.exit(1)
+    recipients = load_recipients(db)
+    emails = building_email_object(recipients)
+    plan = plan_for_scheduler(scheduler, len(emails))
+    logger.info(plan.summary())
+    for day, count in plan.per_day().items():
+        logger.info(f"  {day:%a %Y-%m-%d} : {count} email(s)")
+    # write side only , run_scheduled_daemon does the sending
+    daemon = ScheduledEmailDaemon()
+    daemon.init_table()
+    daemon.schedule_many(plan.assign((email.to, email.subject, email.body) for email in emails))
+    return plan
+
+
+def run_scheduled_daemon(dry_run: bool = True) -> ScheduledEmailDaemon:
+    """
+    foreground loop over the scheduled_emails table , every row goes out at its
+    send_at through the same sender and rate limits as a campaign , ctrl-c stops
+    """
+    scheduler = run_scheduler_check(persist_state=not dry_run)
+    if scheduler is None:
+        logger.critical("No working scheduler - terminating")
+        sys.exit(1)
+    sender = make_sender(dry_run)
+    scheduler.attach_circuit_breaker(sender.breaker)
+    # the daemon owns the retries : a transient failure comes back as RETRYING
+    # and the row is rescheduled , nothing is parked in the sender's queue
+    daemon = ScheduledEmailDaemon(
+        lambda email: sender.send_single_email(email, defer_retry=False), scheduler=scheduler
+    )
+    daemon.init_table()
+    try:
+        daemon.run_forever()
+    except KeyboardInterrupt:
+        logger.info("scheduled email daemon interrupted")
+    finally:
+        sender.close()
+        scheduler.checkpoint()
+    return daemon
+
+
 # main entry point
-def main(dry_run: bool = True):
+def main(
+    dry_run: bool = True,
+    streaming: bool = False,
+    metrics_port: Optional[int] = None,
+    metrics_file: Optional[str] = None,
+):
+    # /metrics for a prometheus scrape while the run lasts , a textfile at the end
+    metrics_port = metrics_port or int(loading_optional_env_variable("METRICS_PORT") or 0)
+    metrics_file = metrics_file or loading_optional_env_variable("METRICS_FILE")
+    server = REGISTRY.serve(metrics_port) if metrics_port else None
+    try:
+        run_campaign(dry_run=dry_run, streaming=streaming)
+    finally:
+        print_latency_summary()
+        if metrics_file:
+            REGISTRY.write_to_file(metrics_file)
+            logger.info(f"metrics written to {metrics_file}")
+        if server is not None:
+            server.shutdown()
+
+
+def run_campaign(dry_run: bool = True, streaming: bool = False):
     logger.info("MAIL forwarder - stress testing")
     # database :
     db = check_health()
@@ -224,11 +456,29 @@ def main(dry_run: bool = True):
         logger.critical("Cannot proceede without health check of the database")
         sys.exit(1)
 
-    scheduler = run_scheduler_check()
+    scheduler = run_scheduler_check(persist_state=not dry_run)
     if scheduler is None:
         logger.critical("No working scheduler - terminating")
         sys.exit(1)
 
+    if streaming:
+        try:
+            sender = make_sender(dry_run)
+        except Exception as e:
+            logger.critical(f"sender could not be initialized : {e}\n")
+            sys.exit(1)
+        scheduler.attach_circuit_breaker(sender.breaker)
+        stats = stream_campaign(sender=sender, scheduler=scheduler, database=db, dry_run=dry_run)
+        scheduler.checkpoint()
+        print_summary(
+            total_recipients=stats.loaded,
+            total_valid=stats.valid,
+            total_invalid=stats.invalid,
+            sent=stats.sent,
+            failed=stats.failed,
+        )
+        return
+
     recipients = load_recipients(db)
     if not recipients:
         logger.warning("No recipients to process - exiting")
@@ -237,10 +487,11 @@ def main(dry_run: bool = True):
     Emails = building_email_object(recipients)
 
     try:
-        sender = EmailSender()
+        sender = make_sender(dry_run)
     except Exception as e:
         logger.critical(f"sender could not be initialized : {e}\n")
         sys.exit(1)
+    scheduler.attach_circuit_breaker(sender.breaker)
     valid_emails, invalid_emails = queue_and_validate(sender, Emails)
     if not valid_emails:
         logger.warning("No valid email have been found")
@@ -253,6 +504,7 @@ def main(dry_run: bool = True):
         database=db,
         dry_run=dry_run,
     )
+    scheduler.checkpoint()
     # Summary
     print_summary(
         total_recipients=len(recipients),
@@ -0,0 +1,113 @@
+import pytest
+from unittest.mock import MagicMock
+
+from app.Mailer.benchmark import make_sender
+from app.Mailer.sender import EMAIL, EmailSender
+from app.Mailer.smtp_sink import SMTPSink
+from app.Mailer.transport import NULL
+from app.src.pipeline import CampaignPipeline
+from app.supabase.supabaseClient import EmailRecord
+
+
+class FakeDatabase:
+    def __init__(self, count, fail_after=None):
+        self.count = count
+        self.fail_after = fail_after
+        self.yielded = 0
+
+    def fetch_records_paginated(self, page_size=1000, status=None):
+        for i in range(self.count):
+            if self.fail_after is not None and i == self.fail_after:
+                raise RuntimeError("supabase went away")
+            self.yielded += 1
+            yield EmailRecord(email=f"user{i}@example.com", full_name=f"user {i}")
+
+
+class FakeScheduler:
+    def __init__(self, quota):
+        self.quota = quota
+
+    def remaining_quota(self):
+        return self.quota
+
+    def increment_counters(self):
+        self.quota -= 1
+
+
+def build(record):
+    return EMAIL(to=record.email, subject="hello", body=f"hi {record.full_name}")
+
+
+@pytest.fixture
+def null_sender():
+    sender = EmailSender("me@example.com", "secret", enable_loggin=False, transport=NULL)
+    yield sender
+    sender.close()
+
+
+@pytest.fixture
+def sink():
+    with SMTPSink(enable_loggin=False) as running:
+        yield running
+
+
+def make_pipeline(database, sender=None, **kwargs):
+    kwargs.setdefault("status_writer", MagicMock())
+    kwargs.setdefault("build", build)
+    return CampaignPipeline(database, sender, enable_loggin=False, **kwargs)
+
+
+class TestCampaignPipeline:
+    def test_streams_every_record_to_the_server(self, sink):
+        sender = make_sender(sink, 4)
+        writer = MagicMock()
+        try:
+            stats = make_pipeline(
+                FakeDatabase(50), sender, status_writer=writer, concurrency=4, queue_size=8
+            ).run()
+        finally:
+            sender.close()
+
+        assert (stats.loaded, stats.valid, stats.sent, stats.failed) == (50, 50, 50, 0)
+        assert sink.stats.messages == 50
+        assert writer.add.call_count == 50
+        assert {call.args[1] for call in writer.add.call_args_list} == {"success"}
+        assert stats.first_sent_after is not None
+
+    def test_invalid_and_broken_records_are_skipped(self, null_sender):
+        def flaky_build(record):
+            index = int(record.email[4:].split("@")[0])
+            if index % 3 == 0:
+                raise KeyError("full_name")
+            if index % 3 == 1:
+                return EMAIL(to=record.email, subject="", body="no subject")
+            return build(record)
+
+        stats = make_pipeline(
+            FakeDatabase(9), null_sender, build=flaky_build, build_workers=3
+        ).run()
+
+        assert (stats.loaded, stats.built, stats.valid, stats.invalid) == (9, 6, 3, 6)
+        assert stats.sent == 3
+
+    def test_quota_stops_the_loader(self, null_sender):
+        database = FakeDatabase(100_000)
+        stats = make_pipeline(
+            database, null_sender, scheduler=FakeScheduler(5), queue_size=10
+        ).run()
+
+        assert stats.sent == 5
+        # bounded queues : only a few queues worth of rows were ever pulled
+        assert database.yielded < 100
+
+    def test_loader_failure_is_raised(self, null_sender):
+        pipeline = make_pipeline(FakeDatabase(10, fail_after=4), null_sender)
+        with pytest.raises(RuntimeError, match="supabase went away"):
+            pipeline.run()
+        assert pipeline.stats.sent == 4
+
+    def test_null_transport_delivers_nothing(self, null_sender):
+        stats = make_pipeline(FakeDatabase(20), null_sender, concurrency=8).run()
+        assert stats.sent == 20
+        assert null_sender.transport.messages == 20
+        assert not null_sender.transport.delivers
@@ -0,0 +1,184 @@
+from __future__ import annotations
+import atexit
+import json
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from app.LocalDatabase.database import DATABASE_PATH
+from app.supabase.supabaseClient import DatabaseOperation
+
+"""
+buffered status write back : send results are collected in memory and pushed
+to supabase in bulk , one request per status and chunk instead of one per email
+"""
+
+# next to the local sqlite files , not wherever the process was started from
+DEFAULT_SPILL_PATH = Path(DATABASE_PATH).parent / "status_spill.jsonl"
+
+
+@dataclass
+class StatusUpdate:
+    email: str
+    status: str
+    last_contacted_at: str
+
+
+class BufferedStatusWriter:
+    def __init__(
+        self,
+        database: DatabaseOperation,
+        max_batch: int = 200,
+        flush_interval: float = 5.0,
+        spill_path: Union[str, Path] = DEFAULT_SPILL_PATH,
+        enable_loggin: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.database = database
+        # flush as soon as this many updates are waiting ...
+        self.max_batch = max_batch
+        # ... or when the oldest one has waited this long
+        self.flush_interval = flush_interval
+        # updates that could not be written are appended here for a later replay
+        self.spill_path = Path(spill_path)
+        self.clock = clock
+        self.logger = logging.getLogger(__name__)
+        if not enable_loggin:
+            self.logger.setLevel(logging.CRITICAL + 1)
+
+        self._buffer: List[StatusUpdate] = []
+        self._oldest: Optional[float] = None
+        self._lock = threading.Lock()
+        # only one flush talks to supabase at a time
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.flushed = 0
+        self.spilled = 0
+
+    # ============================================================================
+    # LIFECYCLE
+    # ============================================================================
+    def start(self) -> BufferedStatusWriter:
+        # background timer so a slow trickle of sends still gets written
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="status-writer", daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.close)
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval / 2):
+            if self._due():
+                self.flush()
+
+    def close(self) -> None:
+        # flush on shutdown , whatever is left goes to the database or the spill file
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+            atexit.unregister(self.close)
+        self.flush()
+
+    def __enter__(self) -> BufferedStatusWriter:
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ============================================================================
+    # BUFFER
+    # ============================================================================
+    def add(self, email: str, status: str, last_contacted_at: Optional[str] = None) -> None:
+        update = StatusUpdate(email, status, last_contacted_at or self.database.get_timestamps())
+        with self._lock:
+            self._buffer.append(update)
+            if self._oldest is None:
+                self._oldest = self.clock()
+            full = len(self._buffer) >= self.max_batch
+        if full:
+            self.flush()
+
+    def _due(self) -> bool:
+        with self._lock:
+            return self._oldest is not None and self.clock() - self._oldest >= self.flush_interval
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._buffer)
+
+    # ============================================================================
+    # FLUSH
+    # ============================================================================
+    @staticmethod
+    def _group(updates: List[StatusUpdate]) -> Dict[Tuple[str, str], List[str]]:
+        # last update per address wins , then one group per status stamped with
+        # the newest contact time of the group : a flush spans at most
+        # flush_interval , grouping on the exact second would give one request
+        # per email as soon as the sends are paced
+        latest: Dict[str, StatusUpdate] = {}
+        for update in updates:
+            latest[update.email] = update
+        stamps: Dict[str, str] = {}
+        emails: Dict[str, List[str]] = {}
+        for update in latest.values():
+            stamps[update.status] = max(stamps.get(update.status, ""), update.last_contacted_at)
+            emails.setdefault(update.status, []).append(update.email)
+        return {(status, stamps[status]): group for status, group in emails.items()}
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                updates, self._buffer = self._buffer, []
+                self._oldest = None
+            if not updates:
+                return 0
+            written = 0
+            for (status, contacted), emails in self._group(updates).items():
+                try:
+                    self.database.update_email_status_bulk(emails, status, contacted)
+                    written += len(emails)
+                except Exception as e:
+                    self.logger.error(
+                        f"bulk status update failed for {len(emails)} email(s) , spilling to {self.spill_path} : {e}\n"
+                    )
+                    self._spill([StatusUpdate(email, status, contacted) for email in emails])
+            self.flushed += written
+            return written
+
+    def _spill(self, updates: List[StatusUpdate]) -> None:
+        try:
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.spill_path.open("a", encoding="utf-8") as handle:
+                for update in updates:
+                    handle.write(json.dumps(asdict(update)) + "\n")
+            self.spilled += len(updates)
+        except Exception as e:
+            # last resort , at least the log has them
+            self.logger.critical(f"could not write the spill file , lost updates {updates} : {e}\n")
+
+    def replay_spill(self) -> int:
+        """
+        push the spilled updates again , the replay copy is only removed after
+        the flush (whatever fails again is spilled to a fresh file)
+        """
+        if not self.spill_path.exists():
+            return 0
+        replay = self.spill_path.with_suffix(".replay")
+        self.spill_path.replace(replay)
+        with replay.open(encoding="utf-8") as handle:
+            for line in handle:
+                if line.strip():
+                    data = json.loads(line)
+                    with self._lock:
+                        self._buffer.append(StatusUpdate(**data))
+        written = self.flush()
+        replay.unlink()
+        return written
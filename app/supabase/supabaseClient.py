@@ -5,12 +5,14 @@ supabase integration
 from __future__ import annotations
 from dataclasses import asdict
 import datetime
-import re
+import functools
+from utils.valid_email_check import is_valid_email, validate_many
 from postgrest import CountMethod
 from realtime import dataclass
 from supabase import Client, create_client
 from configuration.config import loading_env_variables
-from typing import Any, Dict, List, Optional, Union
+from utils.metrics import REGISTRY
+from typing import Any, Dict, Iterator, List, Optional, Union
 import logging
 from enum import Enum
 
@@ -18,6 +20,29 @@ from enum import Enum
 url = loading_env_variables("PROJECT_URL") or ""
 key = loading_env_variables("ANON_PUBLIC_KEY") or ""
 
+# round trip of every supabase call , labelled by the DatabaseOperation method
+DB_SECONDS = REGISTRY.histogram(
+    "supabase_request_seconds", "DatabaseOperation round trip time", ("operation",)
+)
+DB_ERRORS = REGISTRY.counter(
+    "supabase_errors_total", "DatabaseOperation calls that raised", ("operation",)
+)
+
+
+def measured(method):
+    operation = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with DB_SECONDS.labels(operation).time():
+            try:
+                return method(*args, **kwargs)
+            except Exception:
+                DB_ERRORS.labels(operation).inc()
+                raise
+
+    return wrapper
+
 
 @dataclass
 class EmailRecord:
@@ -87,6 +112,7 @@ class DatabaseOperation:
     # ============================================================================
     # HEALTH CHECK METHODS
     # ============================================================================
+    @measured
     def check_health(self):
         timestamp = self.get_timestamps()
         try:
@@ -99,6 +125,7 @@ class DatabaseOperation:
             self.logger.error(f"could not chekc the database health cause : {e}\n")
             return False
 
+    @measured
     def get_latest_health_status(self):
         try:
             response_check = (
@@ -127,23 +154,21 @@ class DatabaseOperation:
     # ============================================================================
     # VALIDATION METHODS
     # ============================================================================
-    def valid_email_pattern(self, email: str) -> bool:
+    def valid_email_pattern(self, email: str, check_domain: bool = False) -> bool:
         if not email or not isinstance(email, str):
             self.logger.warning(
                 "email validation received a non-string or empty value\n"
             )
             return False
 
-        pattern = r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$"
-        if re.fullmatch(
-            pattern, email.strip()
-        ):  # .strip() handles accidental whitespace
-            self.logger.info(f"valid email: {email}\n")
+        # shared compiled + cached validator , .strip() is handled there
+        if is_valid_email(email, check_domain):
             return True
 
         self.logger.warning(f"invalid email structure: {email}\n")
         return False
 
+    @measured
     def checking_for_dupalicates(self, email: str) -> bool:
         try:
             duplicate = (
@@ -184,6 +209,7 @@ class DatabaseOperation:
     # ============================================================================
     # INSERT METHODS
     # ============================================================================
+    @measured
     def insert_email(self, record: EmailRecord):
         try:
             # chekc for valid email pattern
@@ -229,6 +255,7 @@ class DatabaseOperation:
             )
             raise RuntimeError
 
+    @measured
     def insert_emails_in_bulk(
         self, records: List[EmailRecord], skip_duplicate: bool = True
     ) -> Dict[str, Any]:
@@ -239,9 +266,11 @@ class DatabaseOperation:
             "inserted": 0,
             "total": len(records),
         }
+        # one batch pass over the addresses , a single summary log line
+        valid_addresses = set(validate_many(record.email for record in records).valid)
         for record in records:
             try:
-                if not self.valid_email_pattern(record.email):
+                if record.email not in valid_addresses:
                     stats["failed"] += 1
                     stats["error"].append(f"invalid format {record.email}")
                     continue
@@ -267,6 +296,7 @@ class DatabaseOperation:
     # ============================================================================
     # COUNT METHODS
     # ============================================================================
+    @measured
     def count_rows_in_database(self):
         try:
             rows = (
@@ -286,6 +316,7 @@ class DatabaseOperation:
     # ============================================================================
     # FETCH METHODS
     # ============================================================================
+    @measured
     def fetch_all_emails(self) -> List[str]:
         try:
             email_request = self.client.table(self.table_name).select("email").execute()
@@ -305,6 +336,7 @@ class DatabaseOperation:
             self.logger.error(f"Database fetch failed : {e}\n")
             raise RuntimeError(f"Failed to fetch all emails : {e}") from e
 
+    @measured
     def fetch_all_records(
         self, limit: Optional[int] = None, offset: int = 0
     ) -> List[EmailRecord]:
@@ -325,6 +357,47 @@ class DatabaseOperation:
             self.logger.error(f"error perfoming the fetch record function : {e}")
             raise
 
+    def fetch_records_paginated(
+        self,
+        page_size: int = 1000,
+        status: Optional[str] = None,
+        columns: str = "*",
+    ) -> Iterator[EmailRecord]:
+        """
+        stream the table one page at a time , keyset pagination on the email
+        column (email > last seen) so page n costs the same as page 1 where an
+        offset would rescan every skipped row , only one page is held in memory
+        """
+        if page_size < 1:
+            raise ValueError(f"page_size must be at least 1 got {page_size}\n")
+        last_email: Optional[str] = None
+        fetched = 0
+        while True:
+            try:
+                request = self.client.table(self.table_name).select(columns)
+                if status:
+                    request = request.eq("status", status)
+                if last_email is not None:
+                    request = request.gt("email", last_email)
+                # timed per page , the generator itself lives as long as the caller
+                with DB_SECONDS.labels("fetch_records_paginated").time():
+                    response = request.order("email").limit(page_size).execute()
+            except Exception as e:
+                DB_ERRORS.labels("fetch_records_paginated").inc()
+                self.logger.error(
+                    f"paginated fetch failed after {fetched} record(s) : {e}\n"
+                )
+                raise
+            rows = response.data or []
+            for row in rows:
+                yield EmailRecord.from_dict(row)
+            fetched += len(rows)
+            if len(rows) < page_size:
+                self.logger.info(f"paginated fetch done : {fetched} record(s)\n")
+                return
+            last_email = rows[-1]["email"]
+
+    @measured
     def fetch_email_by_status(self, status: str) -> List[EmailRecord]:
         try:
             request = (
@@ -348,6 +421,7 @@ class DatabaseOperation:
             )
             raise
 
+    @measured
     def fetch_by_category(self, category: str) -> List[EmailRecord]:
         try:
             category_request = (
@@ -397,6 +471,7 @@ class DatabaseOperation:
     # ============================================================================
     # UPDATE METHODS
     # ============================================================================
+    @measured
     def update_email_status(
         self, email: str, new_status: str
     ) -> Optional[Dict[str, Any]]:
@@ -421,9 +496,49 @@ class DatabaseOperation:
             )
             raise
 
+    @measured
+    def update_email_status_bulk(
+        self,
+        emails: List[str],
+        new_status: str,
+        last_contacted_at: Optional[str] = None,
+        chunk_size: int = 200,
+    ) -> int:
+        """
+        one request per chunk of addresses instead of one per email , the
+        chunk keeps the 'in' filter well under the url length limits
+        """
+        if not emails:
+            return 0
+        payload = {
+            "status": new_status,
+            "last_contacted_at": last_contacted_at or self.get_timestamps(),
+        }
+        updated = 0
+        try:
+            for start in range(0, len(emails), chunk_size):
+                chunk = emails[start : start + chunk_size]
+                update_request = (
+                    self.client.table(self.table_name)
+                    .update(payload)
+                    .in_("email", chunk)
+                    .execute()
+                )
+                updated += len(update_request.data or [])
+            self.logger.info(
+                f"status updated : {new_status} for {updated}/{len(emails)} email(s)\n"
+            )
+            return updated
+        except Exception as e:
+            self.logger.error(
+                f"failed to procced with the bulk update of the status , error : {e}\n"
+            )
+            raise
+
     # ============================================================================
     # DELETE METHODS
     # ============================================================================
+    @measured
     def delete_email(self, email: str) -> bool:
         try:
             delete_email_request = (
@@ -441,6 +556,7 @@ class DatabaseOperation:
             )
             raise
 
+    @measured
     def delete_email_by_status(self, status: str) -> Optional[Union[int, Any]]:
         try:
             delete_email_by_status_request = (
@@ -462,6 +578,7 @@ class DatabaseOperation:
             )
             raise
 
+    @measured
     def delete_email_by_category(self, category: str) -> Optional[Union[int, Any]]:
         try:
             delete_email_by_category = (
@@ -0,0 +1,108 @@
+import json
+import os
+import pytest
+from unittest.mock import MagicMock
+
+from app.supabase.status_writer import BufferedStatusWriter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def database():
+    database = MagicMock()
+    database.get_timestamps.return_value = "2026-01-01T10:00:00"
+    return database
+
+
+@pytest.fixture
+def writer(database, tmp_path):
+    return BufferedStatusWriter(
+        database,
+        max_batch=3,
+        flush_interval=5,
+        spill_path=tmp_path / "spill.jsonl",
+        enable_loggin=False,
+        clock=FakeClock(),
+    )
+
+
+class TestBufferedStatusWriter:
+    def test_flushes_when_the_batch_is_full(self, writer, database):
+        writer.add("a@x.com", "success")
+        writer.add("b@x.com", "success")
+        database.update_email_status_bulk.assert_not_called()
+        writer.add("c@x.com", "failed")
+
+        calls = {call.args[1]: call.args[0] for call in database.update_email_status_bulk.call_args_list}
+        assert calls == {"success": ["a@x.com", "b@x.com"], "failed": ["c@x.com"]}
+        assert writer.pending() == 0
+        assert writer.flushed == 3
+
+    def test_last_update_per_address_wins(self, writer, database):
+        writer.add("a@x.com", "retrying", "2026-01-01T10:00:00")
+        writer.add("a@x.com", "success", "2026-01-01T10:05:00")
+        writer.flush()
+
+        database.update_email_status_bulk.assert_called_once_with(
+            ["a@x.com"], "success", "2026-01-01T10:05:00"
+        )
+
+    def test_paced_sends_share_one_request_per_status(self, writer, database):
+        writer.max_batch = 100
+        for i in range(10):
+            writer.add(f"u{i}@x.com", "success", f"2026-01-01T10:00:{i:02d}")
+        writer.add("bad@x.com", "failed", "2026-01-01T10:00:03")
+        writer.flush()
+
+        # one request per status , not one per distinct second
+        assert database.update_email_status_bulk.call_count == 2
+        calls = {call.args[1]: call.args for call in database.update_email_status_bulk.call_args_list}
+        assert calls["success"] == (
+            [f"u{i}@x.com" for i in range(10)], "success", "2026-01-01T10:00:09"
+        )
+        assert calls["failed"] == (["bad@x.com"], "failed", "2026-01-01T10:00:03")
+
+    def test_default_spill_file_sits_with_the_local_database(self, database):
+        from app.LocalDatabase.database import DATABASE_PATH
+
+        writer = BufferedStatusWriter(database, enable_loggin=False)
+        assert str(writer.spill_path.parent) == os.path.dirname(DATABASE_PATH)
+
+    def test_time_threshold(self, writer):
+        writer.add("a@x.com", "success")
+        assert not writer._due()
+        writer.clock.now = 5
+        assert writer._due()
+
+    def test_close_flushes_the_rest(self, writer, database):
+        writer.start()
+        writer.add("a@x.com", "success")
+        writer.close()
+        database.update_email_status_bulk.assert_called_once()
+        assert writer.pending() == 0
+
+    def test_failure_spills_and_replays(self, writer, database):
+        database.update_email_status_bulk.side_effect = RuntimeError("supabase down")
+        writer.add("a@x.com", "success")
+        writer.add("b@x.com", "failed")
+        writer.flush()
+
+        lines = [json.loads(line) for line in writer.spill_path.read_text().splitlines()]
+        assert {line["email"] for line in lines} == {"a@x.com", "b@x.com"}
+        assert writer.spilled == 2
+
+        database.update_email_status_bulk.side_effect = None
+        database.update_email_status_bulk.reset_mock()
+        assert writer.replay_spill() == 2
+        assert database.update_email_status_bulk.call_count == 2
+        assert not writer.spill_path.exists()
+
+    def test_replay_without_spill_file(self, writer):
+        assert writer.replay_spill() == 0
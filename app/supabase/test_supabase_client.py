@@ -278,6 +278,21 @@ class TestRead:
         mock_request.limit.assert_called_with(10)
         mock_request.limit.return_value.offset.assert_called_with(5)
 
+    def test_fetch_records_paginated_uses_keyset(self, mock_supabase_client, database):
+        first, second = Mock(), Mock()
+        first.data = [{"email": "a@example.com"}, {"email": "b@example.com"}]
+        second.data = [{"email": "c@example.com"}]
+        request = MagicMock()
+        mock_supabase_client.table.return_value.select.return_value = request
+        request.gt.return_value = request
+        request.order.return_value.limit.return_value.execute.side_effect = [first, second]
+
+        result = [record.email for record in database.fetch_records_paginated(page_size=2)]
+
+        assert result == ["a@example.com", "b@example.com", "c@example.com"]
+        request.gt.assert_called_once_with("email", "b@example.com")
+        request.order.assert_called_with("email")
+
     def test_fetch_by_status(self, mock_supabase_client, database):
         mock_response = Mock()
         mock_response.data = [
@@ -368,6 +383,40 @@ class TestUpdate:
         resutl = database.update_email_status("nonexistent@example.com", "completed")
         assert resutl is None
 
+    def test_update_email_status_bulk_is_chunked(self, database, mock_supabase_client):
+        mock_response = Mock()
+        mock_response.data = [{"email": "x"}, {"email": "y"}]
+        update = mock_supabase_client.table.return_value.update
+        update.return_value.in_.return_value.execute.return_value = mock_response
+        emails = [f"user{i}@example.com" for i in range(5)]
+
+        result = database.update_email_status_bulk(
+            emails, EmailStatus.SUCCESS.value, "2026-01-01T10:00:00", chunk_size=2
+        )
+
+        assert result == 6
+        assert update.return_value.in_.call_count == 3
+        update.assert_called_with(
+            {"status": "success", "last_contacted_at": "2026-01-01T10:00:00"}
+        )
+
+    def test_calls_are_timed_and_errors_counted(self, database, mock_supabase_client):
+        from app.supabase.supabaseClient import DB_ERRORS, DB_SECONDS
+
+        timed = DB_SECONDS.labels("update_email_status")
+        errors = DB_ERRORS.labels("update_email_status")
+        before = (timed.count, errors.value)
+        mock_supabase_client.table.side_effect = RuntimeError("timeout")
+
+        with pytest.raises(RuntimeError):
+            database.update_email_status("a@example.com", "success")
+
+        assert (timed.count, errors.value) == (before[0] + 1, before[1] + 1)
+
+    def test_update_email_status_bulk_empty(self, database, mock_supabase_client):
+        assert database.update_email_status_bulk([], "success") == 0
+        mock_supabase_client.table.assert_not_called()
+
 
 class TestDelete:
     def test_delete_email(self, database, mock_supabase_client):
@@ -32,3 +32,11 @@ def loading_env_variables(variable: str):
         print(
             f"failed to load the variables from the env file please check the console : {e}"
         )
+
+
+def loading_optional_env_variable(variable: str):
+    # same as above but a missing variable is expected (numbered accounts ...)
+    env_path = find_dotenv()
+    if env_path:
+        load_dotenv(env_path)
+    return os.getenv(variable) or None
@@ -0,0 +1,134 @@
+import threading
+import urllib.request
+
+import pytest
+
+from app.Mailer.sender import EMAIL, EmailSender
+from app.Mailer.transport import NULL
+from app.scheduler.scheduler import EmailScheduler
+from utils.metrics import REGISTRY, MetricsRegistry
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry(enable_loggin=False)
+
+
+class TestMetrics:
+    def test_counter_and_gauge_render(self, registry):
+        sends = registry.counter("sends_total", "sends", ("result",))
+        sends.labels("sent").inc()
+        sends.labels(result="sent").inc(2)
+        sends.labels("failed").inc()
+        depth = registry.gauge("depth", "queue depth")
+        depth.set(4)
+        depth.dec()
+
+        text = registry.render()
+        assert "# TYPE sends_total counter" in text
+        assert 'sends_total{result="sent"} 3.0' in text
+        assert 'sends_total{result="failed"} 1.0' in text
+        assert "depth 3.0" in text
+
+    def test_counter_cannot_go_down(self, registry):
+        with pytest.raises(ValueError):
+            registry.counter("c_total", "c").inc(-1)
+
+    def test_label_values_are_escaped(self, registry):
+        registry.counter("odd_total", "odd", ("value",)).labels('a "b"\nc').inc()
+        assert r'odd_total{value="a \"b\"\nc"} 1.0' in registry.render()
+
+    def test_histogram_buckets_are_cumulative(self, registry):
+        latency = registry.histogram("latency_seconds", "latency", buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            latency.observe(value)
+
+        text = registry.render()
+        assert 'latency_seconds_bucket{le="0.1"} 2' in text
+        assert 'latency_seconds_bucket{le="1.0"} 3' in text
+        assert 'latency_seconds_bucket{le="+Inf"} 4' in text
+        assert "latency_seconds_count 4" in text
+        assert "latency_seconds_sum 3.65" in text
+
+    def test_histogram_quantile(self, registry):
+        latency = registry.histogram("q_seconds", "latency", buckets=(1.0, 2.0, 4.0))
+        for _ in range(50):
+            latency.observe(0.5)
+        for _ in range(50):
+            latency.observe(3.0)
+        assert latency.quantile(0.5) == pytest.approx(1.0)
+        assert latency.quantile(0.75) == pytest.approx(3.0)
+
+    def test_same_name_returns_the_same_metric(self, registry):
+        assert registry.counter("x_total", "x") is registry.counter("x_total", "x")
+        with pytest.raises(ValueError):
+            registry.gauge("x_total", "x")
+
+    def test_concurrent_increments_are_not_lost(self, registry):
+        counter = registry.counter("threads_total", "t")
+
+        def work():
+            for _ in range(10000):
+                counter.inc()
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert counter.labels().value == 80000
+
+    def test_write_to_file(self, registry, tmp_path):
+        registry.gauge("up", "up").set(1)
+        path = registry.write_to_file(tmp_path / "textfile" / "mailer.prom")
+        assert "up 1.0" in path.read_text()
+        assert [p.name for p in path.parent.iterdir()] == ["mailer.prom"]
+
+    def test_http_endpoint(self, registry):
+        registry.gauge("up", "up").set(1)
+        server = registry.serve(port=0)
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            with urllib.request.urlopen(url, timeout=5) as response:
+                body = response.read().decode()
+                assert response.headers["Content-Type"].startswith("text/plain")
+        finally:
+            server.shutdown()
+        assert "up 1.0" in body
+
+
+class TestInstrumentation:
+    def test_sender_counts_outcomes_and_latency(self):
+        sender = EmailSender("me@example.com", "secret", enable_loggin=False, transport=NULL)
+        sent = REGISTRY.get("mailer_emails_total").labels("sent")
+        failed = REGISTRY.get("mailer_emails_total").labels("failed")
+        latency = REGISTRY.get("mailer_transport_seconds").labels(NULL)
+        before = (sent.value, failed.value, latency.count)
+
+        sender.send_single_email(EMAIL(to="you@example.com", subject="s", body="b"))
+        sender.send_single_email(EMAIL(to="not an address", subject="s", body="b"))
+
+        assert (sent.value, failed.value, latency.count) == (
+            before[0] + 1,
+            before[1] + 1,
+            before[2] + 1,
+        )
+
+    def test_scheduler_decisions(self):
+        scheduler = EmailScheduler(enable_loggin=False, max_email_an_hour=1)
+        denied = REGISTRY.get("scheduler_decisions_total").labels("hourly", "false")
+        before = denied.value
+        scheduler.increment_counters()
+        assert scheduler.check_hourly_email_rate_limit()[0] is False
+        assert denied.value == before + 1
+        assert REGISTRY.get("scheduler_sent_this_hour").labels("default").get() == 1
+
+    def test_sent_gauges_are_per_account(self):
+        first = EmailScheduler(enable_loggin=False, account="a@x.com")
+        second = EmailScheduler(enable_loggin=False, account="b@x.com")
+        first.increment_counters()
+        first.increment_counters()
+        second.increment_counters()
+        gauge = REGISTRY.get("scheduler_sent_this_hour")
+        assert gauge.labels("a@x.com").get() == 2
+        assert gauge.labels("b@x.com").get() == 1
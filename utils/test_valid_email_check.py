@@ -0,0 +1,72 @@
+import pytest
+
+from utils.valid_email_check import (
+    EmailManager,
+    domain_is_valid,
+    is_valid_email,
+    validate_many,
+)
+
+
+class TestIsValidEmail:
+    @pytest.mark.parametrize(
+        "email,expected",
+        [
+            ("valid@example.com", True),
+            ("user.name+tag@example.co.uk", True),
+            ("  padded@example.com  ", True),
+            ("invalid@", False),
+            ("@invalid.com", False),
+            ("invalid", False),
+            ("invalid@.com", False),
+        ],
+    )
+    def test_pattern(self, email, expected):
+        assert is_valid_email(email) is expected
+
+    @pytest.mark.parametrize(
+        "email,expected",
+        [
+            ("ok@mail.example.com", True),
+            ("bad@-example.com", False),
+            ("bad@example-.com", False),
+            ("bad@example..com", False),
+            ("double..dot@example.com", False),
+            (f"{'a' * 65}@example.com", False),
+        ],
+    )
+    def test_domain_checks(self, email, expected):
+        assert is_valid_email(email, check_domain=True) is expected
+
+    def test_results_are_cached(self):
+        is_valid_email.cache_clear()
+        is_valid_email("cached@example.com")
+        is_valid_email("cached@example.com")
+        assert is_valid_email.cache_info().hits == 1
+
+    def test_domain_is_valid(self):
+        assert domain_is_valid("example.com")
+        assert not domain_is_valid("localhost")
+        assert not domain_is_valid("example.c0m")
+        assert not domain_is_valid("a" * 250 + ".com")
+
+
+class TestValidateMany:
+    def test_partitions_in_order(self):
+        result = validate_many(["a@example.com", "broken", None, "", "b@example.com"])
+        assert result.valid == ["a@example.com", "b@example.com"]
+        assert result.invalid == ["broken", None, ""]
+
+    def test_domain_checks_are_forwarded(self):
+        result = validate_many(["a@example..com"], check_domain=True)
+        assert result.invalid == ["a@example..com"]
+
+
+class TestEmailManager:
+    def test_returns_a_bool(self):
+        assert EmailManager.valid_email_pattern("a@example.com") is True
+        assert EmailManager.valid_email_pattern("nope") is False
+        assert EmailManager.valid_email_pattern(None) is False
+
+    def test_validate_many(self):
+        assert EmailManager.validate_many(["a@example.com"]).valid == ["a@example.com"]
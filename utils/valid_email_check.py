@@ -1,5 +1,64 @@
 import re
 import logging
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Iterable, List
+
+"""
+shared email address validation , used by the mailer and the supabase import
+"""
+
+logger = logging.getLogger(__name__)
+
+# compiled once at import instead of on every call
+EMAIL_PATTERN = re.compile(r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$")
+# one dns label : 1-63 chars , letters digits and inner hyphens
+DOMAIN_LABEL = re.compile(r"^(?!-)[a-zA-Z0-9-]{1,63}(?<!-)$")
+
+
+def domain_is_valid(domain: str) -> bool:
+    # rfc 1035 syntax only , no dns lookup
+    if not domain or len(domain) > 253:
+        return False
+    labels = domain.split(".")
+    if len(labels) < 2 or not labels[-1].isalpha():
+        return False
+    return all(DOMAIN_LABEL.match(label) for label in labels)
+
+
+@lru_cache(maxsize=65536)
+def is_valid_email(address: str, check_domain: bool = False) -> bool:
+    """
+    pure and cached , the same contact shows up in many campaigns so repeated
+    addresses cost a dict lookup , leading / trailing whitespace is ignored
+    """
+    address = address.strip()
+    if not EMAIL_PATTERN.fullmatch(address):
+        return False
+    if check_domain:
+        local, _, domain = address.rpartition("@")
+        if len(local) > 64 or ".." in local or local.startswith(".") or local.endswith("."):
+            return False
+        return domain_is_valid(domain)
+    return True
+
+
+@dataclass
+class ValidationResult:
+    valid: List[str] = field(default_factory=list)
+    invalid: List[Any] = field(default_factory=list)
+
+
+def validate_many(addresses: Iterable[Any], check_domain: bool = False) -> ValidationResult:
+    # one summary log line for the whole batch instead of one per address
+    result = ValidationResult()
+    for address in addresses:
+        if isinstance(address, str) and address and is_valid_email(address, check_domain):
+            result.valid.append(address)
+        else:
+            result.invalid.append(address)
+    logger.info(f"validated {len(result.valid) + len(result.invalid)} address(es) - invalid : {len(result.invalid)}\n")
+    return result
 
 
 class EmailManager:
@@ -7,9 +66,15 @@ class EmailManager:
         pass
 
     @staticmethod
-    def valid_email_pattern(email):
-        pattern = r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$"
-        if re.fullmatch(pattern, email):
-            logging.info("the email provided is valid")
-        else:
-            logging.warning("the email provided doesn't have a valid structure")
+    def valid_email_pattern(email, check_domain: bool = False) -> bool:
+        if not email or not isinstance(email, str):
+            logger.warning("email validation received a non-string or empty value\n")
+            return False
+        if is_valid_email(email, check_domain):
+            return True
+        logger.warning(f"the email provided doesn't have a valid structure : {email}\n")
+        return False
+
+    @staticmethod
+    def validate_many(addresses: Iterable[Any], check_domain: bool = False) -> ValidationResult:
+        return validate_many(addresses, check_domain)